@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import math
+import os
+import struct
+import time
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dep
+    np = None
+
+from .metrics import ANALYZER_FRAME_SECONDS
+
+logger = logging.getLogger('analyzer')
+
+DEFAULT_SAMPLE_RATE = 48000
+DEFAULT_CHANNELS = 2
+DEFAULT_FFT_SIZE = 4096
+DEFAULT_RATE_HZ = 20.0
+DEFAULT_BANDS_PER_OCTAVE = 3
+MIN_FREQ = 20.0
+MAX_FREQ = 20000.0
+SAMPLE_BYTES = 2  # S16_LE
+FLOOR_DB = -100.0
+STEP_DB = 0.5     # band energies travel as one byte: FLOOR_DB + n * STEP_DB
+# binary frame: kind, version, band count, server timestamp, then one byte per band
+FRAME_HEADER = struct.Struct('<BBHd')
+FRAME_KIND_SPECTRUM = 1
+FRAME_VERSION = 1
+# spectrum frames are latest-wins: skip clients with this much unsent data
+MAX_SEND_BACKLOG = 64 * 1024
+
+
+def band_layout(sample_rate: int, fft_size: int, bands_per_octave: int = DEFAULT_BANDS_PER_OCTAVE,
+                fmin: float = MIN_FREQ, fmax: float = MAX_FREQ) -> tuple:
+    """Fractional-octave bands (base 2, centred on 1 kHz) resolvable by the FFT.
+
+    Bands narrower than one FFT bin at the low end are left out.
+
+    Returns:
+        (centers, starts, stop): band centre frequencies, the first rfft bin
+        of each band, and the bin after the last band. Bands are contiguous.
+    """
+    if bands_per_octave < 1:
+        raise ValueError('bands_per_octave must be >= 1')
+    df = sample_rate / fft_size
+    fmax = min(fmax, sample_rate / 2.0)
+    half = 2.0 ** (1.0 / (2 * bands_per_octave))
+    k_min = math.ceil(bands_per_octave * math.log2(fmin / 1000.0))
+    k_max = math.floor(bands_per_octave * math.log2(fmax / 1000.0))
+    centers, starts = [], []
+    stop = 0
+    for k in range(k_min, k_max + 1):
+        center = 1000.0 * 2.0 ** (k / bands_per_octave)
+        first = math.ceil(center / half / df)
+        last = min(math.ceil(center * half / df), fft_size // 2 + 1)
+        if last <= first:
+            continue
+        centers.append(round(center, 1))
+        starts.append(first)
+        stop = last
+    if not centers:
+        raise ValueError('no band fits the FFT size')
+    return centers, starts, stop
+
+
+def encode_frame(levels_db, ts: float) -> bytes:
+    """Pack band levels (dB) into a binary spectrum frame."""
+    quantized = np.clip(np.rint((np.asarray(levels_db) - FLOOR_DB) / STEP_DB), 0, 255).astype(np.uint8)
+    return FRAME_HEADER.pack(FRAME_KIND_SPECTRUM, FRAME_VERSION, len(quantized), ts) + quantized.tobytes()
+
+
+class PcmFileSource:
+    """Raw interleaved S16_LE PCM from a file or named pipe.
+
+    Regular files are looped and paced to real time by the analyzer (a
+    stand-in for a live tap); pipes and devices block on read and pace
+    themselves.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.live = not os.path.isfile(path)
+        self._file = None
+
+    async def open(self):
+        # opening a FIFO blocks until a writer shows up
+        self._file = await asyncio.to_thread(open, self.path, 'rb')
+
+    def _read(self, nbytes: int) -> bytes:
+        data = b''
+        while len(data) < nbytes:
+            chunk = self._file.read(nbytes - len(data))
+            if not chunk:
+                if self.live or self._file.tell() == 0:
+                    raise EOFError(f'{self.path}: end of stream')
+                self._file.seek(0)
+                continue
+            data += chunk
+        return data
+
+    async def read(self, nbytes: int) -> bytes:
+        return await asyncio.to_thread(self._read, nbytes)
+
+    async def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class AlsaSource:
+    """Capture from an ALSA device through `arecord`.
+
+    Meant for the capture side of an snd-aloop loopback that a CamillaDSP
+    monitor output plays into, e.g. `hw:Loopback,1`.
+    """
+
+    live = True
+
+    def __init__(self, device: str, sample_rate: int, channels: int):
+        self.device = device
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._proc = None
+
+    async def open(self):
+        self._proc = await asyncio.create_subprocess_exec(
+            'arecord', '-q', '-D', self.device, '-f', 'S16_LE', '-c', str(self.channels),
+            '-r', str(self.sample_rate), '-t', 'raw',
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+
+    async def read(self, nbytes: int) -> bytes:
+        try:
+            return await self._proc.stdout.readexactly(nbytes)
+        except asyncio.IncompleteReadError:
+            raise EOFError(f'arecord on {self.device} stopped')
+
+    async def close(self):
+        if self._proc is not None and self._proc.returncode is None:
+            self._proc.terminate()
+            await self._proc.wait()
+        self._proc = None
+
+
+def open_source(spec: str, sample_rate: int = DEFAULT_SAMPLE_RATE, channels: int = DEFAULT_CHANNELS):
+    """Build a source from `alsa:<device>`, `file:<path>` or a bare path.
+
+    Raises:
+        ValueError: If the spec is empty
+    """
+    spec = (spec or '').strip()
+    if not spec:
+        raise ValueError('no analyzer source configured')
+    if spec.startswith('alsa:'):
+        return AlsaSource(spec[5:], sample_rate, channels)
+    if spec.startswith('file:'):
+        spec = spec[5:]
+    return PcmFileSource(spec)
+
+
+class SpectrumAnalyzer:
+    """Fractional-octave spectrum of a local audio tap, shared by all clients.
+
+    While at least one client is subscribed, a task reads `sample_rate /
+    rate_hz` frames per tick from the source, mixes them to mono, runs a
+    Hann-windowed FFT over the last `fft_size` samples and sums the power
+    into bands with one `np.add.reduceat`. Each result is encoded once as a
+    binary frame (see `FRAME_HEADER`) and sent to the subscribers only. The
+    source is closed when the last subscriber leaves.
+    """
+
+    def __init__(self, source: str, sample_rate: int = DEFAULT_SAMPLE_RATE, channels: int = DEFAULT_CHANNELS,
+                 fft_size: int = DEFAULT_FFT_SIZE, rate_hz: float = DEFAULT_RATE_HZ,
+                 bands_per_octave: int = DEFAULT_BANDS_PER_OCTAVE):
+        self.source = source
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        self.fft_size = int(fft_size)
+        self.rate_hz = float(rate_hz)
+        self.hop = max(1, int(round(self.sample_rate / self.rate_hz)))
+        self.subscribers = set()
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self.centers, starts, self._stop = band_layout(self.sample_rate, self.fft_size, bands_per_octave)
+        if np is not None:
+            self._first = starts[0]
+            self._offsets = np.asarray(starts, dtype=np.intp) - starts[0]
+            self._window = np.hanning(self.fft_size).astype(np.float32)
+            # band power relative to a full-scale sine (0 dB), whatever its leakage into neighbour bins
+            self._scale = 4.0 / (self.fft_size * float(np.sum(self._window.astype(np.float64) ** 2)))
+            self._buffer = np.zeros(self.fft_size, dtype=np.float32)
+
+    @property
+    def available(self) -> bool:
+        return np is not None and bool(self.source) and self.error is None
+
+    def info(self) -> dict:
+        info = {'available': self.available, 'bands': self.centers, 'rate_hz': self.rate_hz,
+                'floor_db': FLOOR_DB, 'step_db': STEP_DB}
+        if np is None:
+            info['reason'] = 'numpy is not installed'
+        elif not self.source:
+            info['reason'] = 'no analyzer source configured'
+        elif self.error:
+            info['reason'] = self.error
+        return info
+
+    def subscribe(self, ws):
+        """Add a client; starts the analysis if it was idle. Returns info()."""
+        if self.available:
+            self.subscribers.add(ws)
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._run())
+        return self.info()
+
+    def unsubscribe(self, ws):
+        self.subscribers.discard(ws)
+
+    def process(self, data: bytes):
+        """Analyze one hop of interleaved PCM. Returns band levels in dB."""
+        samples = np.frombuffer(data, dtype='<i2').reshape(-1, self.channels)
+        mono = samples.mean(axis=1, dtype=np.float32) * (1.0 / 32768.0)
+        if len(mono) >= self.fft_size:
+            self._buffer[:] = mono[-self.fft_size:]
+        else:
+            self._buffer[:-len(mono)] = self._buffer[len(mono):]
+            self._buffer[-len(mono):] = mono
+        spectrum = np.fft.rfft(self._buffer * self._window)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        energies = np.add.reduceat(power[self._first:self._stop], self._offsets) * self._scale
+        return 10.0 * np.log10(np.maximum(energies, 10.0 ** (FLOOR_DB / 10.0)))
+
+    async def _broadcast(self, frame: bytes):
+        for ws in list(self.subscribers):
+            if ws.closed:
+                self.subscribers.discard(ws)
+                continue
+            transport = ws.get('transport')
+            if transport is not None and transport.get_write_buffer_size() > MAX_SEND_BACKLOG:
+                continue
+            try:
+                await ws.send_bytes(frame)
+            except Exception:
+                self.subscribers.discard(ws)
+
+    async def _run(self):
+        source = open_source(self.source, self.sample_rate, self.channels)
+        nbytes = self.hop * self.channels * SAMPLE_BYTES
+        loop = asyncio.get_running_loop()
+        try:
+            await source.open()
+            logger.info('Spectrum analyzer reading %s (%d bands at %.0f Hz)',
+                        self.source, len(self.centers), self.rate_hz)
+            next_tick = loop.time()
+            while self.subscribers:
+                data = await source.read(nbytes)
+                started = time.perf_counter()
+                # a few hundred microseconds for 4096 points: cheaper inline than in a thread
+                frame = encode_frame(self.process(data), time.time())
+                ANALYZER_FRAME_SECONDS.observe(time.perf_counter() - started)
+                await self._broadcast(frame)
+                if not source.live:
+                    next_tick += 1.0 / self.rate_hz
+                    delay = next_tick - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        next_tick = loop.time()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # stays unavailable until restart rather than retrying a broken tap
+            self.error = f'analyzer source failed: {e}'
+            self.subscribers.clear()
+            logger.error('Spectrum analyzer stopped: %s', e)
+        finally:
+            await source.close()
+
+    async def stop(self):
+        self.subscribers.clear()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
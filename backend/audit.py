@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger('audit')
+
+DEFAULT_BUCKET_SEC = 60
+MAX_QUERY_LIMIT = 1000
+
+
+class ActionLog:
+    """Append-only structured log of mixer actions with a time-bucket index.
+
+    Entries are stored one JSON object per line in `actions.jsonl`:
+    `{"ts", "client", "action", "channel", "param", "old", "new"}`.
+    Every `bucket_sec` seconds of traffic forms a bucket; when a bucket is
+    closed a line `{"t", "start", "end", "n", "ch"}` (bucket start time, byte
+    range, entry count, channels touched) is appended to `actions.idx`.
+    Queries walk this small index and then read only the byte ranges of
+    buckets that overlap the time range and touched the channel.
+
+    `record()` only appends to an in-memory queue; `flush()` does the file
+    I/O and is meant to be run off the event loop.
+    """
+
+    def __init__(self, directory: str, bucket_sec: int = DEFAULT_BUCKET_SEC):
+        self.directory = directory
+        self.bucket_sec = bucket_sec
+        self.path = os.path.join(directory, 'actions.jsonl')
+        self.index_path = os.path.join(directory, 'actions.idx')
+        os.makedirs(directory, exist_ok=True)
+        self._pending = deque()
+        self._index = []      # closed buckets, oldest first
+        self._open = None     # bucket currently being written
+        self._lock = threading.Lock()
+        self._load()
+
+    def _bucket_of(self, ts: float) -> int:
+        return int(ts // self.bucket_sec) * self.bucket_sec
+
+    def _load(self):
+        """Read the index and rebuild the buckets written after the last index line."""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        entry['ch'] = set(entry.get('ch', []))
+                        self._index.append(entry)
+                    except ValueError:
+                        logger.warning('Skipping corrupt audit index line')
+        if not os.path.exists(self.path):
+            return
+        offset = self._index[-1]['end'] if self._index else 0
+        with open(self.path, 'rb+') as f:
+            f.seek(offset)
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                if not line.endswith(b'\n'):
+                    # partial write from a crash: drop it
+                    f.truncate(offset)
+                    break
+                try:
+                    rec = json.loads(line)
+                    self._account(rec, offset, offset + len(line), write_index=True)
+                except ValueError:
+                    logger.warning('Skipping corrupt audit entry at offset %d', offset)
+                offset += len(line)
+
+    def _account(self, rec: dict, start: int, end: int, write_index: bool):
+        bucket = self._bucket_of(rec.get('ts', 0.0))
+        if self._open is not None and self._open['t'] != bucket:
+            self._close_bucket(write_index)
+        if self._open is None:
+            self._open = {'t': bucket, 'start': start, 'end': start, 'n': 0, 'ch': set()}
+        self._open['end'] = end
+        self._open['n'] += 1
+        self._open['ch'].add(rec.get('channel'))
+
+    def _close_bucket(self, write_index: bool = True):
+        bucket = self._open
+        self._open = None
+        if bucket is None or bucket['n'] == 0:
+            return
+        self._index.append(bucket)
+        if write_index:
+            line = dict(bucket, ch=sorted(bucket['ch'], key=str))
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(line, separators=(',', ':')) + '\n')
+
+    def record(self, client, action: str, channel=None, param: Optional[str] = None, old=None, new=None, ts: Optional[float] = None):
+        """Queue one action for the next flush (no I/O)."""
+        self._pending.append({
+            'ts': round(ts if ts is not None else time.time(), 3),
+            'client': client,
+            'action': action,
+            'channel': channel,
+            'param': param,
+            'old': old,
+            'new': new,
+        })
+
+    def flush(self) -> int:
+        """Append queued entries to disk. Returns the number written.
+
+        Safe to call from several threads (the flush loop and `query`): the
+        queue is drained and written under the lock, so entries reach the
+        file in order and the buckets stay sorted by time.
+        """
+        with self._lock:
+            pending = []
+            while self._pending:
+                pending.append(self._pending.popleft())
+            if not pending:
+                return 0
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                for rec in pending:
+                    line = (json.dumps(rec, separators=(',', ':')) + '\n').encode('utf-8')
+                    f.write(line)
+                    self._account(rec, offset, offset + len(line), write_index=True)
+                    offset += len(line)
+        return len(pending)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._close_bucket()
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None, channel=None,
+              limit: int = 100, cursor: Optional[int] = None) -> dict:
+        """Return entries in [start, end] (optionally for one channel), oldest first.
+
+        Args:
+            start: Start timestamp (epoch seconds), inclusive
+            end: End timestamp (epoch seconds), inclusive
+            channel: Channel index or 'master'; None for all
+            limit: Maximum number of entries to return
+            cursor: Byte offset returned as `next_cursor` by a previous page
+
+        Returns:
+            {'entries': [...], 'next_cursor': int or None}
+        """
+        limit = max(1, min(int(limit), MAX_QUERY_LIMIT))
+        self.flush()
+        with self._lock:
+            buckets = list(self._index)
+            if self._open is not None:
+                buckets.append(dict(self._open, ch=set(self._open['ch'])))
+
+        entries = []
+        next_cursor = None
+        if not buckets:
+            return {'entries': entries, 'next_cursor': next_cursor}
+        with open(self.path, 'rb') as f:
+            for bucket in buckets:
+                if start is not None and bucket['t'] + self.bucket_sec <= start:
+                    continue
+                if end is not None and bucket['t'] > end:
+                    break
+                if channel is not None and channel not in bucket['ch']:
+                    continue
+                if cursor is not None and bucket['end'] <= cursor:
+                    continue
+                offset = max(bucket['start'], cursor or 0)
+                f.seek(offset)
+                while offset < bucket['end']:
+                    line = f.readline()
+                    if not line:
+                        break
+                    offset += len(line)
+                    rec = json.loads(line)
+                    if start is not None and rec['ts'] < start:
+                        continue
+                    if end is not None and rec['ts'] > end:
+                        break
+                    if channel is not None and rec.get('channel') != channel:
+                        continue
+                    if len(entries) == limit:
+                        next_cursor = offset - len(line)
+                        return {'entries': entries, 'next_cursor': next_cursor}
+                    entries.append(rec)
+        return {'entries': entries, 'next_cursor': next_cursor}
+
@@ -1,7 +1,10 @@
 import asyncio
+import copy
+import functools
 import json
 import logging
 import os
+import threading
 from typing import Optional
 
 import aiohttp
@@ -12,8 +15,39 @@ try:
 except Exception:  # pragma: no cover - optional dep
     CamillaClient = None
 
+from .camilla_config import CamillaConfig, EQ_NAME_PREFIXES
+from .logger import LazyJson
+from .metrics import ADAPTER_CALL_SECONDS, DSP_RECONNECTS_TOTAL, timed
+
 logger = logging.getLogger('camilla_adapter')
 
+_SET_LEVEL_SECONDS = ADAPTER_CALL_SECONDS.labels('set_level')
+_SET_MUTES_SECONDS = ADAPTER_CALL_SECONDS.labels('set_mutes')
+_SET_FILTER_GAIN_SECONDS = ADAPTER_CALL_SECONDS.labels('set_filter_gain')
+_SET_ACTIVE_SECONDS = ADAPTER_CALL_SECONDS.labels('set_active')
+_APPLY_BATCH_SECONDS = ADAPTER_CALL_SECONDS.labels('apply_batch')
+_APPLY_COMPILED_SECONDS = ADAPTER_CALL_SECONDS.labels('apply_compiled')
+_GET_CONFIG_SECONDS = ADAPTER_CALL_SECONDS.labels('config_active')
+_GET_STATE_SECONDS = ADAPTER_CALL_SECONDS.labels('get_current_state')
+_POLL_CHANGES_SECONDS = ADAPTER_CALL_SECONDS.labels('poll_changes')
+_GET_LEVELS_SECONDS = ADAPTER_CALL_SECONDS.labels('get_playback_levels')
+_WS_RECONNECTS = DSP_RECONNECTS_TOTAL.labels('ws')
+
+
+def _serialized(fn):
+    """Run an adapter method under the adapter's DSP lock.
+
+    The pycamilladsp client and the cached config model are shared by the
+    event loop and worker threads (control flushes, scene ticks, the DSP
+    watcher, meters); one call at a time keeps a `set_active` from being
+    built on a model another call is editing.
+    """
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return fn(self, *args, **kwargs)
+    return wrapper
+
 
 class CamillaAdapter:
     """Adapter that can connect to a CamillaGUI/CamillaDSP WebSocket endpoint.
@@ -28,6 +62,10 @@ class CamillaAdapter:
         self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
         self._task: Optional[asyncio.Task] = None
         self._queue: asyncio.Queue = asyncio.Queue()
+        # loop running `_run`: messages queued from worker threads are handed to it
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # serializes every call on the pycamilladsp client and `_config`
+        self._lock = threading.RLock()
         # optional pycamilladsp client (direct CamillaDSP websocket)
         self._py_client: Optional['CamillaClient'] = None
         self._py_connected = False
@@ -36,6 +74,9 @@ class CamillaAdapter:
         # Use external volume integration (Loudness without Volume filter)
         # Default ON unless explicitly disabled
         self._py_external_volume = os.environ.get('CAMILLA_EXTERNAL_VOLUME', '1') not in ('0', 'false', 'False', '')
+        # Parsed active config, rebuilt only when the DSP config changes
+        self._config: Optional[CamillaConfig] = None
+        self._config_revision = 0
 
     async def start(self):
         # Try to initialize pycamilladsp CamillaClient if available
@@ -56,6 +97,7 @@ class CamillaAdapter:
             logger.info('CamillaAdapter running in stub/py mode (no CAMILLA_WS_URL)')
             return
         logger.info(f'CamillaAdapter connecting to {self.url}')
+        self._loop = asyncio.get_running_loop()
         self._session = aiohttp.ClientSession()
         self._task = asyncio.create_task(self._run())
 
@@ -71,11 +113,12 @@ class CamillaAdapter:
         if self._session:
             await self._session.close()
         if self._py_client and self._py_connected:
-            try:
-                self._py_client.disconnect()
-            except Exception:
-                logger.exception('Failed to disconnect pycamilladsp client')
-            self._py_connected = False
+            with self._lock:
+                try:
+                    self._py_client.disconnect()
+                except Exception:
+                    logger.exception('Failed to disconnect pycamilladsp client')
+                self._py_connected = False
 
     async def _run(self):
         assert self._session
@@ -94,20 +137,26 @@ class CamillaAdapter:
             except asyncio.CancelledError:
                 break
             except Exception:
+                _WS_RECONNECTS.inc()
                 logger.exception('camilla adapter connection error, retrying in 2s')
                 await asyncio.sleep(2)
 
     def _enqueue(self, msg: dict):
         # If running in stub mode, just log
         if not self.url:
-            logger.info('Adapter (stub) would send: %s', json.dumps(msg))
+            logger.info('Adapter (stub) would send: %s', LazyJson(msg))
             return
-        # else push to queue
+        # else push to queue (asyncio.Queue is not thread-safe: go through its loop)
         try:
-            self._queue.put_nowait(msg)
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, msg)
+            else:
+                self._queue.put_nowait(msg)
         except Exception:
             logger.exception('failed to enqueue message')
 
+    @timed(_SET_LEVEL_SECONDS)
+    @_serialized
     def set_level(self, channel: int, level_db: float):
         # if pycamilladsp CamillaClient is connected, use official API
         if self._py_client and self._py_connected:
@@ -132,32 +181,59 @@ class CamillaAdapter:
         msg = {"type": "set_channel_level", "payload": {"channel": channel, "level_db": level_db}}
         self._enqueue(msg)
 
+    def _active_config(self, refresh: bool = False) -> Optional[CamillaConfig]:
+        """Return the cached config model, fetching it from the DSP if needed.
+
+        With `refresh=True` the active config is downloaded again and the
+        indexes are rebuilt only if it differs from the cached revision.
+        """
+        if self._config is not None and not refresh:
+            return self._config
+        with _GET_CONFIG_SECONDS.time():
+            config = self._py_client.config.active()
+        if not config:
+            return None
+        if self._config is None or config != self._config.config:
+            self._config_revision += 1
+            self._config = CamillaConfig(config, self._config_revision)
+        return self._config
+
+    def _config_for_write(self) -> Optional[CamillaConfig]:
+        """Config model to edit before a whole-config `set_active`.
+
+        The active config is read back first, so changes made on the DSP by
+        another client since the last read (CamillaGUI, a config reload) are
+        kept instead of being overwritten by our cached copy. The indexes are
+        only rebuilt when it differs.
+        """
+        return self._active_config(refresh=True)
+
+    def invalidate_config(self):
+        """Drop the cached config so the next update re-reads it from the DSP."""
+        self._config = None
+
+    def _push_config(self, model: CamillaConfig):
+        try:
+            with _SET_ACTIVE_SECONDS.time():
+                self._py_client.config.set_active(model.config)
+        except Exception:
+            # Our copy may no longer match what the DSP runs
+            self.invalidate_config()
+            raise
+
     def _update_mixer_gain(self, dest_index: int, level_db: float):
         try:
-            config = self._py_client.config.active()
-            if not config:
-                return
-            
-            mixers = config.get('mixers', {})
-            updated = False
-            
-            for m_name, m_data in mixers.items():
-                mapping = m_data.get('mapping', [])
-                for entry in mapping:
-                    if entry.get('dest') == dest_index:
-                        sources = entry.get('sources', [])
-                        for src in sources:
-                            src['gain'] = level_db
-                            updated = True
-            
-            if updated:
-                self._py_client.config.set_active(config)
+            model = self._config_for_write()
+            if model and model.set_dest_gain(dest_index, level_db):
+                self._push_config(model)
         except Exception:
             logger.exception('Failed to update mixer gain')
 
     def set_mute(self, channel: int, mute: bool):
         self.set_mutes([(channel, mute)])
 
+    @timed(_SET_MUTES_SECONDS)
+    @_serialized
     def set_mutes(self, items: list):
         """
         Batch update mutes.
@@ -198,55 +274,32 @@ class CamillaAdapter:
         mute_map: { dest_index: mute_bool }
         """
         try:
-            config = self._py_client.config.active()
-            if not config:
+            model = self._config_for_write()
+            if not model:
                 return
-            
-            mixers = config.get('mixers', {})
             updated = False
-            
-            for m_name, m_data in mixers.items():
-                mapping = m_data.get('mapping', [])
-                for entry in mapping:
-                    dest = entry.get('dest')
-                    if dest in mute_map:
-                        target_mute = mute_map[dest]
-                        if entry.get('mute') != target_mute:
-                            entry['mute'] = target_mute
-                            updated = True
-            
+            for dest, mute in mute_map.items():
+                updated = model.set_dest_mute(dest, mute) or updated
             if updated:
-                self._py_client.config.set_active(config)
+                self._push_config(model)
         except Exception:
             logger.exception('Failed to update mixer mutes batch')
 
     def _update_mixer_mute(self, dest_index: int, mute: bool):
         self._update_mixer_mutes_batch({dest_index: mute})
 
+    @timed(_SET_FILTER_GAIN_SECONDS)
+    @_serialized
     def set_filter_gain(self, filter_name: str, gain_db: float):
         """
         Update the gain of a specific filter in the active configuration.
         """
         if self._py_client and self._py_connected:
             try:
-                config = self._py_client.config.active()
-                if not config:
-                    return
-                
-                filters = config.get('filters', {})
-                updated = False
-                
-                if filter_name in filters:
-                    flt = filters[filter_name]
-                    # Check if it has parameters and gain
-                    if 'parameters' in flt and 'gain' in flt['parameters']:
-                        # Only update if changed to avoid unnecessary config reloads
-                        if flt['parameters']['gain'] != gain_db:
-                            flt['parameters']['gain'] = gain_db
-                            updated = True
-                
-                if updated:
-                    self._py_client.config.set_active(config)
+                model = self._config_for_write()
+                # Only push if changed to avoid unnecessary config reloads
+                if model and model.set_filter_gain(filter_name, gain_db):
+                    self._push_config(model)
             except Exception:
                 logger.exception(f'Failed to update filter gain for {filter_name}')
         
@@ -254,6 +307,133 @@ class CamillaAdapter:
         msg = {"type": "set_filter_gain", "payload": {"filter": filter_name, "gain_db": gain_db}}
         self._enqueue(msg)
 
+    @_serialized
+    def set_eq_gain(self, channel: int, band: str, gain_db: float):
+        """Update an EQ band of a UI channel, resolving the filter via the config index.
+
+        Falls back to the `Gain_N`/`Bass_N`/`Mid_N`/`Treble_N` naming
+        convention when no config is available (stub mode).
+        """
+        filter_name = None
+        if self._py_client and self._py_connected:
+            try:
+                model = self._active_config()
+                if model:
+                    filter_name = model.filter_for(channel, band)
+            except Exception:
+                logger.exception('Failed to resolve EQ filter')
+        if filter_name is None:
+            prefix = EQ_NAME_PREFIXES.get(band)
+            if prefix is None:
+                return
+            filter_name = f'{prefix}{channel}'
+        self.set_filter_gain(filter_name, gain_db)
+
+    @timed(_APPLY_BATCH_SECONDS)
+    @_serialized
+    def apply_batch(self, levels: Optional[dict] = None, eq: Optional[dict] = None,
+                    master_level: Optional[float] = None):
+        """Apply several channel changes with a single config upload.
+
+        Args:
+            levels: {ui_channel: level_db} mixer gains
+            eq: {(ui_channel, band): gain_db} EQ band gains
+            master_level: main volume in dB, if it changes
+        """
+        levels = levels or {}
+        eq = eq or {}
+        if self._py_client and self._py_connected:
+            try:
+                if master_level is not None:
+                    if self._py_external_volume and hasattr(self._py_client.volume, 'set_volume_external'):
+                        self._py_client.volume.set_volume_external(0, float(master_level))
+                    else:
+                        self._py_client.volume.set_main_volume(float(master_level))
+                model = self._config_for_write() if (levels or eq) else None
+                if model:
+                    updated = False
+                    for ch, level_db in levels.items():
+                        updated = model.set_dest_gain(int(ch), float(level_db)) or updated
+                    for (ch, band), gain_db in eq.items():
+                        updated = model.set_eq_gain(int(ch), band, float(gain_db)) or updated
+                    if updated:
+                        self._push_config(model)
+            except Exception:
+                logger.exception('pycamilladsp apply_batch failed')
+        msg = {"type": "apply_batch", "payload": {
+            "levels": {str(ch): v for ch, v in levels.items()},
+            "eq": [{"channel": ch, "band": band, "gain_db": v} for (ch, band), v in eq.items()],
+            "master_level": master_level,
+        }}
+        self._enqueue(msg)
+
+    @_serialized
+    def base_config(self) -> Optional[CamillaConfig]:
+        """Active config model used as the base for preset compilation.
+
+        Read back from the DSP, as the compiled config replaces it whole.
+        """
+        if not (self._py_client and self._py_connected):
+            return None
+        try:
+            return self._config_for_write()
+        except Exception:
+            logger.exception('Failed to read active config')
+            return None
+
+    @timed(_APPLY_COMPILED_SECONDS)
+    @_serialized
+    def apply_compiled(self, config: dict, master: Optional[dict] = None) -> bool:
+        """Push a precompiled preset config with a single `set_active`.
+
+        Args:
+            config: Full DSP config from `PresetManager.compiled_config`
+            master: Optional {'level_db', 'mute'} applied to the main volume
+
+        Returns:
+            True if the config was applied
+        """
+        if not (self._py_client and self._py_connected):
+            return False
+        base = self._config
+        try:
+            with _SET_ACTIVE_SECONDS.time():
+                self._py_client.config.set_active(config)
+            if isinstance(master, dict):
+                if 'level_db' in master:
+                    if self._py_external_volume and hasattr(self._py_client.volume, 'set_volume_external'):
+                        self._py_client.volume.set_volume_external(0, float(master['level_db']))
+                    else:
+                        self._py_client.volume.set_main_volume(float(master['level_db']))
+                if 'mute' in master:
+                    self._py_client.volume.set_main_mute(bool(master['mute']))
+        except Exception:
+            self.invalidate_config()
+            logger.exception('Failed to apply compiled preset')
+            return False
+        # later per-control updates work on a private copy, never on the cached compile
+        self._config_revision += 1
+        model = CamillaConfig(copy.deepcopy(config), self._config_revision)
+        if base is not None and base._fingerprint:
+            # same structure as the base it was compiled from
+            model._fingerprint = base._fingerprint
+        self._config = model
+        return True
+
+    @_serialized
+    def get_channel_count(self) -> Optional[int]:
+        """Number of mixer channels in the active DSP config (highest dest + 1)."""
+        if not (self._py_client and self._py_connected):
+            return None
+        try:
+            model = self._active_config(refresh=True)
+        except Exception:
+            logger.exception('Failed to read active config')
+            return None
+        return model.channel_count if model else None
+
+    @timed(_GET_STATE_SECONDS)
+    @_serialized
     def get_current_state(self):
         """Retrieve current state (master vol/mute and mixer gains/mutes) from CamillaDSP."""
         if not (self._py_client and self._py_connected):
@@ -265,46 +445,11 @@ class CamillaAdapter:
             state['master']['level_db'] = self._py_client.volume.main_volume()
             state['master']['mute'] = self._py_client.volume.main_mute()
             
-            # Channels
-            config = self._py_client.config.active()
-            if config:
-                mixers = config.get('mixers', {})
-                for m_name, m_data in mixers.items():
-                    mapping = m_data.get('mapping', [])
-                    for entry in mapping:
-                        dest = entry.get('dest')
-                        if isinstance(dest, int):
-                            # Mute
-                            mute = entry.get('mute', False)
-                            # Gain
-                            gain = 0.0
-                            sources = entry.get('sources', [])
-                            if sources:
-                                gain = sources[0].get('gain', 0.0)
-                            
-                            state['channels'][dest] = {'level_db': gain, 'mute': mute}
-                
-                # Filters (EQ)
-                filters = config.get('filters', {})
-                for dest in list(state['channels'].keys()):
-                    eq = {'gain': 0.0, 'low': 0.0, 'mid': 0.0, 'high': 0.0}
-                    
-                    gain_name = f'Gain_{dest}'
-                    bass_name = f'Bass_{dest}'
-                    mid_name = f'Mid_{dest}'
-                    treble_name = f'Treble_{dest}'
-
-                    if gain_name in filters:
-                        eq['gain'] = filters[gain_name].get('parameters', {}).get('gain', 0.0)
-                    if bass_name in filters:
-                        eq['low'] = filters[bass_name].get('parameters', {}).get('gain', 0.0)
-                    if mid_name in filters:
-                        eq['mid'] = filters[mid_name].get('parameters', {}).get('gain', 0.0)
-                    if treble_name in filters:
-                        eq['high'] = filters[treble_name].get('parameters', {}).get('gain', 0.0)
-                    
-                    state['channels'][dest]['eq'] = eq
-                
+            # Channels (mixer gains/mutes and EQ filters via the config index)
+            model = self._active_config(refresh=True)
+            if model:
+                state['channels'] = model.to_state()
+                state['channel_count'] = model.channel_count
                 logger.info(f"Retrieved state with EQ for {len(state['channels'])} channels")
 
         except Exception:
@@ -312,6 +457,39 @@ class CamillaAdapter:
             return None
         return state
 
+    @timed(_POLL_CHANGES_SECONDS)
+    @_serialized
+    def poll_changes(self, config: bool = True):
+        """Read what may have been changed behind our back (e.g. in CamillaGUI).
+
+        The main volume and mute are always read (two small commands). With
+        `config=True` the active config is fetched too, but its mixer gains,
+        mutes and EQ are only returned when it differs from the cached model:
+        CamillaDSP has no config revision to ask for.
+
+        Returns:
+            A `get_current_state`-shaped dict whose `channels` is empty when
+            the config is unchanged, or None if not connected
+        """
+        if not (self._py_client and self._py_connected):
+            return None
+        state = {'master': {}, 'channels': {}}
+        try:
+            state['master']['level_db'] = self._py_client.volume.main_volume()
+            state['master']['mute'] = self._py_client.volume.main_mute()
+            if config:
+                known = self._config.revision if self._config is not None else None
+                model = self._active_config(refresh=True)
+                if model and model.revision != known:
+                    state['channels'] = model.to_state()
+                    state['channel_count'] = model.channel_count
+        except Exception:
+            logger.exception('Failed to poll CamillaDSP for changes')
+            return None
+        return state
+
+    @timed(_GET_LEVELS_SECONDS)
+    @_serialized
     def get_playback_levels(self):
         """Get current playback levels (RMS and Peak) from CamillaDSP."""
         if not (self._py_client and self._py_connected):
@@ -0,0 +1,334 @@
+import copy
+import hashlib
+import json
+import logging
+from typing import Optional
+
+logger = logging.getLogger('camilla_config')
+
+EQ_BANDS = ('gain', 'low', 'mid', 'high')
+
+# Naming convention used by the reference CamillaDSP configs (see
+# docs/examples/gui-config.yml). Explicit names always win over the
+# filter-type heuristics below.
+EQ_NAME_PREFIXES = {
+    'gain': 'Gain_',
+    'low': 'Bass_',
+    'mid': 'Mid_',
+    'high': 'Treble_',
+}
+
+# Biquad sub-types mapped to the EQ band they most likely implement
+BIQUAD_BANDS = {
+    'Lowshelf': 'low',
+    'LowshelfFO': 'low',
+    'Peaking': 'mid',
+    'Highshelf': 'high',
+    'HighshelfFO': 'high',
+}
+
+
+def _band_from_name(name: str, channel: int) -> Optional[str]:
+    for band, prefix in EQ_NAME_PREFIXES.items():
+        if name == f'{prefix}{channel}':
+            return band
+    return None
+
+
+def _band_from_type(flt: dict) -> Optional[str]:
+    if not isinstance(flt, dict):
+        return None
+    ftype = flt.get('type')
+    params = flt.get('parameters') or {}
+    if 'gain' not in params:
+        return None
+    if ftype == 'Gain':
+        return 'gain'
+    if ftype == 'Biquad':
+        return BIQUAD_BANDS.get(params.get('type'))
+    return None
+
+
+def _step_channels(step: dict, default: list) -> list:
+    """Return the channel list a pipeline step applies to.
+
+    Supports both the CamillaDSP v1 `channel: N` form and the v2+
+    `channels: [..]` form (where a missing/None list means all channels).
+    """
+    if 'channel' in step and isinstance(step['channel'], int):
+        return [step['channel']]
+    chans = step.get('channels')
+    if isinstance(chans, list):
+        return [c for c in chans if isinstance(c, int)]
+    return default
+
+
+def _state_channels(state: dict) -> list:
+    """(dest, channel) pairs of a mixer state; `index` wins over the position."""
+    channels = [ch for ch in (state.get('channels') or []) if isinstance(ch, dict)]
+    pairs = [(ch.get('index', pos), ch) for pos, ch in enumerate(channels)]
+    return [(dest, ch) for dest, ch in pairs if isinstance(dest, int)]
+
+
+class CamillaConfig:
+    """Parsed view of a CamillaDSP configuration with lookup indexes.
+
+    The indexes are built once per config revision so that state extraction
+    and per-control updates are dictionary lookups instead of scans over
+    every mixer mapping and filter. The wrapped `config` dict is mutated in
+    place by the setters and can be pushed back with `set_active`.
+    """
+
+    def __init__(self, config: dict, revision: int = 0):
+        self.config = config if isinstance(config, dict) else {}
+        self.revision = revision
+        # dest index -> list of mapping entries of the controlled mixer
+        self.dest_entries = {}
+        # mixer names in pipeline order, followed by unused mixers
+        self.mixer_names = []
+        # the mixer the UI strips control (see `_build`)
+        self.mixer_name: Optional[str] = None
+        # output channel -> {band: filter_name}
+        self.channel_filters = {}
+        self._fingerprint: Optional[str] = None
+        self._build()
+
+    def _build(self):
+        mixers = self.config.get('mixers') or {}
+        if not isinstance(mixers, dict):
+            mixers = {}
+        pipeline = self.config.get('pipeline') or []
+        if not isinstance(pipeline, list):
+            pipeline = []
+
+        ordered = []
+        last = None
+        for step in pipeline:
+            if isinstance(step, dict) and step.get('type') == 'Mixer':
+                name = step.get('name')
+                if name in mixers:
+                    last = name
+                    if name not in ordered:
+                        ordered.append(name)
+        for name in mixers:
+            if name not in ordered:
+                ordered.append(name)
+        self.mixer_names = ordered
+
+        # The strips are the outputs of the last mixer in the pipeline (the
+        # one the EQ filters follow); the same dest of another mixer is a
+        # different signal and is left alone. Without a pipeline, the first
+        # mixer defined.
+        self.mixer_name = last or (ordered[0] if ordered else None)
+        mixer = mixers.get(self.mixer_name)
+        if isinstance(mixer, dict):
+            for entry in mixer.get('mapping') or []:
+                if not isinstance(entry, dict):
+                    continue
+                dest = entry.get('dest')
+                if isinstance(dest, int) and dest >= 0:
+                    self.dest_entries.setdefault(dest, []).append(entry)
+
+        self._index_filters(pipeline)
+
+    def _index_filters(self, pipeline: list):
+        filters = self.config.get('filters') or {}
+        if not isinstance(filters, dict):
+            return
+        all_dests = sorted(self.dest_entries)
+
+        # Pipeline analysis: filters running after the (last) mixer operate
+        # on mixer outputs, i.e. on the channels the UI controls.
+        last_mixer = -1
+        for i, step in enumerate(pipeline):
+            if isinstance(step, dict) and step.get('type') == 'Mixer':
+                last_mixer = i
+        steps = [(_step_channels(step, all_dests), step.get('names') or [])
+                 for i, step in enumerate(pipeline)
+                 if i >= last_mixer and isinstance(step, dict) and step.get('type') == 'Filter']
+        # Explicit names first, wherever they sit in the pipeline
+        for chans, names in steps:
+            for ch in chans:
+                for fname in names:
+                    band = _band_from_name(fname, ch)
+                    if band:
+                        self.channel_filters.setdefault(ch, {}).setdefault(band, fname)
+        # Then type guesses, only for filters running on a single channel:
+        # a filter shared by several strips is not one strip's knob
+        for chans, names in steps:
+            if len(chans) != 1:
+                continue
+            for fname in names:
+                band = _band_from_type(filters.get(fname))
+                if band:
+                    self.channel_filters.setdefault(chans[0], {}).setdefault(band, fname)
+
+        # Naming convention fallback for filters not referenced by the pipeline
+        for ch in all_dests:
+            bands = self.channel_filters.setdefault(ch, {})
+            for band, prefix in EQ_NAME_PREFIXES.items():
+                name = f'{prefix}{ch}'
+                if band not in bands and name in filters:
+                    bands[band] = name
+
+    @property
+    def dests(self) -> list:
+        return sorted(self.dest_entries)
+
+    @property
+    def channel_count(self) -> int:
+        """Number of UI channels implied by the mixer (highest dest + 1)."""
+        return (max(self.dest_entries) + 1) if self.dest_entries else 0
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of the config structure, ignoring the values the mixer controls.
+
+        Mixer source gains and mutes and the gains of the indexed EQ filters
+        are left out, so revisions that only differ by fader, mute or EQ
+        positions share a fingerprint. The setters only touch those values,
+        which keeps the cached hash valid.
+        """
+        if self._fingerprint is None:
+            skeleton = copy.deepcopy(self.config)
+            for entries in CamillaConfig(skeleton).dest_entries.values():
+                for entry in entries:
+                    entry.pop('mute', None)
+                    for src in entry.get('sources') or []:
+                        if isinstance(src, dict):
+                            src.pop('gain', None)
+                            src.pop('mute', None)
+            filters = skeleton.get('filters') if isinstance(skeleton.get('filters'), dict) else {}
+            for bands in self.channel_filters.values():
+                for name in bands.values():
+                    params = (filters.get(name) or {}).get('parameters')
+                    if isinstance(params, dict):
+                        params.pop('gain', None)
+            raw = json.dumps(skeleton, sort_keys=True, default=str)
+            self._fingerprint = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        return self._fingerprint
+
+    def compile_state(self, state: dict) -> dict:
+        """Return a copy of the config with a mixer state applied.
+
+        Channel gains, EQ gains and effective mutes (mute, or not soloed
+        while any channel is soloed) are written into a new config dict that
+        can be pushed with a single `set_active`. The master volume is not
+        part of the config and is left to the caller.
+        """
+        compiled = CamillaConfig(copy.deepcopy(self.config))
+        channels = _state_channels(state)
+        any_solo = any(ch.get('solo') for _, ch in channels)
+        for dest, ch in channels:
+            try:
+                if 'level_db' in ch:
+                    compiled.set_dest_gain(dest, float(ch['level_db']))
+                for band, gain_db in (ch.get('eq') or {}).items():
+                    if band in EQ_BANDS:
+                        compiled.set_eq_gain(dest, band, float(gain_db))
+            except (TypeError, ValueError):
+                logger.warning('Skipping invalid values for channel %s', dest)
+            mute = not ch.get('solo') if any_solo else bool(ch.get('mute'))
+            compiled.set_dest_mute(dest, mute)
+        return compiled.config
+
+    def compile_key(self, state: dict) -> str:
+        """Cache key for `compile_state(state)` against this config.
+
+        Where the state sets nothing (dests it does not list, a missing
+        `level_db`, EQ bands it leaves out, per-source mutes) the compiled
+        config keeps this config's current values, which `fingerprint`
+        ignores. The key adds those values, so a compile is only reused
+        while they are unchanged.
+        """
+        listed, levels, bands = set(), set(), set()
+        for dest, ch in _state_channels(state):
+            listed.add(dest)
+            if 'level_db' in ch:
+                levels.add(dest)
+            bands.update((dest, band) for band in (ch.get('eq') or {}) if band in EQ_BANDS)
+        kept = []
+        for dest in self.dests:
+            for entry in self.dest_entries[dest]:
+                sources = [s for s in entry.get('sources') or [] if isinstance(s, dict)]
+                kept.append([dest,
+                             None if dest in listed else entry.get('mute'),
+                             None if dest in levels else [s.get('gain') for s in sources],
+                             [s.get('mute') for s in sources]])
+        for ch in sorted(self.channel_filters):
+            for band, name in sorted(self.channel_filters[ch].items()):
+                if (ch, band) not in bands:
+                    kept.append([ch, band, self._filter_gain(name)])
+        raw = json.dumps([self.fingerprint, kept], default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def filter_for(self, channel: int, band: str) -> Optional[str]:
+        return self.channel_filters.get(channel, {}).get(band)
+
+    def _filter_gain(self, name: Optional[str]) -> float:
+        if not name:
+            return 0.0
+        flt = (self.config.get('filters') or {}).get(name) or {}
+        try:
+            return float((flt.get('parameters') or {}).get('gain', 0.0))
+        except (TypeError, ValueError):
+            return 0.0
+
+    def channel_state(self, dest: int) -> Optional[dict]:
+        """Return {'level_db', 'mute', 'eq'} for a mixer dest, or None."""
+        entries = self.dest_entries.get(dest)
+        if not entries:
+            return None
+        entry = entries[0]
+        sources = entry.get('sources') or []
+        gain = 0.0
+        mute = bool(entry.get('mute', False))
+        if sources:
+            try:
+                gain = float(sources[0].get('gain', 0.0))
+            except (TypeError, ValueError):
+                gain = 0.0
+            # An entry whose sources are all muted is effectively muted
+            mute = mute or all(bool(s.get('mute', False)) for s in sources)
+        eq = {band: self._filter_gain(self.filter_for(dest, band)) for band in EQ_BANDS}
+        return {'level_db': gain, 'mute': mute, 'eq': eq}
+
+    def to_state(self) -> dict:
+        """Return {dest: channel_state} for every mixer dest."""
+        return {dest: self.channel_state(dest) for dest in self.dests}
+
+    def set_dest_gain(self, dest: int, level_db: float) -> bool:
+        """Set the gain of every source feeding `dest`. Returns True if changed."""
+        updated = False
+        for entry in self.dest_entries.get(dest, ()):
+            for src in entry.get('sources') or []:
+                if src.get('gain') != level_db:
+                    src['gain'] = level_db
+                    updated = True
+        return updated
+
+    def set_dest_mute(self, dest: int, mute: bool) -> bool:
+        updated = False
+        for entry in self.dest_entries.get(dest, ()):
+            if entry.get('mute') != mute:
+                entry['mute'] = mute
+                updated = True
+        return updated
+
+    def set_filter_gain(self, name: str, gain_db: float) -> bool:
+        flt = (self.config.get('filters') or {}).get(name)
+        if not isinstance(flt, dict):
+            return False
+        params = flt.get('parameters')
+        if not isinstance(params, dict) or 'gain' not in params:
+            return False
+        if params['gain'] == gain_db:
+            return False
+        params['gain'] = gain_db
+        return True
+
+    def set_eq_gain(self, channel: int, band: str, gain_db: float) -> bool:
+        name = self.filter_for(channel, band)
+        if not name:
+            return False
+        return self.set_filter_gain(name, gain_db)
@@ -0,0 +1,393 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import stat
+import uuid
+
+from aiohttp import ClientError, ClientSession, UnixConnector, WSCloseCode, WSMsgType, web
+
+from .server import (FRONTEND_DIR, FRONTEND_DIST_DIR, MixerState, get_camilla_status, handle_message,
+                     levels_message, parse_window, patch_message, send_initial_state, send_windowed, state_message)
+
+logger = logging.getLogger('cluster')
+
+BUS_ROUTE = '/_cluster/bus'
+OWNER_URL = 'http://owner'
+CLIENT_ID_LENGTH = 8
+RECONNECT_BASE = 0.25
+RECONNECT_MAX = 5.0
+# a viewer greets clients only once it mirrors the owner's state
+OWNER_WAIT_SECONDS = 5.0
+BUS_HEARTBEAT = 5.0
+# answered by the viewer from its mirror, never forwarded
+LOCAL_TYPES = ('subscribe_channels', 'subscribe_levels')
+# broadcasts a viewer keeps to greet new clients with
+CACHED_TYPES = ('autosave_settings', 'camilla_status')
+AUTOSAVE_PREFIX = json.dumps({'type': 'autosave_settings'})[:-1]
+PROXY_CHUNK_SIZE = 64 * 1024
+HOP_HEADERS = frozenset(('connection', 'keep-alive', 'proxy-connection', 'te', 'trailer',
+                         'transfer-encoding', 'upgrade', 'host'))
+
+
+# --- DSP owner side --------------------------------------------------------
+
+class RemoteClient(dict):
+    """A viewer's client, as seen by the owner's message handlers.
+
+    Quacks like the `web.WebSocketResponse` of a local client (items
+    `client_id`/`window`/`transport`, `send_*`, `closed`); what is sent to
+    it is routed back to the viewer over the bus.
+    """
+
+    # identity, not contents: kept in sets and removed from lists
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def __init__(self, link, client_id: str):
+        super().__init__(client_id=client_id, transport=link.get('transport'), window=None)
+        self.link = link
+        self.closed = False
+
+    async def send_str(self, data: str):
+        await self.link.ws.send_str('@' + self['client_id'] + data)
+
+    async def send_json(self, obj):
+        await self.send_str(json.dumps(obj))
+
+    async def send_bytes(self, data: bytes):
+        await self.link.ws.send_bytes(self['client_id'].encode('ascii') + data)
+
+
+class WorkerLink(dict):
+    """A viewer process on the bus, registered in `app['sockets']`.
+
+    Broadcasts reach it like any client without a channel window, i.e. as
+    one full frame per broadcast; the viewer windows them for its clients.
+    """
+
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def __init__(self, ws, name: str, transport):
+        super().__init__(client_id=name, transport=transport, window=None, client_count=0)
+        self.ws = ws
+        self.clients = {}
+
+    @property
+    def closed(self) -> bool:
+        return self.ws.closed
+
+    async def send_str(self, data: str):
+        await self.ws.send_str('*' + data)
+
+    async def send_json(self, obj):
+        await self.send_str(json.dumps(obj))
+
+
+def drop_client(app, link: WorkerLink, client_id: str):
+    client = link.clients.pop(client_id, None)
+    if client is None:
+        return
+    client.closed = True
+    if app.get('analyzer') is not None:
+        app['analyzer'].unsubscribe(client)
+    link['client_count'] = len(link.clients)
+
+
+async def bus_handler(request):
+    """Bus endpoint of the DSP owner, for viewer processes (Unix socket only).
+
+    Owner to viewer: `*<json>` broadcast (full frame, not windowed),
+    `@<id><json>` message for one client, binary `<id><bytes>` for one
+    client. Viewer to owner: `o<id>` client connected, `m<id><json>` client
+    message, `c<id>` client gone. Client ids are CLIENT_ID_LENGTH chars.
+    """
+    if not isinstance(request.transport.get_extra_info('sockname'), str):
+        raise web.HTTPNotFound()
+    ws = web.WebSocketResponse(max_msg_size=0)
+    await ws.prepare(request)
+
+    app = request.app
+    link = WorkerLink(ws, f"viewer-{request.query.get('pid', '?')}", request.transport)
+    # the viewer mirrors this state; the broadcasts that follow keep it current
+    await link.send_json(state_message(app['mixer']))
+    await link.send_json({'type': 'autosave_settings', 'payload': {'enabled': app['autosave_enabled'], 'interval_sec': app['autosave_interval']}})
+    await link.send_json({'type': 'camilla_status', 'payload': get_camilla_status(app.get('adapter'))})
+    app['sockets'].append(link)
+    logger.info('Viewer process connected (%s)', link['client_id'])
+
+    try:
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            kind = msg.data[:1]
+            client_id = msg.data[1:1 + CLIENT_ID_LENGTH]
+            if kind == 'm':
+                client = link.clients.get(client_id)
+                if client is None:
+                    continue
+                try:
+                    await handle_message(app, client, msg.data[1 + CLIENT_ID_LENGTH:])
+                except Exception:
+                    logger.exception('failed to handle message of viewer client %s', client_id)
+            elif kind == 'o':
+                link.clients[client_id] = RemoteClient(link, client_id)
+                link['client_count'] = len(link.clients)
+            elif kind == 'c':
+                drop_client(app, link, client_id)
+    finally:
+        app['sockets'].remove(link)
+        for client_id in list(link.clients):
+            drop_client(app, link, client_id)
+        logger.info('Viewer process disconnected (%s)', link['client_id'])
+
+    return ws
+
+
+# --- viewer side -----------------------------------------------------------
+
+async def bus_send(app, data: str) -> bool:
+    bus = app.get('bus')
+    if bus is None or bus.closed:
+        return False
+    try:
+        await bus.send_str(data)
+    except ConnectionError:
+        return False
+    return True
+
+
+async def on_broadcast(app, text: str):
+    """Apply an owner broadcast to the mirror and fan it out, windowed per client."""
+    msg = json.loads(text)
+    typ = msg.get('type')
+    payload = msg.get('payload')
+    mixer = app['mixer']
+    # clients without a window get the owner's frame as is
+    full = {(0, None): text}
+    if typ == 'state':
+        mixer.load_state(payload)
+        app['ready'].set()
+        await send_windowed(app, lambda start, stop: state_message(mixer, start, stop), full)
+    elif typ == 'state_patch':
+        mixer.apply_patch(payload)
+        await send_windowed(app, lambda start, stop: patch_message(
+            mixer, payload['changes'], payload['any_solo'], start, stop), full)
+    elif typ == 'levels':
+        await send_windowed(app, lambda start, stop: levels_message(
+            payload['channels'], payload.get('ts'), start, stop), full)
+    else:
+        if typ in CACHED_TYPES:
+            app['cached'][typ] = text
+        for ws in list(app['sockets']):
+            try:
+                await ws.send_str(text)
+            except Exception:
+                pass
+
+
+async def on_routed(app, client_id: str, data):
+    ws = app['clients'].get(client_id)
+    if ws is None:
+        return
+    try:
+        if isinstance(data, str):
+            if data.startswith(AUTOSAVE_PREFIX):
+                # settings are global: the reply to one client is news for all
+                app['cached']['autosave_settings'] = data
+            await ws.send_str(data)
+        else:
+            await ws.send_bytes(data)
+    except Exception:
+        pass
+
+
+async def close_clients(app):
+    # clients reconnect (and resume) once the bus is back
+    for ws in list(app['sockets']):
+        try:
+            await ws.close(code=WSCloseCode.SERVICE_RESTART, message=b'DSP owner unavailable')
+        except Exception:
+            pass
+
+
+async def bus_loop(app):
+    """Keep the viewer subscribed to the owner's bus, with jittered backoff."""
+    delay = RECONNECT_BASE
+    while True:
+        try:
+            async with app['session'].ws_connect(OWNER_URL + BUS_ROUTE, params={'pid': str(os.getpid())},
+                                                 max_msg_size=0, heartbeat=BUS_HEARTBEAT) as bus:
+                app['bus'] = bus
+                delay = RECONNECT_BASE
+                logger.info('Connected to the DSP owner')
+                async for msg in bus:
+                    if msg.type == WSMsgType.TEXT:
+                        if msg.data[:1] == '*':
+                            await on_broadcast(app, msg.data[1:])
+                        else:
+                            await on_routed(app, msg.data[1:1 + CLIENT_ID_LENGTH], msg.data[1 + CLIENT_ID_LENGTH:])
+                    elif msg.type == WSMsgType.BINARY:
+                        await on_routed(app, msg.data[:CLIENT_ID_LENGTH].decode('ascii'), msg.data[CLIENT_ID_LENGTH:])
+                logger.warning('Lost the DSP owner')
+        except asyncio.CancelledError:
+            raise
+        except (ClientError, OSError) as e:
+            logger.debug('DSP owner unreachable: %s', e)
+        except Exception:
+            logger.exception('cluster bus failed')
+        app['bus'] = None
+        app['ready'].clear()
+        await close_clients(app)
+        await asyncio.sleep(random.uniform(0, delay))
+        delay = min(delay * 2, RECONNECT_MAX)
+
+
+async def viewer_websocket_handler(request):
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+
+    app = request.app
+    client_id = uuid.uuid4().hex[:CLIENT_ID_LENGTH]
+    ws['client_id'] = client_id
+    ws['transport'] = request.transport
+    try:
+        ws['window'] = parse_window(request.query.get('start'), request.query.get('count'))
+    except ValueError:
+        ws['window'] = None
+    try:
+        await asyncio.wait_for(app['ready'].wait(), OWNER_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        await ws.close(code=WSCloseCode.TRY_AGAIN_LATER, message=b'DSP owner unavailable')
+        return ws
+
+    # registered before the initial state is built so no broadcast falls in between
+    app['sockets'].append(ws)
+    app['clients'][client_id] = ws
+    await bus_send(app, 'o' + client_id)
+    try:
+        # served from the mirror, without a round trip to the owner
+        await send_initial_state(app, ws, request.query.get('resume'))
+        for text in list(app['cached'].values()):
+            await ws.send_str(text)
+    except Exception:
+        logger.exception('failed to send initial state to ws client')
+
+    try:
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                typ = json.loads(msg.data).get('type')
+            except Exception:
+                typ = None
+            if typ in LOCAL_TYPES:
+                await handle_message(app, ws, msg.data)
+            elif not await bus_send(app, 'm' + client_id + msg.data):
+                await ws.send_json({'type': 'error', 'payload': 'DSP owner unavailable'})
+    finally:
+        app['sockets'].remove(ws)
+        app['clients'].pop(client_id, None)
+        await bus_send(app, 'c' + client_id)
+
+    return ws
+
+
+async def proxy_handler(request):
+    """Forward an HTTP API request to the DSP owner over its Unix socket."""
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+    try:
+        async with request.app['session'].request(
+                request.method, OWNER_URL + request.path_qs, headers=headers,
+                data=request.content if request.body_exists else None, allow_redirects=False) as upstream:
+            response = web.StreamResponse(status=upstream.status, reason=upstream.reason, headers={
+                k: v for k, v in upstream.headers.items() if k.lower() not in HOP_HEADERS})
+            await response.prepare(request)
+            async for chunk in upstream.content.iter_chunked(PROXY_CHUNK_SIZE):
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+    except ClientError as e:
+        raise web.HTTPBadGateway(text=f'DSP owner unavailable: {e}')
+
+
+def create_viewer_app(bus_path: str) -> web.Application:
+    """App of a viewer process: serves WebSocket clients from a mirror of the owner's mixer.
+
+    Control messages are forwarded to the owner; the HTTP API is proxied to
+    it; frontend assets are served locally.
+    """
+    from .static import StaticAssets
+    app = web.Application()
+    app['sockets'] = []
+    app['clients'] = {}  # client id -> ws
+    app['mixer'] = MixerState(channels=0)
+    app['cached'] = {}
+    app['bus'] = None
+    app['ready'] = asyncio.Event()
+    app['static'] = StaticAssets(FRONTEND_DIR, FRONTEND_DIST_DIR)
+    app.router.add_get('/', app['static'].handle)
+    app.router.add_get('/ws', viewer_websocket_handler)
+    app.router.add_route('*', '/api/{path:.*}', proxy_handler)
+    app.router.add_get('/metrics', proxy_handler)
+    app.router.add_get('/{path:.+}', app['static'].handle)
+
+    async def on_startup(app):
+        # responses are relayed as the owner encoded them
+        app['session'] = ClientSession(connector=UnixConnector(path=bus_path), auto_decompress=False)
+        app['bus_task'] = asyncio.create_task(bus_loop(app))
+
+    async def on_cleanup(app):
+        app['bus_task'].cancel()
+        try:
+            await app['bus_task']
+        except asyncio.CancelledError:
+            pass
+        await app['session'].close()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def run_viewer(bus_path: str, host: str, port: int, index: int):
+    from .logger import LOG_PATH, setup_logging
+    root, ext = os.path.splitext(LOG_PATH)
+    # one log file per process: rotation is not safe across processes
+    setup_logging(f'{root}.viewer{index}{ext}')
+    web.run_app(create_viewer_app(bus_path), host=host, port=port, reuse_port=True, print=None)
+
+
+def run_cluster(app, workers: int, bus_path: str, host: str, port: int):
+    """Serve `app` as the DSP owner alongside `workers - 1` viewer processes.
+
+    Every process accepts connections on host:port (SO_REUSEPORT: the
+    kernel spreads clients across them). Only the owner holds the adapter
+    and the mixer; it also listens on the Unix socket `bus_path`, which the
+    viewers use as state bus and to forward HTTP API requests.
+    """
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        logger.error('SO_REUSEPORT unavailable, serving from a single process')
+        web.run_app(app, host=host, port=port)
+        return
+    if os.path.exists(bus_path) and stat.S_ISSOCK(os.stat(bus_path).st_mode):
+        # left over by a previous run
+        os.unlink(bus_path)
+    context = multiprocessing.get_context('spawn')
+    viewers = [context.Process(target=run_viewer, args=(bus_path, host, port, index),
+                               name=f'camillamix-viewer-{index}', daemon=True)
+               for index in range(1, workers)]
+    for process in viewers:
+        process.start()
+    logger.info('Serving from %d processes (bus %s)', workers, bus_path)
+    try:
+        web.run_app(app, host=host, port=port, path=bus_path, reuse_port=True)
+    finally:
+        for process in viewers:
+            process.terminate()
+        for process in viewers:
+            process.join(5)
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from .metrics import DSP_EXTERNAL_CHANGES_TOTAL
+
+logger = logging.getLogger('dsp_sync')
+
+DEFAULT_TTL = 5.0
+DEFAULT_WATCH_INTERVAL = 1.0
+DEFAULT_CONFIG_EVERY = 5
+
+
+def apply_dsp_state(mixer, dsp_state: dict, as_of: Optional[int] = None) -> bool:
+    """Bring the mixer in line with a `get_current_state` snapshot of the DSP.
+
+    Only fields that differ are touched, so clients keep their revisions
+    (and can still resume) when the DSP agrees with the mixer.
+
+    Args:
+        mixer: MixerState to update
+        dsp_state: Snapshot from the adapter
+        as_of: Mixer revision when the snapshot was requested; fields changed
+            locally since then are newer than the snapshot and kept
+
+    Returns:
+        True if anything changed
+    """
+    if as_of is not None and mixer.base_revision > as_of:
+        # preset load, resize or scene step while fetching: the snapshot is stale
+        return False
+
+    def update(channel, field, value):
+        if as_of is not None and mixer.field_revision(channel, field) > as_of:
+            return False
+        return mixer.set_field(channel, field, value)
+
+    changed = False
+    # Update Master
+    for field in ('level_db', 'mute'):
+        if field in dsp_state['master']:
+            changed = update('master', field, dsp_state['master'][field]) or changed
+
+    # Follow the channel count of the active DSP config
+    if dsp_state.get('channel_count') and mixer.resize(dsp_state['channel_count']):
+        logger.info('Mixer resized to %d channels from the DSP config', len(mixer.channels))
+        changed = True
+        # the resize is ours: the snapshot is still newer than every field
+        if as_of is not None:
+            as_of = mixer.revision
+
+    # Update Channels (mixer channel i has index i); while a solo is active
+    # the DSP mutes are derived from it and say nothing about the mute buttons
+    solo_active = any(ch['solo'] for ch in mixer.channels)
+    for dest, ch_data in dsp_state['channels'].items():
+        if 0 <= dest < len(mixer.channels):
+            changed = update(dest, 'level_db', ch_data['level_db']) or changed
+            if not solo_active:
+                changed = update(dest, 'mute', ch_data['mute']) or changed
+            for band, gain_db in ch_data.get('eq', {}).items():
+                changed = update(dest, f'eq.{band}', gain_db) or changed
+    return changed
+
+
+class DspStateSync:
+    """Shared refresh of the mixer from the DSP's current state.
+
+    `get_current_state` downloads the whole CamillaDSP config, so it is not
+    run once per connecting client: concurrent refreshes share a single
+    fetch (single-flight), and a state fetched less than `ttl` seconds ago
+    is considered fresh. Clients are served from the in-memory mixer right
+    away; what a refresh changes reaches them through `on_change` (a state
+    broadcast). Only the very first sync is waited for, so the first client
+    does not see default strips.
+    """
+
+    def __init__(self, adapter, mixer, ttl: float = DEFAULT_TTL, on_change: Optional[Callable] = None):
+        self.adapter = adapter
+        self.mixer = mixer
+        self.ttl = ttl
+        self.on_change = on_change
+        self.fetches = 0
+        self.synced_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def fresh(self) -> bool:
+        return self.synced_at is not None and time.monotonic() - self.synced_at < self.ttl
+
+    def refresh(self) -> Optional[asyncio.Task]:
+        """Start a sync unless one is running or the last one is fresh.
+
+        Returns the running sync task, or None if there is nothing to do.
+        """
+        if self._task is not None and not self._task.done():
+            return self._task
+        if self.fresh or not getattr(self.adapter, '_py_connected', False):
+            return None
+        self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def ensure(self):
+        """Refresh in the background; only wait when the mixer was never synced."""
+        task = self.refresh()
+        if task is not None and self.synced_at is None:
+            # a client going away must not cancel the fetch the others share
+            await asyncio.shield(task)
+
+    async def _run(self):
+        started = time.monotonic()
+        as_of = self.mixer.revision
+        self.fetches += 1
+        try:
+            dsp_state = await asyncio.to_thread(self.adapter.get_current_state)
+        except Exception as e:
+            logger.error(f"Error syncing with DSP: {e}")
+            return
+        self.synced_at = started
+        if dsp_state and apply_dsp_state(self.mixer, dsp_state, as_of) and self.on_change is not None:
+            self.on_change()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class DspWatcher:
+    """Background poll for changes made on the DSP behind our back.
+
+    Every `interval` seconds the main volume and mute are read; every
+    `config_every` ticks the active config is fetched as well and compared
+    with the adapter's cached model (CamillaDSP pushes no change
+    notifications and has no config revision). Differences are applied to
+    the mixer field by field and `on_change` is called, so clients get a
+    `state_patch` of the changed fields only; when nothing changed nothing
+    is sent.
+
+    Ticks are skipped while the mixer is changing locally: our own DSP
+    pushes may still be in flight and would read as external changes.
+    """
+
+    def __init__(self, adapter, mixer, interval: float = DEFAULT_WATCH_INTERVAL,
+                 config_every: int = DEFAULT_CONFIG_EVERY, on_change: Optional[Callable] = None):
+        self.adapter = adapter
+        self.mixer = mixer
+        self.interval = interval
+        self.config_every = max(1, int(config_every))
+        self.on_change = on_change
+        self._task: Optional[asyncio.Task] = None
+        self._seen_revision = None
+        self._ticks = 0
+
+    def start(self):
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def poll(self) -> bool:
+        """Run one check now. Returns True if the mixer was updated."""
+        as_of = self.mixer.revision
+        quiet = as_of == self._seen_revision
+        self._seen_revision = as_of
+        if not quiet or not getattr(self.adapter, '_py_connected', False):
+            return False
+        self._ticks += 1
+        with_config = self._ticks % self.config_every == 0
+        dsp_state = await asyncio.to_thread(self.adapter.poll_changes, with_config)
+        if not dsp_state or not apply_dsp_state(self.mixer, dsp_state, as_of):
+            return False
+        logger.info('Picked up a change made on the DSP')
+        DSP_EXTERNAL_CHANGES_TOTAL.inc()
+        # our own update: not a local change for the next tick
+        self._seen_revision = self.mixer.revision
+        if self.on_change is not None:
+            self.on_change()
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('DSP watcher poll failed')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,19 +1,157 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import time
 
 LOG_PATH = os.path.join(os.path.dirname(__file__), 'actions.log')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(5 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+# Window during which identical exceptions are collapsed into one record
+DUPLICATE_INTERVAL_SEC = 10.0
 
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
 
-def setup_logging():
+_listener = None
+_console_handler = None
+_queue_handler = None
+# console handlers (e.g. from basicConfig) detached while the queue is in use
+_replaced = []
+
+
+class LazyJson:
+    """Defer `json.dumps` of a log argument until the record is formatted.
+
+    Nothing is rendered if the record is filtered out (level, duplicate
+    suppression), so a disabled log call only pays for wrapping the object.
+    """
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        try:
+            return json.dumps(self.obj)
+        except Exception:
+            return repr(self.obj)
+
+
+class DuplicateFilter(logging.Filter):
+    """Rate-limit repeated exceptions coming from the same call site.
+
+    The first occurrence is logged; identical ones within `interval` seconds
+    are dropped and counted, and the next one logged after the window
+    reports how many were suppressed.
+    """
+
+    def __init__(self, interval: float = DUPLICATE_INTERVAL_SEC, max_keys: int = 256):
+        super().__init__()
+        self.interval = interval
+        self.max_keys = max_keys
+        self._seen = {}  # key -> [last_emit_time, suppressed_count]
+
+    def filter(self, record):
+        if not record.exc_info:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info[0] else None
+        key = (record.name, record.pathname, record.lineno, exc_type)
+        now = time.monotonic()
+        entry = self._seen.get(key)
+        if entry is not None and now - entry[0] < self.interval:
+            entry[1] += 1
+            return False
+        if entry is not None and entry[1]:
+            record.msg = f'{record.msg} [{entry[1]} similar suppressed]'
+        if len(self._seen) >= self.max_keys and key not in self._seen:
+            self._seen.clear()
+        self._seen[key] = [now, 0]
+        return True
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves traceback rendering to the listener thread.
+
+    The message is merged with its args in the calling thread, as the stock
+    `prepare()` does, since the caller may change a logged object once the
+    call returns. Unlike the stock handler it does not format the whole
+    record: tracebacks and the line layout are rendered by the handlers
+    attached to the `QueueListener`.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(log_path: str = LOG_PATH, console_enabled: bool = True):
+    """Route all logging through a queue drained by a background listener.
+
+    Console output and the rotating `actions.log` file are written from the
+    listener thread, so emitting a record never blocks the event loop on I/O.
+    Plain console handlers already on the root logger (basicConfig) are
+    detached until `stop_logging`; other handlers are left alone. Calling it
+    again is a no-op.
+    """
+    global _listener, _console_handler, _queue_handler
     logger = logging.getLogger()
-    # ensure basic console handler exists
-    if not logger.handlers:
-        ch = logging.StreamHandler()
-        ch.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
-        logger.addHandler(ch)
-    # add file handler
-    fh = logging.FileHandler(LOG_PATH)
-    fh.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
-    logger.addHandler(fh)
     logger.setLevel(logging.INFO)
+    if _listener is not None:
+        return logger
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    _console_handler = logging.StreamHandler()
+    _console_handler.setFormatter(formatter)
+    if not console_enabled:
+        _console_handler.setLevel(logging.CRITICAL + 1)
+    fh = logging.handlers.RotatingFileHandler(
+        log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+        encoding='utf-8', delay=True)
+    fh.setFormatter(formatter)
+
+    # the queue replaces direct console handlers (e.g. from basicConfig)
+    for handler in list(logger.handlers):
+        if type(handler) is logging.StreamHandler:
+            logger.removeHandler(handler)
+            _replaced.append(handler)
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _LazyQueueHandler(log_queue)
+    _queue_handler.addFilter(DuplicateFilter())
+    logger.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, _console_handler, fh, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
     return logger
+
+
+def stop_logging():
+    """Flush pending records, stop the listener thread and restore the handlers."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logger = logging.getLogger()
+    logger.removeHandler(_queue_handler)
+    _queue_handler = None
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    while _replaced:
+        logger.addHandler(_replaced.pop(0))
+
+
+def set_console_enabled(enabled: bool):
+    if _console_handler is not None:
+        _console_handler.setLevel(logging.INFO if enabled else logging.CRITICAL + 1)
+
+
+def get_console_enabled() -> bool:
+    if _console_handler is None:
+        return True
+    return _console_handler.level < logging.CRITICAL
@@ -0,0 +1,166 @@
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger('meter_ring')
+
+MAGIC = b'CMXMETR1'
+VERSION = 1
+HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 32
+DEFAULT_SLOTS = 64
+# header: magic, version, slot count, capacity, slot size, last frame, flags, writer pid
+HEADER = struct.Struct('<8sIIIIQII')
+FRAME_OFFSET = 24
+FLAGS_OFFSET = 32
+# slot: sequence, timestamp, value count, flags
+SLOT = struct.Struct('<QdII')
+SEQ = struct.Struct('<Q')
+FLAG_CLOSED = 1  # header flags
+FLAG_SIMULATED = 1  # slot flags
+READ_RETRIES = 4
+
+
+class MeterFrame(NamedTuple):
+    frame: int
+    ts: float
+    rms: list  # dB, master first, then channel i at i + 1
+    peak: list
+    simulated: bool
+
+
+class MeterRing:
+    """Publishes meter frames into a memory-mapped ring for local consumers.
+
+    Layout (little-endian). Header, 64 bytes: `magic` 8s (`CMXMETR1`),
+    `version` u32, `slot_count` u32, `capacity` u32 (values per array),
+    `slot_size` u32, `frame` u64 at offset 24 (last complete frame, 0 for
+    none), `flags` u32 at 32 (1: writer gone), `pid` u32. Frame n lives in
+    slot n % slot_count, at 64 + slot * slot_size: `seq` u64, `ts` f64
+    (server wall clock), `count` u32 (values used), `flags` u32 (1:
+    simulated levels), 8 reserved bytes, then `rms` and `peak` as
+    `capacity` f32 each, master first.
+
+    `seq` is a per-slot seqlock: odd while the slot is written, 2n once it
+    holds frame n. A reader reads `frame`, copies the slot, and keeps the
+    copy only if `seq` was 2n before and after.
+
+    The file is replaced, not rewritten, on start, so readers of a previous
+    run keep a consistent (closed) mapping until they reopen.
+    """
+
+    def __init__(self, path: str, capacity: int, slots: int = DEFAULT_SLOTS):
+        self.path = path
+        self.capacity = capacity
+        self.slots = max(2, int(slots))
+        self.slot_size = SLOT_HEADER_SIZE + 2 * 4 * capacity
+        self.size = HEADER_SIZE + self.slots * self.slot_size
+        self.frame = 0
+        self._values = {}  # count -> struct for `count` f32
+        self._mm = None
+
+    def open(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix='.meters-', dir=directory)
+        try:
+            os.ftruncate(fd, self.size)
+            self._mm = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, self.slots, self.capacity, self.slot_size,
+                         0, 0, os.getpid())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, self.path)
+        logger.info('Publishing meters to %s (%d slots of %d values)', self.path, self.slots, self.capacity)
+
+    def publish(self, rms: list, peak: list, ts: float, simulated: bool = False) -> int:
+        """Write one frame (master first). Returns its frame number."""
+        count = min(len(rms), len(peak), self.capacity)
+        values = self._values.get(count)
+        if values is None:
+            values = self._values[count] = struct.Struct(f'<{count}f')
+        frame = self.frame + 1
+        offset = HEADER_SIZE + (frame % self.slots) * self.slot_size
+        mm = self._mm
+        SLOT.pack_into(mm, offset, 2 * frame - 1, ts, count, FLAG_SIMULATED if simulated else 0)
+        values.pack_into(mm, offset + SLOT_HEADER_SIZE, *rms[:count])
+        values.pack_into(mm, offset + SLOT_HEADER_SIZE + 4 * self.capacity, *peak[:count])
+        SEQ.pack_into(mm, offset, 2 * frame)
+        SEQ.pack_into(mm, FRAME_OFFSET, frame)
+        self.frame = frame
+        return frame
+
+    def publish_levels(self, levels: list, ts: float, simulated: bool = False) -> int:
+        """Write a `levels` list as built by the broadcaster (master first)."""
+        return self.publish([item['level_db'] for item in levels], [item['peak_db'] for item in levels],
+                            ts, simulated)
+
+    def close(self):
+        if self._mm is None:
+            return
+        struct.pack_into('<I', self._mm, FLAGS_OFFSET, FLAG_CLOSED)
+        self._mm.close()
+        self._mm = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class MeterRingReader:
+    """Reads frames published by a `MeterRing` (see its layout)."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slots, self.capacity, self.slot_size, _, _, self.pid = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f'{path} is not a meter ring (version {VERSION})')
+        self._values = {}
+
+    @property
+    def closed(self) -> bool:
+        """True once the writer has stopped: reopen to follow a new one."""
+        return bool(struct.unpack_from('<I', self._mm, FLAGS_OFFSET)[0] & FLAG_CLOSED)
+
+    @property
+    def frame(self) -> int:
+        return SEQ.unpack_from(self._mm, FRAME_OFFSET)[0]
+
+    def read(self, frame: int) -> Optional[MeterFrame]:
+        """Copy frame `frame`, or None if it is not (or no longer) in the ring."""
+        if frame <= 0:
+            return None
+        offset = HEADER_SIZE + (frame % self.slots) * self.slot_size
+        mm = self._mm
+        for _ in range(READ_RETRIES):
+            seq, ts, count, flags = SLOT.unpack_from(mm, offset)
+            if seq == 2 * frame - 1:
+                # being written right now
+                continue
+            if seq != 2 * frame:
+                return None
+            values = self._values.get(count)
+            if values is None:
+                values = self._values[count] = struct.Struct(f'<{count}f')
+            rms = list(values.unpack_from(mm, offset + SLOT_HEADER_SIZE))
+            peak = list(values.unpack_from(mm, offset + SLOT_HEADER_SIZE + 4 * self.capacity))
+            if SEQ.unpack_from(mm, offset)[0] == seq:
+                return MeterFrame(frame, ts, rms, peak, bool(flags & FLAG_SIMULATED))
+        return None
+
+    def latest(self) -> Optional[MeterFrame]:
+        return self.read(self.frame)
+
+    def frames_since(self, frame: int) -> list:
+        """Frames after `frame` still in the ring, oldest first."""
+        last = self.frame
+        first = max(frame + 1, last - self.slots + 2)
+        return [f for f in (self.read(n) for n in range(first, last + 1)) if f is not None]
+
+    def close(self):
+        self._mm.close()
@@ -0,0 +1,268 @@
+import abc
+import bisect
+import functools
+import time
+from typing import Callable, Optional
+
+# Latency buckets (seconds) covering sub-millisecond DSP calls up to slow
+# full-config reloads.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric(abc.ABC):
+    """Base class for a metric family with optional labels.
+
+    Children are created once per label set and cached, so hot paths should
+    keep a reference to `metric.labels(...)` instead of looking it up per
+    call. Updates are plain attribute arithmetic without locking: the rare
+    lost increment under thread contention is an accepted trade-off for
+    keeping observations in the sub-microsecond range.
+    """
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+        (registry if registry is not None else REGISTRY).register(self)
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Return a fresh child holding one label set's value."""
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            child = self._children[key] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        self._children.pop(tuple(str(v) for v in values), None)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> list:
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}']
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    """Gauge whose value is either set directly or computed at scrape time.
+
+    `set_function(fn)` registers a callback returning an iterable of
+    `(label_values, value)` pairs; it runs only when /metrics is scraped,
+    which keeps per-client gauges free on the hot path.
+    """
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        self._function: Optional[Callable] = None
+        super().__init__(*args, **kwargs)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.value = value
+
+    def set_function(self, fn: Optional[Callable]):
+        self._function = fn
+
+    def render(self) -> list:
+        if self._function is None:
+            return super().render()
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        try:
+            samples = list(self._function())
+        except Exception:
+            samples = []
+        for key, value in samples:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+def timed(child):
+    """Decorator observing the wall time of each call into a histogram child."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self):
+        return _Timer(self._default)
+
+    def _render_child(self, key, child) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(child.sum)}')
+        lines.append(f'{self.name}_count{labels} {child.count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: _Metric):
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+ADAPTER_CALL_SECONDS = Histogram(
+    'camillamix_adapter_call_seconds', 'Duration of CamillaDSP adapter calls.', ['method'])
+BROADCAST_TICK_SECONDS = Histogram(
+    'camillamix_broadcast_tick_seconds', 'Time spent in one levels broadcaster iteration.')
+BROADCAST_LAG_SECONDS = Histogram(
+    'camillamix_broadcast_lag_seconds', 'Broadcaster wake-up delay beyond the configured interval.')
+WS_SEND_BUFFER_BYTES = Gauge(
+    'camillamix_ws_send_buffer_bytes', 'Bytes queued in the transport of each WebSocket client.', ['client'])
+WS_CLIENTS = Gauge(
+    'camillamix_ws_clients', 'Number of connected WebSocket clients.')
+WS_MESSAGES_TOTAL = Counter(
+    'camillamix_ws_messages_total', 'WebSocket messages received, by type.', ['type'])
+WS_INITIAL_SYNC_TOTAL = Counter(
+    'camillamix_ws_initial_sync_total', 'WebSocket connections by initial sync: resumed from a revision or full state.',
+    ['kind'])
+AUTOSAVE_SECONDS = Histogram(
+    'camillamix_autosave_seconds', 'Duration of autosave preset writes.')
+DSP_RECONNECTS_TOTAL = Counter(
+    'camillamix_dsp_reconnects_total', 'Connection retries towards CamillaDSP/CamillaGUI.', ['transport'])
+DSP_EXTERNAL_CHANGES_TOTAL = Counter(
+    'camillamix_dsp_external_changes_total', 'Changes made on the DSP by another client, picked up by the watcher.')
+LOOP_LAG_SECONDS = Histogram(
+    'camillamix_loop_lag_seconds', 'Event-loop wake-up lag measured by the watchdog probe.')
+LOOP_STALLS_TOTAL = Counter(
+    'camillamix_loop_stalls_total', 'Event-loop stalls beyond the watchdog threshold.')
+ANALYZER_FRAME_SECONDS = Histogram(
+    'camillamix_analyzer_frame_seconds', 'Time spent computing and encoding one spectrum analyzer frame.')
@@ -0,0 +1,303 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import tarfile
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger('preset_archive')
+
+ARCHIVE_FORMAT = 1
+MANIFEST_NAME = 'manifest.json'
+PRESET_PREFIX = 'presets/'
+CHUNK_SIZE = 64 * 1024
+MAX_ARCHIVE_BYTES = 64 * 1024 * 1024
+MAX_MEMBER_BYTES = 4 * 1024 * 1024
+MAX_PRESETS = 10000
+# minimum delay between two progress notifications of a job
+PROGRESS_INTERVAL = 0.25
+MAX_FINISHED_JOBS = 20
+
+
+class ArchiveError(ValueError):
+    """Raised when an uploaded archive is malformed or fails validation."""
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file object collecting what tarfile writes until taken."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _add_member(tar: tarfile.TarFile, name: str, data: bytes, mtime: float):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    tar.addfile(info, io.BytesIO(data))
+
+
+async def write_archive(presets, names: list, write: Callable[[bytes], Awaitable],
+                        progress: Optional[Callable[[int, int], Awaitable]] = None) -> dict:
+    """Stream presets as a tar.gz archive through `write`.
+
+    Presets are added one at a time and the compressed bytes are handed to
+    `write` after each one, so only the preset being written is held in
+    memory. The manifest (names, sizes, SHA-256) is the last member.
+
+    Returns:
+        The manifest dict
+    """
+    drain = _Drain()
+    entries = []
+    missing = []
+    now = time.time()
+    total = len(names)
+    with tarfile.open(fileobj=drain, mode='w|gz') as tar:
+        for done, name in enumerate(names, 1):
+            state = await presets.load_preset(name)
+            if state is None:
+                missing.append(name)
+            else:
+                data = json.dumps({'version': 1, 'state': state}, indent=2, ensure_ascii=False).encode('utf-8')
+                path = f'{PRESET_PREFIX}{name}.json'
+                _add_member(tar, path, data, now)
+                entries.append({'name': name, 'file': path, 'size': len(data),
+                                'sha256': hashlib.sha256(data).hexdigest()})
+                chunk = drain.take()
+                if chunk:
+                    await write(chunk)
+            if progress:
+                await progress(done, total)
+        manifest = {'format': ARCHIVE_FORMAT, 'created': now, 'presets': entries, 'missing': missing}
+        _add_member(tar, MANIFEST_NAME, json.dumps(manifest, indent=2).encode('utf-8'), now)
+    tail = drain.take()
+    if tail:
+        await write(tail)
+    return manifest
+
+
+def _read_member(tar: tarfile.TarFile, member: tarfile.TarInfo) -> bytes:
+    if not member.isfile():
+        raise ArchiveError(f'{member.name} is not a regular file')
+    if member.size > MAX_MEMBER_BYTES:
+        raise ArchiveError(f'{member.name} is too large')
+    return tar.extractfile(member).read()
+
+
+def _parse_preset(entry: dict, data: bytes) -> dict:
+    if hashlib.sha256(data).hexdigest() != entry['sha256']:
+        raise ArchiveError(f"checksum mismatch for {entry['name']}")
+    try:
+        state = json.loads(data.decode('utf-8')).get('state')
+    except (ValueError, AttributeError):
+        raise ArchiveError(f"{entry['name']} is not a valid preset file")
+    if not isinstance(state, dict):
+        raise ArchiveError(f"{entry['name']} has no mixer state")
+    return state
+
+
+def validate_archive(path: str, validate_name: Callable[[str], str]) -> list:
+    """Check an archive against its manifest without importing anything.
+
+    Every listed preset must be present once, match its checksum and hold a
+    mixer state; names go through `validate_name`.
+
+    Returns:
+        The manifest entries
+
+    Raises:
+        ArchiveError: If the archive is invalid
+    """
+    try:
+        with tarfile.open(path, mode='r:gz') as tar:
+            try:
+                manifest = json.loads(_read_member(tar, tar.getmember(MANIFEST_NAME)).decode('utf-8'))
+            except KeyError:
+                raise ArchiveError('manifest.json missing')
+            except ValueError as e:
+                if isinstance(e, ArchiveError):
+                    raise
+                raise ArchiveError('manifest.json is not valid JSON')
+            if not isinstance(manifest, dict) or manifest.get('format') != ARCHIVE_FORMAT:
+                raise ArchiveError('unsupported archive format')
+            entries = manifest.get('presets')
+            if not isinstance(entries, list) or len(entries) > MAX_PRESETS:
+                raise ArchiveError('invalid preset list in manifest')
+            seen = set()
+            for entry in entries:
+                if not isinstance(entry, dict) or not isinstance(entry.get('sha256'), str):
+                    raise ArchiveError('invalid manifest entry')
+                try:
+                    name = validate_name(entry.get('name'))
+                    if name != entry.get('name'):
+                        raise ValueError('name was altered by sanitization')
+                except ValueError as e:
+                    raise ArchiveError(f"invalid preset name {entry.get('name')!r}: {e}")
+                if name in seen or entry.get('file') != f'{PRESET_PREFIX}{name}.json':
+                    raise ArchiveError(f'duplicate or misplaced preset {name}')
+                seen.add(name)
+                try:
+                    member = tar.getmember(entry['file'])
+                except KeyError:
+                    raise ArchiveError(f'{name} listed in manifest but missing')
+                _parse_preset(entry, _read_member(tar, member))
+            return entries
+    except (tarfile.TarError, OSError, EOFError) as e:
+        raise ArchiveError(f'unreadable archive: {e}')
+
+
+def iter_archive(path: str, entries: list):
+    """Yield (name, state) for the manifest entries in archive order."""
+    by_file = {entry['file']: entry for entry in entries}
+    with tarfile.open(path, mode='r|gz') as tar:
+        for member in tar:
+            entry = by_file.get(member.name)
+            if entry:
+                yield entry['name'], _parse_preset(entry, _read_member(tar, member))
+
+
+class ArchiveJobs:
+    """Runs preset archive exports/imports and reports their progress.
+
+    Each job has a status dict (`id`, `kind`, `state`, `phase`, `done`,
+    `total`, ...) passed to the async `notify` callback when it starts,
+    at most every `PROGRESS_INTERVAL` seconds while it runs, and when it
+    finishes. Imports run as background tasks on an uploaded temp file,
+    which is removed afterwards.
+    """
+
+    def __init__(self, presets, notify: Optional[Callable[[dict], Awaitable]] = None):
+        self.presets = presets
+        self.notify = notify
+        self._jobs = OrderedDict()
+        self._tasks = set()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self._jobs.get(job_id)
+
+    def _new(self, kind: str, total: int = 0) -> dict:
+        job = {'id': uuid.uuid4().hex[:12], 'kind': kind, 'state': 'running', 'phase': kind,
+               'done': 0, 'total': total, 'error': None, 'started': time.time(), 'finished': None}
+        self._jobs[job['id']] = job
+        finished = [k for k, j in self._jobs.items() if j['state'] != 'running']
+        for key in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[key]
+        job['_reported'] = 0.0
+        return job
+
+    async def _report(self, job: dict, force: bool = False):
+        now = time.monotonic()
+        if not force and now - job['_reported'] < PROGRESS_INTERVAL:
+            return
+        job['_reported'] = now
+        if self.notify:
+            try:
+                await self.notify(self.public(job))
+            except Exception:
+                logger.exception('preset job notification failed')
+
+    @staticmethod
+    def public(job: dict) -> dict:
+        return {k: v for k, v in job.items() if not k.startswith('_')}
+
+    async def _finish(self, job: dict, error: Optional[str] = None):
+        job['state'] = 'failed' if error else 'done'
+        job['error'] = error
+        job['finished'] = time.time()
+        await self._report(job, force=True)
+
+    async def export(self, names: list, write: Callable[[bytes], Awaitable]) -> dict:
+        """Stream an archive of `names` through `write` as a tracked job."""
+        job = self._new('export', len(names))
+        await self._report(job, force=True)
+
+        async def progress(done, total):
+            job['done'] = done
+            await self._report(job)
+
+        try:
+            manifest = await write_archive(self.presets, names, write, progress)
+        except Exception as e:
+            await self._finish(job, str(e) or type(e).__name__)
+            raise
+        job['missing'] = manifest['missing']
+        await self._finish(job)
+        return manifest
+
+    def start_import(self, path: str, overwrite: bool = False) -> dict:
+        """Validate and import an uploaded archive in the background.
+
+        Returns:
+            The job status
+        """
+        job = self._new('import')
+        job.update({'phase': 'validate', 'imported': [], 'skipped': []})
+        task = asyncio.create_task(self._run_import(job, path, overwrite))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return self.public(job)
+
+    async def _run_import(self, job: dict, path: str, overwrite: bool):
+        try:
+            await self._report(job, force=True)
+            entries = await asyncio.to_thread(validate_archive, path, self.presets._validate_preset_name)
+            job['phase'] = 'import'
+            job['total'] = len(entries)
+            existing = set(self.presets.list_presets())
+            items = iter_archive(path, entries)
+            while True:
+                item = await asyncio.to_thread(next, items, None)
+                if item is None:
+                    break
+                name, state = item
+                if name in existing and not overwrite:
+                    job['skipped'].append(name)
+                else:
+                    await self.presets.save_preset(name, state)
+                    job['imported'].append(name)
+                job['done'] += 1
+                await self._report(job)
+            await self._finish(job)
+            logger.info('Imported %d presets from archive (%d skipped)', len(job['imported']), len(job['skipped']))
+        except asyncio.CancelledError:
+            job['state'] = 'failed'
+            job['error'] = 'cancelled'
+            raise
+        except Exception as e:
+            if not isinstance(e, ArchiveError):
+                logger.exception('preset archive import failed')
+            await self._finish(job, str(e))
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        for task in list(self._tasks):
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,121 @@
+from typing import Iterable, Optional
+
+EQ_BANDS = ('gain', 'low', 'mid', 'high')
+CHANNEL_PARAMS = ('level_db', 'mute', 'solo') + tuple(f'eq.{band}' for band in EQ_BANDS)
+MASTER_PARAMS = ('level_db', 'mute')
+
+
+def parse_params(params) -> Optional[set]:
+    """Normalize a parameter filter.
+
+    Accepts a list or a comma separated string of parameter names; `eq`
+    stands for every EQ band. Returns None (all parameters) for an empty
+    filter.
+
+    Raises:
+        ValueError: If a parameter name is unknown
+    """
+    if params is None or params == '':
+        return None
+    if isinstance(params, str):
+        params = params.split(',')
+    if not isinstance(params, (list, tuple, set)):
+        raise ValueError('params must be a list')
+    selected = set()
+    for param in params:
+        param = str(param).strip()
+        if param == 'eq':
+            selected.update(f'eq.{band}' for band in EQ_BANDS)
+        elif param in CHANNEL_PARAMS:
+            selected.add(param)
+        elif param:
+            raise ValueError(f'unknown parameter: {param}')
+    return selected or None
+
+
+def parse_channels(channels) -> Optional[set]:
+    """Normalize a channel filter (indexes and/or 'master').
+
+    Raises:
+        ValueError: If a channel is neither an index nor 'master'
+    """
+    if channels is None or channels == '':
+        return None
+    if isinstance(channels, str):
+        channels = channels.split(',')
+    if not isinstance(channels, (list, tuple, set)):
+        raise ValueError('channels must be a list')
+    selected = set()
+    for ch in channels:
+        if isinstance(ch, str):
+            ch = ch.strip()
+            if ch == 'master':
+                selected.add('master')
+                continue
+        try:
+            index = int(ch)
+        except (TypeError, ValueError):
+            raise ValueError(f'invalid channel: {ch!r}')
+        if index < 0:
+            raise ValueError(f'invalid channel: {ch!r}')
+        selected.add(index)
+    return selected or None
+
+
+def _value(section: dict, param: str):
+    if param.startswith('eq.'):
+        return (section.get('eq') or {}).get(param[3:])
+    return section.get(param)
+
+
+def _changes(current: dict, target: dict, params: Iterable[str]) -> dict:
+    changes = {}
+    for param in params:
+        new = _value(target, param)
+        if new is None:
+            continue
+        old = _value(current, param)
+        if old != new:
+            changes[param] = {'from': old, 'to': new}
+    return changes
+
+
+def _by_index(state: dict) -> dict:
+    channels = {}
+    for pos, ch in enumerate(state.get('channels') or []):
+        if isinstance(ch, dict):
+            index = ch.get('index', pos)
+            if isinstance(index, int):
+                channels[index] = ch
+    return channels
+
+
+def diff_states(current: dict, target: dict, channels: Optional[set] = None,
+                params: Optional[set] = None) -> dict:
+    """Compare two mixer states.
+
+    Only values present in `target` are compared. `channels` and `params`
+    restrict the comparison (see `parse_channels` / `parse_params`).
+
+    Returns:
+        {'master': {param: {'from', 'to'}}, 'channels': [{'index', 'changes'}],
+         'count': number of changed values}
+    """
+    result = {'master': {}, 'channels': [], 'count': 0}
+    if channels is None or 'master' in channels:
+        master_params = [p for p in MASTER_PARAMS if params is None or p in params]
+        result['master'] = _changes(current.get('master') or {}, target.get('master') or {}, master_params)
+        result['count'] += len(result['master'])
+
+    channel_params = [p for p in CHANNEL_PARAMS if params is None or p in params]
+    live = _by_index(current)
+    for index, ch_target in sorted(_by_index(target).items()):
+        if channels is not None and index not in channels:
+            continue
+        if index not in live:
+            continue
+        changes = _changes(live[index], ch_target, channel_params)
+        if changes:
+            result['channels'].append({'index': index, 'changes': changes})
+            result['count'] += len(changes)
+    return result
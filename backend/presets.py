@@ -13,6 +13,8 @@ class PresetManager:
     def __init__(self, presets_dir):
         self.presets_dir = presets_dir
         os.makedirs(self.presets_dir, exist_ok=True)
+        # name -> (base config fingerprint, compile key, ready-to-push DSP config)
+        self._compiled = {}
 
     def _validate_preset_name(self, name: str) -> str:
         """Validate and sanitize preset name to prevent path traversal.
@@ -77,6 +79,7 @@ class PresetManager:
             with open(tmp, 'w', encoding='utf-8') as f:
                 json.dump({'version': 1, 'state': state}, f, indent=2, ensure_ascii=False)
             os.replace(tmp, path)
+            self._compiled.pop(safe_name, None)
             logger.info(f"Preset saved: {safe_name}")
             return path
         except Exception as e:
@@ -147,3 +150,50 @@ class PresetManager:
         except Exception as e:
             logger.error(f"Failed to list presets: {e}")
             return []
+
+    def compiled_config(self, name: str, state: dict, base) -> dict:
+        """Return the preset compiled against a base DSP config.
+
+        The result is cached per preset and reused while the base config
+        keeps the same structure and the same values for the controls the
+        preset does not set (`CamillaConfig.compile_key`); saving the preset
+        drops it.
+
+        Args:
+            name: Preset name
+            state: Mixer state dict of the preset
+            base: `CamillaConfig` of the active DSP config
+
+        Returns:
+            Full CamillaDSP config dict (must not be mutated by callers)
+        """
+        safe_name = self._validate_preset_name(name)
+        key = base.compile_key(state)
+        cached = self._compiled.get(safe_name)
+        if cached and cached[1] == key:
+            return cached[2]
+        config = base.compile_state(state)
+        self._compiled[safe_name] = (base.fingerprint, key, config)
+        return config
+
+    async def precompile(self, base) -> int:
+        """Compile every preset against `base` ahead of recall.
+
+        Returns:
+            Number of presets compiled
+        """
+        count = 0
+        for name in self.list_presets():
+            state = await self.load_preset(name)
+            if not state:
+                continue
+            try:
+                await asyncio.to_thread(self.compiled_config, name, state, base)
+                count += 1
+            except Exception as e:
+                logger.error(f"Failed to compile preset {name}: {e}")
+        # drop entries compiled for an older base config
+        fingerprint = base.fingerprint
+        for name in [n for n, (fp, _, _) in self._compiled.items() if fp != fingerprint]:
+            del self._compiled[name]
+        return count
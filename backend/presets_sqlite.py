@@ -0,0 +1,285 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from .presets import PresetManager
+
+logger = logging.getLogger('presets')
+
+DB_FILENAME = 'presets.db'
+SCHEMA_VERSION = 1
+MAX_TAGS = 32
+MAX_TAG_LENGTH = 32
+# versions kept per preset; older ones are dropped on save
+DEFAULT_MAX_VERSIONS = 50
+SEARCH_ORDERS = {
+    'name': 'p.name ASC',
+    'last_used': 'p.last_used IS NULL, p.last_used DESC, p.name ASC',
+    'updated': 'p.updated DESC, p.name ASC',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS presets (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    last_used REAL
+);
+CREATE INDEX IF NOT EXISTS presets_last_used ON presets (last_used);
+CREATE TABLE IF NOT EXISTS preset_versions (
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    saved REAL NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (name, version)
+);
+CREATE TABLE IF NOT EXISTS preset_tags (
+    name TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (name, tag)
+);
+CREATE INDEX IF NOT EXISTS preset_tags_tag ON preset_tags (tag, name);
+"""
+
+
+class SQLitePresetManager(PresetManager):
+    """PresetManager storing presets in a SQLite database.
+
+    Every save that changes the state appends a new version (the last
+    `max_versions` are kept); the latest one is what `load_preset`
+    returns. Presets can carry tags and remember when they were last
+    recalled, and listing/searching uses indexes instead of directory
+    scans. The database lives in `presets_dir/presets.db` (WAL mode); JSON
+    presets already in `presets_dir` are imported on first start and left
+    in place.
+    """
+
+    def __init__(self, presets_dir, db_path: Optional[str] = None, max_versions: int = DEFAULT_MAX_VERSIONS):
+        super().__init__(presets_dir)
+        self.db_path = db_path or os.path.join(presets_dir, DB_FILENAME)
+        self.max_versions = max(1, int(max_versions))
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        with self._db:
+            self._db.executescript(SCHEMA)
+            self._db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)",
+                             (str(SCHEMA_VERSION),))
+        self._migrate_json()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _migrate_json(self):
+        """Import the JSON preset files once, on the first start."""
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if row:
+            return
+        imported = 0
+        for name in super().list_presets():
+            path = os.path.join(self.presets_dir, f'{name}.json')
+            try:
+                self._validate_preset_name(name)
+                with open(path, 'r', encoding='utf-8') as f:
+                    state = json.load(f).get('state')
+                if not isinstance(state, dict):
+                    raise ValueError('state is not a dict')
+                self._write(name, state, os.path.getmtime(path))
+                imported += 1
+            except Exception as e:
+                logger.warning(f"Skipping preset {name} during migration: {e}")
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)",
+                             (str(time.time()),))
+        if imported:
+            logger.info(f"Migrated {imported} JSON presets to {self.db_path}")
+
+    def _write(self, name: str, state: dict, ts: Optional[float] = None) -> int:
+        ts = ts if ts is not None else time.time()
+        data = json.dumps(state, ensure_ascii=False)
+        with self._lock, self._db:
+            row = self._db.execute('SELECT p.version, v.state FROM presets p JOIN preset_versions v'
+                                   ' ON v.name = p.name AND v.version = p.version WHERE p.name = ?',
+                                   (name,)).fetchone()
+            if row and (row[1] == data or json.loads(row[1]) == state):
+                # unchanged (e.g. an idle autosave): no new version
+                return row[0]
+            version = (row[0] + 1) if row else 1
+            self._db.execute('INSERT INTO preset_versions (name, version, saved, state) VALUES (?, ?, ?, ?)',
+                             (name, version, ts, data))
+            if row:
+                self._db.execute('UPDATE presets SET version = ?, updated = ? WHERE name = ?',
+                                 (version, ts, name))
+            else:
+                self._db.execute('INSERT INTO presets (name, version, created, updated) VALUES (?, ?, ?, ?)',
+                                 (name, version, ts, ts))
+            self._db.execute('DELETE FROM preset_versions WHERE name = ? AND version <= ?',
+                             (name, version - self.max_versions))
+        return version
+
+    async def save_preset(self, name: str, state: dict) -> str:
+        """Save a new version of a preset.
+
+        Returns:
+            Database path and version of the saved preset
+
+        Raises:
+            ValueError: If name or state is invalid
+        """
+        safe_name = self._validate_preset_name(name)
+        if not isinstance(state, dict):
+            raise ValueError("Preset state must be a dict")
+        try:
+            version = self._write(safe_name, state)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to save preset {name}: {e}")
+            raise
+        self._compiled.pop(safe_name, None)
+        logger.info(f"Preset saved: {safe_name} (v{version})")
+        return f'{self.db_path}#{safe_name}@{version}'
+
+    async def load_preset(self, name: str, version: Optional[int] = None) -> dict:
+        """Load the latest (or a given) version of a preset.
+
+        Returns:
+            Mixer state dict or None if not found
+        """
+        try:
+            safe_name = self._validate_preset_name(name)
+        except ValueError as e:
+            logger.warning(f"Invalid preset name {name}: {e}")
+            return None
+        try:
+            with self._lock:
+                if version is None:
+                    row = self._db.execute(
+                        'SELECT v.state FROM presets p JOIN preset_versions v '
+                        'ON v.name = p.name AND v.version = p.version WHERE p.name = ?',
+                        (safe_name,)).fetchone()
+                else:
+                    row = self._db.execute('SELECT state FROM preset_versions WHERE name = ? AND version = ?',
+                                           (safe_name, int(version))).fetchone()
+            if not row:
+                return None
+            state = json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Failed to read preset {name}: {e}")
+            return None
+        if not isinstance(state, dict):
+            logger.warning(f"Preset {name} state is invalid")
+            return None
+        logger.info(f"Preset loaded: {safe_name}")
+        return state
+
+    def mark_used(self, name: str):
+        """Record that a preset was just recalled."""
+        try:
+            with self._lock, self._db:
+                self._db.execute('UPDATE presets SET last_used = ? WHERE name = ?',
+                                 (time.time(), self._validate_preset_name(name)))
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Failed to mark preset {name} as used: {e}")
+
+    def list_presets(self) -> list:
+        """List all preset names, sorted."""
+        try:
+            with self._lock:
+                return [r[0] for r in self._db.execute('SELECT name FROM presets ORDER BY name')]
+        except sqlite3.Error as e:
+            logger.error(f"Failed to list presets: {e}")
+            return []
+
+    def search(self, prefix: Optional[str] = None, tag: Optional[str] = None,
+               order: str = 'name', limit: Optional[int] = None) -> list:
+        """Query presets by name prefix and/or tag.
+
+        Args:
+            prefix: Case-sensitive name prefix
+            tag: Only presets carrying this tag
+            order: 'name', 'last_used' or 'updated'
+            limit: Maximum number of results
+
+        Returns:
+            List of {'name', 'version', 'updated', 'last_used', 'tags'}
+
+        Raises:
+            ValueError: If order or limit is invalid
+        """
+        if order not in SEARCH_ORDERS:
+            raise ValueError(f"order must be one of {', '.join(SEARCH_ORDERS)}")
+        sql = 'SELECT p.name, p.version, p.updated, p.last_used FROM presets p'
+        where, args = [], []
+        if tag:
+            sql += ' JOIN preset_tags t ON t.name = p.name AND t.tag = ?'
+            args.append(tag)
+        if prefix:
+            # range scan on the primary key instead of LIKE
+            where.append('p.name >= ? AND p.name < ?')
+            args += [prefix, prefix + '\uffff']
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY ' + SEARCH_ORDERS[order]
+        if limit is not None:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError('limit must be positive')
+            sql += ' LIMIT ?'
+            args.append(limit)
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+            tags = self._tags_for([r[0] for r in rows])
+        return [{'name': name, 'version': version, 'updated': updated, 'last_used': last_used,
+                 'tags': tags.get(name, [])} for name, version, updated, last_used in rows]
+
+    def _tags_for(self, names: list) -> dict:
+        tags = {}
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            marks = ','.join('?' * len(chunk))
+            for name, tag in self._db.execute(
+                    f'SELECT name, tag FROM preset_tags WHERE name IN ({marks}) ORDER BY tag', chunk):
+                tags.setdefault(name, []).append(tag)
+        return tags
+
+    def set_tags(self, name: str, tags: list) -> list:
+        """Replace the tags of a preset.
+
+        Raises:
+            ValueError: If the preset does not exist or a tag is invalid
+        """
+        safe_name = self._validate_preset_name(name)
+        if not isinstance(tags, list) or len(tags) > MAX_TAGS:
+            raise ValueError(f"tags must be a list of at most {MAX_TAGS} strings")
+        clean = sorted({str(t).strip() for t in tags if str(t).strip()})
+        if any(len(t) > MAX_TAG_LENGTH for t in clean):
+            raise ValueError(f"tags are limited to {MAX_TAG_LENGTH} chars")
+        with self._lock, self._db:
+            if not self._db.execute('SELECT 1 FROM presets WHERE name = ?', (safe_name,)).fetchone():
+                raise ValueError("preset not found")
+            self._db.execute('DELETE FROM preset_tags WHERE name = ?', (safe_name,))
+            self._db.executemany('INSERT INTO preset_tags (name, tag) VALUES (?, ?)',
+                                 [(safe_name, t) for t in clean])
+        return clean
+
+    def history(self, name: str) -> list:
+        """Return the saved versions of a preset, newest first.
+
+        Returns:
+            List of {'version', 'saved'}; empty if the preset does not exist
+        """
+        safe_name = self._validate_preset_name(name)
+        with self._lock:
+            rows = self._db.execute('SELECT version, saved FROM preset_versions WHERE name = ? '
+                                    'ORDER BY version DESC', (safe_name,)).fetchall()
+        return [{'version': v, 'saved': saved} for v, saved in rows]
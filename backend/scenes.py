@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger('scenes')
+
+DEFAULT_CONTROL_RATE = 30.0  # DSP updates per second during a fade
+MAX_FADE_SECONDS = 600.0
+EQ_BANDS = ('gain', 'low', 'mid', 'high')
+
+
+class SceneEngine:
+    """Server-side crossfades from the current mixer state to a scene.
+
+    A recall builds one track per parameter that differs (channel levels,
+    EQ bands, master level) and a scheduler task interpolates them linearly
+    in dB at `rate_hz`, pushing each tick's changes to the DSP as one
+    coalesced `adapter.apply_batch()` call. Discrete flags are switched
+    where they are least audible: unmutes at the start of the fade, mutes
+    and solo changes at the end. Every field written is touched on the
+    mixer, so clients receive only the fields a tick moved.
+
+    Touching a channel during a fade (`release`) removes it from the fade so
+    the manual move wins.
+    """
+
+    def __init__(self, adapter, rate_hz: float = DEFAULT_CONTROL_RATE,
+                 on_update: Optional[Callable] = None, on_mutes: Optional[Callable] = None,
+                 on_finish: Optional[Callable] = None):
+        self.adapter = adapter
+        self.rate_hz = rate_hz
+        self.on_update = on_update
+        self.on_mutes = on_mutes
+        self.on_finish = on_finish
+        self._task: Optional[asyncio.Task] = None
+        self._mixer = None
+        self._name: Optional[str] = None
+        self._duration = 0.0
+        self._started = 0.0
+        self._tracks = {}     # key -> (start, end); key is ('level', ch), ('eq', ch, band) or ('master',)
+        self._sent = {}       # key -> last value pushed to the DSP
+        self._end_flags = {}  # (ch, 'mute'|'solo') -> value applied when the fade completes
+
+    @property
+    def active(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def recall(self, mixer, target: dict, duration: float, name: Optional[str] = None) -> dict:
+        """Start fading `mixer` towards the `target` state over `duration` seconds.
+
+        A running fade is cancelled first. Returns the engine status.
+
+        Raises:
+            ValueError: If the duration or target is invalid
+        """
+        if not isinstance(target, dict):
+            raise ValueError('scene must be a mixer state dict')
+        duration = float(duration)
+        if not 0.0 <= duration <= MAX_FADE_SECONDS:
+            raise ValueError(f'duration must be between 0 and {MAX_FADE_SECONDS:.0f} s')
+        self.cancel()
+
+        self._mixer = mixer
+        self._name = name
+        self._duration = duration
+        self._tracks = {}
+        self._sent = {}
+        self._end_flags = {}
+        unmuted = False
+
+        master = target.get('master')
+        if isinstance(master, dict) and 'level_db' in master:
+            self._add_track(('master',), mixer.master['level_db'], master['level_db'])
+
+        channels = mixer.channels
+        for pos, ch_target in enumerate(target.get('channels') or []):
+            if not isinstance(ch_target, dict):
+                continue
+            ch = ch_target.get('index', pos)
+            if not isinstance(ch, int) or not 0 <= ch < len(channels):
+                continue
+            current = channels[ch]
+            if 'level_db' in ch_target:
+                self._add_track(('level', ch), current['level_db'], ch_target['level_db'])
+            for band, value in (ch_target.get('eq') or {}).items():
+                if band in EQ_BANDS:
+                    self._add_track(('eq', ch, band), current['eq'].get(band, 0.0), value)
+            if 'mute' in ch_target and bool(ch_target['mute']) != current['mute']:
+                if ch_target['mute']:
+                    self._end_flags[(ch, 'mute')] = True
+                else:
+                    current['mute'] = False
+                    mixer.touch(ch, 'mute')
+                    unmuted = True
+            if 'solo' in ch_target and bool(ch_target['solo']) != current['solo']:
+                self._end_flags[(ch, 'solo')] = bool(ch_target['solo'])
+
+        if unmuted and self.on_mutes:
+            self.on_mutes()
+        self._started = time.perf_counter()
+        self._task = asyncio.create_task(self._run())
+        return self.status()
+
+    def _add_track(self, key, start, end):
+        try:
+            start, end = float(start), float(end)
+        except (TypeError, ValueError):
+            return
+        if start != end:
+            self._tracks[key] = (start, end)
+
+    def release(self, channel):
+        """Drop a channel (index or 'master') from the running fade."""
+        if not self.active:
+            return
+        if channel == 'master':
+            self._tracks.pop(('master',), None)
+            return
+        for key in [k for k in self._tracks if len(k) > 1 and k[1] == channel]:
+            del self._tracks[key]
+        for key in [k for k in self._end_flags if k[0] == channel]:
+            del self._end_flags[key]
+
+    def cancel(self) -> bool:
+        """Stop the running fade where it is. Returns True if one was running."""
+        if not self.active:
+            return False
+        self._task.cancel()
+        self._task = None
+        logger.info('Scene fade cancelled (%s)', self._name)
+        return True
+
+    async def stop(self):
+        task = self._task
+        self.cancel()
+        if task:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self) -> dict:
+        progress = 1.0
+        if self.active and self._duration > 0:
+            progress = min(1.0, (time.perf_counter() - self._started) / self._duration)
+        return {
+            'active': self.active,
+            'name': self._name,
+            'duration_ms': round(self._duration * 1000.0),
+            'progress': round(progress, 3),
+            'tracks': len(self._tracks),
+        }
+
+    async def _run(self):
+        period = 1.0 / self.rate_hz
+        try:
+            while True:
+                elapsed = time.perf_counter() - self._started
+                alpha = 1.0 if self._duration <= 0 else min(1.0, elapsed / self._duration)
+                await self._tick(alpha)
+                if alpha >= 1.0:
+                    break
+                await asyncio.sleep(period)
+            self._apply_end_flags()
+        except Exception:
+            logger.exception('scene fade failed')
+        self._task = None
+        logger.info('Scene fade finished (%s)', self._name)
+        if self.on_finish:
+            self.on_finish(self.status())
+
+    async def _tick(self, alpha: float):
+        mixer = self._mixer
+        levels = {}
+        eq = {}
+        master_level = None
+        for key, (start, end) in list(self._tracks.items()):
+            value = round(start + (end - start) * alpha, 2)
+            if self._sent.get(key) == value:
+                continue
+            self._sent[key] = value
+            if key[0] == 'master':
+                mixer.master['level_db'] = value
+                mixer.touch('master', 'level_db')
+                master_level = value
+            elif key[0] == 'level':
+                mixer.channels[key[1]]['level_db'] = value
+                mixer.touch(key[1], 'level_db')
+                levels[key[1]] = value
+            else:
+                mixer.channels[key[1]]['eq'][key[2]] = value
+                mixer.touch(key[1], f'eq.{key[2]}')
+                eq[(key[1], key[2])] = value
+        if not (levels or eq or master_level is not None):
+            return
+        # one coalesced DSP update per tick, off the event loop
+        await asyncio.to_thread(self.adapter.apply_batch, levels, eq, master_level)
+        if self.on_update:
+            self.on_update()
+
+    def _apply_end_flags(self):
+        if not self._end_flags:
+            return
+        channels = self._mixer.channels
+        for (ch, flag), value in self._end_flags.items():
+            if ch < len(channels):
+                channels[ch][flag] = value
+                self._mixer.touch(ch, flag)
+        self._end_flags = {}
+        if self.on_mutes:
+            self.on_mutes()
+        if self.on_update:
+            self.on_update()
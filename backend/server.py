@@ -5,13 +5,22 @@ import os
 import math
 import time
 import re
+import tempfile
+import uuid
+from typing import Optional
 from aiohttp import web, WSMsgType
 import yaml
+from .preset_diff import diff_states, parse_channels, parse_params
+from .metrics import (REGISTRY, AUTOSAVE_SECONDS, BROADCAST_LAG_SECONDS, BROADCAST_TICK_SECONDS,
+                      WS_CLIENTS, WS_INITIAL_SYNC_TOTAL, WS_MESSAGES_TOTAL, WS_SEND_BUFFER_BYTES)
 
 ROOT = os.path.dirname(os.path.dirname(__file__))
 FRONTEND_DIR = os.path.join(ROOT, 'frontend')
+# output of scripts/build_frontend.py; the sources are served when it is absent
+FRONTEND_DIST_DIR = os.getenv('FRONTEND_DIST_DIR', os.path.join(FRONTEND_DIR, 'dist'))
 PRESETS_DIR = os.path.join(os.path.dirname(__file__), 'presets')
 SERVER_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'server_config.json')
+AUDIT_DIR = os.getenv('AUDIT_LOG_DIR', os.path.join(os.path.dirname(__file__), 'audit'))
 os.makedirs(PRESETS_DIR, exist_ok=True)
 
 logging.basicConfig(level=logging.INFO)
@@ -33,7 +42,9 @@ if not SERVER_CONFIG.get('console_enabled', True):
         if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
             handler.setLevel(logging.CRITICAL + 1)
 
-DEFAULT_CHANNELS = 8
+# channel count used until the active CamillaDSP config tells us otherwise
+DEFAULT_CHANNELS = int(os.getenv('MIXER_CHANNELS', '8'))
+MAX_CHANNELS = 512
 AUTOSAVE_DEFAULT_ENABLED = os.getenv('AUTOSAVE_ENABLED', '1') not in ('0', 'false', 'False')
 AUTOSAVE_DEFAULT_INTERVAL = float(os.getenv('AUTOSAVE_INTERVAL_SEC', '30'))
 MIN_LEVEL_DB = -60.0
@@ -41,6 +52,41 @@ MAX_LEVEL_DB = 12.0
 MAX_YAML_SIZE = 5 * 1024 * 1024  # 5 MB
 LEVELS_BROADCAST_INTERVAL = 0.2
 CAMILLA_STATUS_BROADCAST_INTERVAL = 10  # iterations
+AUDIT_FLUSH_INTERVAL = 1.0
+LOOP_WATCHDOG_ENABLED = os.getenv('LOOP_WATCHDOG_ENABLED', '1') not in ('0', 'false', 'False')
+LOOP_STALL_THRESHOLD_MS = float(os.getenv('LOOP_STALL_THRESHOLD_MS', '100'))
+SCENE_CONTROL_RATE_HZ = float(os.getenv('SCENE_CONTROL_RATE_HZ', '30'))
+# 'json' (one file per preset) or 'sqlite' (versioned, tagged, indexed)
+PRESET_BACKEND = os.getenv('PRESET_BACKEND', 'json').lower()
+PRESET_MAX_VERSIONS = int(os.getenv('PRESET_MAX_VERSIONS', '50'))
+# spectrum analyzer tap: 'alsa:<device>' (e.g. alsa:hw:Loopback,1) or a raw S16_LE file/FIFO; empty disables it
+ANALYZER_SOURCE = os.getenv('ANALYZER_SOURCE', '')
+ANALYZER_SAMPLE_RATE = int(os.getenv('ANALYZER_SAMPLE_RATE', '48000'))
+ANALYZER_CHANNELS = int(os.getenv('ANALYZER_CHANNELS', '2'))
+ANALYZER_FFT_SIZE = int(os.getenv('ANALYZER_FFT_SIZE', '4096'))
+ANALYZER_RATE_HZ = float(os.getenv('ANALYZER_RATE_HZ', '20'))
+ANALYZER_BANDS_PER_OCTAVE = int(os.getenv('ANALYZER_BANDS_PER_OCTAVE', '3'))
+# memory-mapped meter ring for local consumers (see meter_ring.py); empty disables
+METER_RING_PATH = os.getenv('METER_RING_PATH', '')
+METER_RING_SLOTS = int(os.getenv('METER_RING_SLOTS', '64'))
+# a DSP state fetched by a connecting client is reused by the next ones for this long
+DSP_SYNC_TTL = float(os.getenv('DSP_SYNC_TTL_SEC', '5'))
+# poll for changes made on the DSP by other clients (CamillaGUI): volume every
+# interval, active config every N intervals; 0 disables the watcher
+DSP_WATCH_INTERVAL = float(os.getenv('DSP_WATCH_INTERVAL_SEC', '1'))
+DSP_WATCH_CONFIG_EVERY = int(os.getenv('DSP_WATCH_CONFIG_EVERY', '5'))
+# SERVER_WORKERS > 1: one DSP owner process plus viewer processes sharing the
+# port (SO_REUSEPORT), fed over a Unix socket bus (see cluster.py)
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', '1'))
+CLUSTER_SOCKET = os.getenv('CLUSTER_SOCKET', os.path.join(tempfile.gettempdir(), 'camillamix-bus.sock'))
+MAX_OP_ID_LENGTH = 64
+# control messages that can be applied one by one or inside a `batch`
+CONTROL_TYPES = ('set_channel_level', 'set_channel_mute', 'set_channel_solo', 'set_channel_eq')
+MAX_BATCH_OPS = 512
+# message types counted individually in camillamix_ws_messages_total
+WS_MESSAGE_TYPES = ('set_channel_level', 'set_channel_mute', 'set_channel_solo', 'set_channel_eq',
+                    'subscribe_levels', 'subscribe_channels', 'save_preset', 'load_preset', 'set_autosave',
+                    'recall_scene', 'cancel_scene', 'recall_partial', 'subscribe_analyzer', 'batch')
 
 
 def validate_channel(ch, mixer_channels: list):
@@ -128,25 +174,172 @@ class MixerState:
             'solo': False,
             'eq': {'gain': 0.0, 'low': 0.0, 'mid': 0.0, 'high': 0.0}
         }
-        self.channels = []
-        for i in range(channels):
-            self.channels.append({
-                'index': i,
-                'level_db': 0.0,
-                'mute': False,
-                'solo': False,
-                'eq': {'gain': 0.0, 'low': 0.0, 'mid': 0.0, 'high': 0.0}
-            })
+        self.channels = [self.default_channel(i) for i in range(channels)]
+        # revisions let clients apply only what changed since they last heard:
+        # `touch` stamps one field, `touch_all` (wholesale changes such as a
+        # preset load or a resize) raises the floor every field is at
+        self.revision = 0
+        self.base_revision = 0
+        self.field_revisions = {}  # (index | 'master', field) -> revision, oldest first
+        # revisions restart at 0 with the process: a resume token names the instance it came from
+        self.instance = uuid.uuid4().hex[:12]
+
+    @staticmethod
+    def default_channel(index: int) -> dict:
+        return {
+            'index': index,
+            'level_db': 0.0,
+            'mute': False,
+            'solo': False,
+            'eq': {'gain': 0.0, 'low': 0.0, 'mid': 0.0, 'high': 0.0}
+        }
 
-    def to_dict(self):
-        return {'master': self.master, 'channels': self.channels}
+    def resize(self, channels: int) -> bool:
+        """Grow or shrink to `channels` strips, keeping existing settings.
+
+        Returns True if the channel count changed.
+        """
+        channels = max(0, min(MAX_CHANNELS, int(channels)))
+        current = len(self.channels)
+        if channels == current:
+            return False
+        if channels < current:
+            del self.channels[channels:]
+        else:
+            self.channels.extend(self.default_channel(i) for i in range(current, channels))
+        self.touch_all()
+        return True
+
+    def touch(self, channel, field: str) -> int:
+        """Record a change of one field (`level_db`, `mute`, `solo`, `eq.<band>`).
+
+        Returns the new revision.
+        """
+        self.revision += 1
+        key = (channel, field)
+        # re-insert so the dict stays ordered by revision
+        self.field_revisions.pop(key, None)
+        self.field_revisions[key] = self.revision
+        return self.revision
+
+    def field_revision(self, channel, field: str) -> int:
+        return self.field_revisions.get((channel, field), self.base_revision)
+
+    def set_field(self, channel, field: str, value) -> bool:
+        """Set a field if it differs, touching it. Returns True if it changed."""
+        if self.value(channel, field) == value:
+            return False
+        self._store(channel, field, value)
+        self.touch(channel, field)
+        return True
+
+    def _store(self, channel, field: str, value):
+        section = self.master if channel == 'master' else self.channels[channel]
+        if field.startswith('eq.'):
+            section['eq'][field[3:]] = value
+        else:
+            section[field] = value
+
+    def touch_all(self) -> int:
+        """Record a change that may touch every field. Returns the new revision."""
+        self.revision += 1
+        self.base_revision = self.revision
+        self.field_revisions.clear()
+        return self.revision
+
+    def changes_since(self, revision: int) -> Optional[list]:
+        """Fields changed after `revision` as (channel, field, revision), oldest first.
+
+        Returns None if a wholesale change happened since, in which case only
+        the full state is accurate.
+        """
+        if self.base_revision > revision:
+            return None
+        changes = []
+        for key in reversed(self.field_revisions):
+            rev = self.field_revisions[key]
+            if rev <= revision:
+                break
+            changes.append(key + (rev,))
+        changes.reverse()
+        return changes
+
+    def value(self, channel, field: str):
+        section = self.master if channel == 'master' else self.channels[channel]
+        if field.startswith('eq.'):
+            return section['eq'].get(field[3:])
+        return section.get(field)
+
+    def load_state(self, payload: dict):
+        """Mirror a full `state` payload of another MixerState, revisions included."""
+        self.master = payload['master']
+        self.channels = payload['channels']
+        self.revision = payload['rev']
+        self.base_revision = payload['base_rev']
+        self.instance = payload['instance']
+        revs = [((channel if channel == 'master' else int(channel), field), rev)
+                for channel, fields in payload['revs'].items() for field, rev in fields.items()]
+        self.field_revisions = dict(sorted(revs, key=lambda item: item[1]))
+
+    def apply_patch(self, payload: dict):
+        """Mirror a full `state_patch` payload of another MixerState."""
+        for change in payload['changes']:
+            key = (change['channel'], change['field'])
+            self._store(*key, change['value'])
+            self.field_revisions.pop(key, None)
+            self.field_revisions[key] = change['rev']
+        self.revision = payload['rev']
+
+    def revisions(self, start: int = 0, stop: Optional[int] = None) -> dict:
+        """Revision info for a state message: fields not listed in `revs` are at `base_rev`."""
+        revs = {}
+        for (channel, field), rev in self.field_revisions.items():
+            if channel != 'master' and (channel < start or (stop is not None and channel >= stop)):
+                continue
+            revs.setdefault(str(channel), {})[field] = rev
+        return {'rev': self.revision, 'base_rev': self.base_revision, 'revs': revs, 'instance': self.instance}
+
+    def to_dict(self, start: int = 0, stop: Optional[int] = None):
+        """Serialize the mixer, optionally restricted to channels [start, stop).
+
+        A windowed dict carries `channel_count` and `window` so clients know
+        the console size without receiving every strip.
+        """
+        if start == 0 and stop is None:
+            return {'master': self.master, 'channels': self.channels}
+        total = len(self.channels)
+        stop = total if stop is None else min(stop, total)
+        return {
+            'master': self.master,
+            'channels': self.channels[start:stop],
+            'channel_count': total,
+            'window': {'start': start, 'count': max(0, stop - start)},
+            # a solo outside the window still mutes the strips inside it
+            'any_solo': any(ch['solo'] for ch in self.channels),
+        }
 
 
-def update_dsp_mutes(app):
-    """Calculate and apply effective mutes based on Mute and Solo states."""
-    mixer = app['mixer']
-    adapter = app['adapter']
-    
+def state_message(mixer, start: int = 0, stop: Optional[int] = None) -> dict:
+    payload = mixer.to_dict(start, stop)
+    payload.update(mixer.revisions(start, stop))
+    return {'type': 'state', 'payload': payload}
+
+
+def parse_op(data: dict) -> Optional[str]:
+    """Client operation id echoed back in `ack` (short string), or None."""
+    op = data.get('op')
+    if isinstance(op, (str, int)) and not isinstance(op, bool) and len(str(op)) <= MAX_OP_ID_LENGTH:
+        return str(op)
+    return None
+
+
+async def send_ack(ws, op: Optional[str], rev: int):
+    if op is not None:
+        await ws.send_json({'type': 'ack', 'payload': {'op': op, 'rev': rev}})
+
+
+def dsp_mutes(mixer) -> list:
+    """Effective DSP mutes as (fader, muted) pairs, from the Mute and Solo states."""
     # Check if any channel is soloed (excluding master)
     any_solo = any(ch['solo'] for ch in mixer.channels)
     
@@ -168,7 +361,10 @@ def update_dsp_mutes(app):
             should_mute = ch['mute']
             
         mute_updates.append((adapter_ch, should_mute))
-    
+    return mute_updates
+
+
+def push_dsp_mutes(adapter, mute_updates):
     # Apply all mutes in one batch
     if hasattr(adapter, 'set_mutes'):
         adapter.set_mutes(mute_updates)
@@ -177,52 +373,502 @@ def update_dsp_mutes(app):
             adapter.set_mute(ch, m)
 
 
+def update_dsp_mutes(app):
+    """Calculate and apply effective mutes based on Mute and Solo states."""
+    push_dsp_mutes(app['adapter'], dsp_mutes(app['mixer']))
+
+
+def release_scene_channel(app, channel):
+    """Take a channel ('master' or index) out of a running scene fade."""
+    scenes = app.get('scenes')
+    if scenes is not None:
+        scenes.release(channel)
+
+
+class ControlBatch:
+    """DSP changes collected from several control messages, pushed together."""
+
+    def __init__(self):
+        self.levels = {}
+        self.eq = {}
+        self.master_level = None
+        self.mutes_changed = False
+
+    def __bool__(self):
+        return bool(self.levels or self.eq or self.master_level is not None or self.mutes_changed)
+
+    async def flush(self, app):
+        """One `apply_batch` upload and at most one mute/solo pass, off the loop."""
+        # mute/solo is resolved here, from the mixer as it is now
+        mutes = dsp_mutes(app['mixer']) if self.mutes_changed else None
+        await asyncio.to_thread(self._push, app['adapter'], mutes)
+
+    def _push(self, adapter, mutes):
+        if self.levels or self.eq or self.master_level is not None:
+            if hasattr(adapter, 'apply_batch'):
+                adapter.apply_batch(self.levels, self.eq, self.master_level)
+            else:
+                if self.master_level is not None:
+                    adapter.set_level(0, self.master_level)
+                for ch, level_db in self.levels.items():
+                    adapter.set_level(ch + 1, level_db)
+                for (ch, band), gain_db in self.eq.items():
+                    set_eq_gain(adapter, ch, band, gain_db)
+        if mutes is not None:
+            push_dsp_mutes(adapter, mutes)
+
+
+class ControlWriter:
+    """Single writer pushing control changes to the DSP, one flush at a time.
+
+    Changes are collected in `pending`; a flush task takes the batch and
+    uploads it from a worker thread. Changes made while a flush runs are
+    merged into the next one (the latest value of a fader wins), so a fast
+    fader move costs one DSP write per flush instead of one per message.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.pending = ControlBatch()
+        self._task = None
+
+    def schedule(self):
+        """Start a flush task unless one is already running."""
+        if self._task is None and self.pending:
+            self._task = asyncio.ensure_future(self._run())
+
+    def mutes_changed(self):
+        self.pending.mutes_changed = True
+        self.schedule()
+
+    async def _run(self):
+        try:
+            while self.pending:
+                batch, self.pending = self.pending, ControlBatch()
+                try:
+                    await batch.flush(self.app)
+                except Exception:
+                    logger.exception('Failed to push control changes to the DSP')
+        finally:
+            self._task = None
+
+    async def wait(self):
+        """Wait until every pending change has been pushed."""
+        while self._task is not None:
+            await asyncio.shield(self._task)
+
+
+def set_eq_gain(adapter, ch: int, band: str, gain_db: float):
+    # Resolve the DSP filter for this channel/band from the config index
+    if hasattr(adapter, 'set_eq_gain'):
+        adapter.set_eq_gain(ch, band, gain_db)
+    else:
+        filter_map = {
+            'gain': f'Gain_{ch}',
+            'low': f'Bass_{ch}',
+            'mid': f'Mid_{ch}',
+            'high': f'Treble_{ch}'
+        }
+        adapter.set_filter_gain(filter_map[band], gain_db)
+
+
+def apply_control(app, ws, typ: str, payload: dict, batch: ControlBatch) -> int:
+    """Apply one control change (see CONTROL_TYPES) to the mixer.
+
+    The DSP change is added to `batch`, pushed by the next flush.
+
+    Returns:
+        The revision of the changed field
+
+    Raises:
+        ValueError: If the channel, band or value is invalid
+    """
+    mixer = app['mixer']
+    ch = validate_channel(payload.get('channel', 0), mixer.channels)
+    target = mixer.master if ch == 'master' else mixer.channels[ch]
+    if typ == 'set_channel_level':
+        field = 'level_db'
+        value = parse_db_value(payload.get('level_db', 0.0))
+    elif typ == 'set_channel_eq':
+        if ch == 'master':
+            raise ValueError("EQ is not available for master")
+        band = str(payload.get('band', 'mid')).lower()
+        if band not in ('gain', 'low', 'mid', 'high'):
+            raise ValueError(f"Invalid EQ band: {band}")
+        field = f'eq.{band}'
+        value = parse_db_value(payload.get('gain_db', 0.0))
+    else:
+        field = 'mute' if typ == 'set_channel_mute' else 'solo'
+        value = bool(payload.get(field, False))
+
+    # a manual move takes the channel out of a running scene fade
+    release_scene_channel(app, ch)
+    if field.startswith('eq.'):
+        old = target['eq'].get(band)
+        target['eq'][band] = value
+        batch.eq[(ch, band)] = value
+    else:
+        old = target[field]
+        target[field] = value
+        if field != 'level_db':
+            # Recalculate and apply mutes
+            batch.mutes_changed = True
+        elif ch == 'master':
+            batch.master_level = value
+        else:
+            batch.levels[ch] = value
+    record_action(app, ws, typ, ch, field, old, value)
+    return mixer.touch(ch, field)
+
+
+async def handle_batch(app, ws, payload: dict):
+    """Apply a `batch` of control messages with one DSP push and one reply.
+
+    Each op is validated and applied on its own; rejected ops are listed in
+    the `batch_ack` errors and do not stop the others. The reply is sent
+    once the changes have reached the DSP.
+    """
+    ops = payload.get('ops') if isinstance(payload, dict) else None
+    if not isinstance(ops, list) or len(ops) > MAX_BATCH_OPS:
+        await ws.send_json({'type': 'error', 'payload': f'Invalid batch: expected at most {MAX_BATCH_OPS} ops'})
+        return
+    writer = app['control_writer']
+    batch = writer.pending
+    acks, errors = [], []
+    for item in ops:
+        item = item if isinstance(item, dict) else {}
+        typ = item.get('type')
+        op = parse_op(item)
+        if typ not in CONTROL_TYPES:
+            errors.append({'op': op, 'error': f'Unsupported batch op: {typ}'})
+            continue
+        WS_MESSAGES_TOTAL.labels(typ).inc()
+        params = item.get('payload')
+        try:
+            rev = apply_control(app, ws, typ, params if isinstance(params, dict) else {}, batch)
+        except ValueError as e:
+            errors.append({'op': op, 'error': f'Invalid {typ}: {str(e)}'})
+            continue
+        if op is not None:
+            acks.append({'op': op, 'rev': rev})
+    writer.schedule()
+    await writer.wait()
+    if len(errors) < len(ops):
+        app['state_needs_broadcast'] = True
+    if acks or errors:
+        await ws.send_json({'type': 'batch_ack', 'payload': {'acks': acks, 'errors': errors}})
+
+
+async def apply_diff(app, diff: dict):
+    """Apply a preset diff to the live mixer, pushing only the changed values.
+
+    The changes go through the control writer: levels, EQ gains and the
+    master level as one `apply_batch` call, mute/solo changes in one
+    mute pass.
+    """
+    # validate every dB value before touching the mixer
+    sections = [diff['master']] + [entry['changes'] for entry in diff['channels']]
+    for changes in sections:
+        for param, change in changes.items():
+            if param == 'level_db' or param.startswith('eq.'):
+                change['to'] = parse_db_value(change['to'])
+
+    mixer = app['mixer']
+    writer = app['control_writer']
+    batch = writer.pending
+    for param, change in diff['master'].items():
+        mixer.touch('master', param)
+        if param == 'level_db':
+            batch.master_level = mixer.master['level_db'] = change['to']
+        else:
+            mixer.master['mute'] = bool(change['to'])
+            batch.mutes_changed = True
+    for entry in diff['channels']:
+        index = entry['index']
+        ch = mixer.channels[index]
+        release_scene_channel(app, index)
+        for param, change in entry['changes'].items():
+            mixer.touch(index, param)
+            if param.startswith('eq.'):
+                band = param[3:]
+                ch['eq'][band] = batch.eq[(index, band)] = change['to']
+            elif param == 'level_db':
+                ch['level_db'] = batch.levels[index] = change['to']
+            else:
+                ch[param] = bool(change['to'])
+                batch.mutes_changed = True
+    if 'level_db' in diff['master']:
+        release_scene_channel(app, 'master')
+    writer.schedule()
+    await writer.wait()
+
+
+async def push_preset(app, name, state) -> bool:
+    """Apply a loaded preset to the DSP as one precompiled config upload."""
+    adapter = app['adapter']
+    if not hasattr(adapter, 'apply_compiled'):
+        return False
+
+    def apply():
+        base = adapter.base_config()
+        if base is None:
+            return False
+        config = app['presets'].compiled_config(name, state, base)
+        return adapter.apply_compiled(config, state.get('master'))
+
+    try:
+        return await asyncio.to_thread(apply)
+    except Exception:
+        logger.exception('Failed to push preset %s', name)
+        return False
+
+
+async def precompile_presets(app):
+    """Compile the stored presets against the active DSP config."""
+    adapter = app['adapter']
+    if not hasattr(adapter, 'base_config'):
+        return
+    try:
+        base = await asyncio.to_thread(adapter.base_config)
+        if base is None:
+            return
+        count = await app['presets'].precompile(base)
+        logger.info('Precompiled %d presets against the active DSP config', count)
+    except Exception:
+        logger.exception('preset precompilation failed')
+
+
+async def broadcast_preset_job(app, status):
+    payload = {'type': 'preset_job', 'payload': status}
+    for ws in list(app['sockets']):
+        try:
+            await ws.send_json(payload)
+        except Exception:
+            pass
+
+
+async def broadcast_scene_status(app):
+    scenes = app.get('scenes')
+    if scenes is None:
+        return
+    payload = {'type': 'scene_status', 'payload': scenes.status()}
+    for ws in list(app['sockets']):
+        try:
+            await ws.send_json(payload)
+        except Exception:
+            pass
+
+
+def record_action(app, ws, action, channel=None, param=None, old=None, new=None):
+    """Append a client action to the structured audit log (no I/O on the loop)."""
+    audit = app.get('audit')
+    if audit is None:
+        return
+    try:
+        audit.record(ws.get('client_id'), action, channel, param, old, new)
+    except Exception:
+        logger.exception('failed to record action')
+
+
+async def handle_message(app, ws, raw: str):
+    """Handle one text message from a client (`ws` may be a cluster proxy)."""
+    try:
+        data = json.loads(raw)
+    except Exception:
+        await ws.send_json({'type': 'error', 'payload': 'invalid json'})
+        return
+
+    typ = data.get('type')
+    payload = data.get('payload', {})
+    # optional client operation id, echoed in the ack of control changes
+    op = parse_op(data)
+    WS_MESSAGES_TOTAL.labels(typ if typ in WS_MESSAGE_TYPES else 'unknown').inc()
+
+    if typ in CONTROL_TYPES:
+        writer = app['control_writer']
+        try:
+            rev = apply_control(app, ws, typ, payload, writer.pending)
+        except ValueError as e:
+            await ws.send_json({'type': 'error', 'payload': f'Invalid {typ}: {str(e)}', 'op': op})
+            return
+        # the DSP write is coalesced with other changes and runs off the loop
+        writer.schedule()
+        # mark that state should be broadcast by the periodic broadcaster
+        app['state_needs_broadcast'] = True
+        await send_ack(ws, op, rev)
+    elif typ == 'batch':
+        await handle_batch(app, ws, payload)
+    elif typ == 'subscribe_levels':
+        # client wants to receive levels periodically; handled by broadcaster
+        await ws.send_json({'type': 'subscribed_levels', 'payload': {'interval_ms': payload.get('interval_ms', 100)}})
+    elif typ == 'subscribe_channels':
+        # restrict state and meter broadcasts to the strips the client displays
+        try:
+            ws['window'] = parse_window(payload.get('start'), payload.get('count'))
+        except ValueError as e:
+            await ws.send_json({'type': 'error', 'payload': f'Invalid subscribe_channels: {str(e)}'})
+            return
+        start, stop = window_bounds(ws, len(app['mixer'].channels))
+        await ws.send_json(state_message(app['mixer'], start, stop))
+    elif typ == 'subscribe_analyzer':
+        # binary spectrum frames go to subscribed clients only
+        analyzer = app.get('analyzer')
+        if analyzer is None:
+            info = {'available': False, 'reason': 'analyzer disabled'}
+        elif payload.get('enabled', True):
+            info = analyzer.subscribe(ws)
+        else:
+            analyzer.unsubscribe(ws)
+            info = analyzer.info()
+        await ws.send_json({'type': 'analyzer_info', 'payload': info})
+    elif typ == 'save_preset':
+        try:
+            name = validate_preset_name(payload.get('name', 'preset'))
+            path = await app['presets'].save_preset(name, app['mixer'].to_dict())
+            await ws.send_json({'type': 'preset_saved', 'payload': {'path': path}})
+        except ValueError as e:
+            await ws.send_json({'type': 'error', 'payload': f'Invalid preset name: {str(e)}'})
+        except Exception as e:
+            logger.error(f"Error saving preset: {e}")
+            await ws.send_json({'type': 'error', 'payload': 'Save failed'})
+    elif typ == 'load_preset':
+        name = payload.get('name')
+        state = await app['presets'].load_preset(name)
+        if state:
+            record_action(app, ws, typ, new=name)
+            if hasattr(app['presets'], 'mark_used'):
+                app['presets'].mark_used(name)
+            # an instant load supersedes a running scene fade
+            if app.get('scenes') and app['scenes'].cancel():
+                await broadcast_scene_status(app)
+            # replace mixer state (load master and channels), keeping the
+            # DSP's channel count when the preset has another one
+            if 'master' in state:
+                app['mixer'].master = state['master']
+            if isinstance(state.get('channels'), list):
+                mapped, _ = map_to_console(app, {'state': state})
+                app['mixer'].channels = mapped['channels']
+                state = dict(state, channels=mapped['channels'])
+            app['mixer'].touch_all()
+            # one set_active with the config precompiled for this preset
+            await push_preset(app, name, state)
+            await broadcast_state(app)
+            await ws.send_json({'type': 'preset_loaded', 'payload': {'name': name}})
+        else:
+            await ws.send_json({'type': 'error', 'payload': 'preset not found'})
+    elif typ == 'recall_partial':
+        # apply only the selected channels/parameters that differ from the live state
+        name = payload.get('name')
+        try:
+            name = validate_preset_name(name)
+            channels = parse_channels(payload.get('channels'))
+            params = parse_params(payload.get('params'))
+        except ValueError as e:
+            await ws.send_json({'type': 'error', 'payload': f'Invalid recall_partial: {str(e)}'})
+            return
+        state = await app['presets'].load_preset(name)
+        if not state:
+            await ws.send_json({'type': 'error', 'payload': 'preset not found'})
+            return
+        diff = diff_states(app['mixer'].to_dict(), state, channels, params)
+        try:
+            await apply_diff(app, diff)
+        except ValueError as e:
+            await ws.send_json({'type': 'error', 'payload': f'Invalid preset value: {str(e)}'})
+            return
+        record_action(app, ws, typ, param=','.join(sorted(params)) if params else None,
+                      new=name)
+        if hasattr(app['presets'], 'mark_used'):
+            app['presets'].mark_used(name)
+        if diff['count']:
+            await broadcast_state(app)
+        await ws.send_json({'type': 'preset_loaded', 'payload': {'name': name, 'changes': diff['count']}})
+    elif typ == 'recall_scene':
+        # crossfade to a preset server-side at the scene control rate
+        name = payload.get('name')
+        try:
+            name = validate_preset_name(name)
+            duration = float(payload.get('duration_ms', 0)) / 1000.0
+        except (ValueError, TypeError) as e:
+            await ws.send_json({'type': 'error', 'payload': f'Invalid recall_scene: {str(e)}'})
+            return
+        state = await app['presets'].load_preset(name)
+        if not state:
+            await ws.send_json({'type': 'error', 'payload': 'preset not found'})
+            return
+        try:
+            app['scenes'].recall(app['mixer'], state, duration, name=name)
+        except ValueError as e:
+            await ws.send_json({'type': 'error', 'payload': f'Invalid recall_scene: {str(e)}'})
+            return
+        record_action(app, ws, typ, param='duration_ms', new=name)
+        if hasattr(app['presets'], 'mark_used'):
+            app['presets'].mark_used(name)
+        await broadcast_scene_status(app)
+    elif typ == 'cancel_scene':
+        if app['scenes'].cancel():
+            record_action(app, ws, typ)
+            app['state_needs_broadcast'] = True
+        await broadcast_scene_status(app)
+    elif typ == 'set_autosave':
+        enabled = payload.get('enabled', app['autosave_enabled'])
+        interval = payload.get('interval_sec', app['autosave_interval'])
+        try:
+            interval = float(interval)
+            if interval <= 0:
+                interval = app['autosave_interval']
+        except Exception:
+            interval = app['autosave_interval']
+        app['autosave_enabled'] = bool(enabled)
+        app['autosave_interval'] = interval
+        await ws.send_json({'type': 'autosave_settings', 'payload': {'enabled': app['autosave_enabled'], 'interval_sec': app['autosave_interval']}})
+    else:
+        await ws.send_json({'type': 'error', 'payload': 'unknown type'})
+
+
+
+async def send_initial_state(app, ws, resume: Optional[str]):
+    """Send a connecting client the mixer state and a levels snapshot.
+
+    A returning client (`?resume=<instance>:<rev>`) only gets what it missed.
+    """
+    mixer = app['mixer']
+    missed = resume_changes(mixer, resume)
+    WS_INITIAL_SYNC_TOTAL.labels('full' if missed is None else 'resume').inc()
+    start, stop = window_bounds(ws, len(mixer.channels))
+    if missed is None:
+        await ws.send_json(state_message(mixer, start, stop))
+    else:
+        any_solo = any(ch['solo'] for ch in mixer.channels)
+        await ws.send_json(patch_message(mixer, patch_entries(mixer, missed), any_solo, start, stop))
+    await ws.send_json({'type': 'levels', 'payload': {'channels': simulated_levels(mixer, start, stop)}})
+
+
 async def websocket_handler(request):
     ws = web.WebSocketResponse()
     await ws.prepare(request)
 
     app = request.app
+    ws['client_id'] = uuid.uuid4().hex[:8]
+    ws['transport'] = request.transport
+    # optional channel window from the URL (?start=&count=) so large consoles
+    # do not receive every strip in the initial snapshot
+    try:
+        ws['window'] = parse_window(request.query.get('start'), request.query.get('count'))
+    except ValueError:
+        ws['window'] = None
     app['sockets'].append(ws)
-    logger.info('WebSocket client connected')
+    logger.info('WebSocket client connected (%s from %s)', ws['client_id'], request.remote)
 
-    # Sync state from CamillaDSP
-    if app['adapter']._py_connected:
-        try:
-            loop = asyncio.get_running_loop()
-            dsp_state = await loop.run_in_executor(None, app['adapter'].get_current_state)
-            if dsp_state:
-                # Update Master
-                if 'level_db' in dsp_state['master']:
-                    app['mixer'].master['level_db'] = dsp_state['master']['level_db']
-                if 'mute' in dsp_state['master']:
-                    app['mixer'].master['mute'] = dsp_state['master']['mute']
-                
-                # Update Channels
-                for dest, ch_data in dsp_state['channels'].items():
-                    # Find channel with index == dest
-                    for ch in app['mixer'].channels:
-                        if ch['index'] == dest:
-                            ch['level_db'] = ch_data['level_db']
-                            ch['mute'] = ch_data['mute']
-                            if 'eq' in ch_data:
-                                ch['eq'] = ch_data['eq']
-                            break
-        except Exception as e:
-            logger.error(f"Error syncing with DSP: {e}")
+    # Sync state from CamillaDSP: one shared fetch for concurrent connects,
+    # none while the last one is fresh; changes reach clients as a broadcast
+    dsp_sync = app.get('dsp_sync')
+    if dsp_sync is not None:
+        await dsp_sync.ensure()
 
     # send initial mixer state and initial levels so UI can render channels immediately
     try:
-        await ws.send_json({'type': 'state', 'payload': app['mixer'].to_dict()})
-        # send initial levels snapshot
-        levels = []
-        # Add master level first
-        master_level = max(-60.0, min(12.0, app['mixer'].master['level_db']))
-        levels.append({'channel': 'master', 'level_db': master_level, 'peak_db': master_level + 0.5})
-        # Add channel levels
-        for ch in app['mixer'].channels:
-            level = max(-60.0, min(12.0, ch['level_db']))
-            levels.append({'channel': ch['index'], 'level_db': level, 'peak_db': level + 0.5})
-        await ws.send_json({'type': 'levels', 'payload': {'channels': levels}})
+        await send_initial_state(app, ws, request.query.get('resume'))
         await ws.send_json({'type': 'autosave_settings', 'payload': {'enabled': app['autosave_enabled'], 'interval_sec': app['autosave_interval']}})
         # send CamillaDSP connection status
         adapter = app.get('adapter')
@@ -234,148 +880,31 @@ async def websocket_handler(request):
     try:
         async for msg in ws:
             if msg.type == WSMsgType.TEXT:
-                try:
-                    data = json.loads(msg.data)
-                except Exception:
-                    await ws.send_json({'type': 'error', 'payload': 'invalid json'})
-                    continue
-
-                typ = data.get('type')
-                payload = data.get('payload', {})
-
-                if typ == 'set_channel_level':
-                    try:
-                        ch = validate_channel(payload.get('channel', 0), app['mixer'].channels)
-                        lvl = parse_db_value(payload.get('level_db', 0.0))
-                        if ch == 'master':
-                            app['mixer'].master['level_db'] = lvl
-                            # Map master to fader 0 in CamillaDSP
-                            app['adapter'].set_level(0, lvl)
-                        else:
-                            app['mixer'].channels[ch]['level_db'] = lvl
-                            # Map channel i to fader (i+1) in CamillaDSP
-                            app['adapter'].set_level(ch + 1, lvl)
-                        # mark that state should be broadcast by the periodic broadcaster
-                        app['state_needs_broadcast'] = True
-                    except ValueError as e:
-                        await ws.send_json({'type': 'error', 'payload': f'Invalid set_channel_level: {str(e)}'})
-                        continue
-                elif typ == 'set_channel_mute':
-                    try:
-                        ch = validate_channel(payload.get('channel', 0), app['mixer'].channels)
-                        m = bool(payload.get('mute', False))
-                        if ch == 'master':
-                            app['mixer'].master['mute'] = m
-                        else:
-                            app['mixer'].channels[ch]['mute'] = m
-                        
-                        # Recalculate and apply mutes
-                        update_dsp_mutes(app)
-                        app['state_needs_broadcast'] = True
-                    except ValueError as e:
-                        await ws.send_json({'type': 'error', 'payload': f'Invalid set_channel_mute: {str(e)}'})
-                        continue
-                elif typ == 'set_channel_solo':
-                    try:
-                        ch = validate_channel(payload.get('channel', 0), app['mixer'].channels)
-                        s = bool(payload.get('solo', False))
-                        if ch == 'master':
-                            app['mixer'].master['solo'] = s
-                        else:
-                            app['mixer'].channels[ch]['solo'] = s
-                        
-                        # Recalculate and apply mutes
-                        update_dsp_mutes(app)
-                        app['state_needs_broadcast'] = True
-                    except ValueError as e:
-                        await ws.send_json({'type': 'error', 'payload': f'Invalid set_channel_solo: {str(e)}'})
-                        continue
-                elif typ == 'subscribe_levels':
-                    # client wants to receive levels periodically; handled by broadcaster
-                    await ws.send_json({'type': 'subscribed_levels', 'payload': {'interval_ms': payload.get('interval_ms', 100)}})
-                elif typ == 'save_preset':
-                    try:
-                        name = validate_preset_name(payload.get('name', 'preset'))
-                        path = await app['presets'].save_preset(name, app['mixer'].to_dict())
-                        await ws.send_json({'type': 'preset_saved', 'payload': {'path': path}})
-                    except ValueError as e:
-                        await ws.send_json({'type': 'error', 'payload': f'Invalid preset name: {str(e)}'})
-                    except Exception as e:
-                        logger.error(f"Error saving preset: {e}")
-                        await ws.send_json({'type': 'error', 'payload': 'Save failed'})
-                elif typ == 'load_preset':
-                    name = payload.get('name')
-                    state = await app['presets'].load_preset(name)
-                    if state:
-                        # replace mixer state (load master and channels)
-                        if 'master' in state:
-                            app['mixer'].master = state['master']
-                        app['mixer'].channels = state.get('channels', app['mixer'].channels)
-                        await broadcast_state(app)
-                        await ws.send_json({'type': 'preset_loaded', 'payload': {'name': name}})
-                    else:
-                        await ws.send_json({'type': 'error', 'payload': 'preset not found'})
-                elif typ == 'set_channel_eq':
-                    try:
-                        ch = validate_channel(payload.get('channel', 0), app['mixer'].channels)
-                        if ch == 'master':
-                            raise ValueError("EQ is not available for master")
-                        band = str(payload.get('band', 'mid')).lower()
-                        if band not in ('gain', 'low', 'mid', 'high'):
-                            raise ValueError(f"Invalid EQ band: {band}")
-                        val = parse_db_value(payload.get('gain_db', 0.0))
-                        app['mixer'].channels[ch]['eq'][band] = val
-                        
-                        # Map to CamillaDSP filter names: Bass_N, Mid_N, Treble_N
-                        # where N is the channel index
-                        filter_map = {
-                            'gain': f'Gain_{ch}',
-                            'low': f'Bass_{ch}',
-                            'mid': f'Mid_{ch}',
-                            'high': f'Treble_{ch}'
-                        }
-                        filter_name = filter_map.get(band)
-                        if filter_name:
-                            app['adapter'].set_filter_gain(filter_name, val)
-
-                        app['state_needs_broadcast'] = True
-                    except ValueError as e:
-                        await ws.send_json({'type': 'error', 'payload': f'Invalid set_channel_eq: {str(e)}'})
-                        continue
-                elif typ == 'set_autosave':
-                    enabled = payload.get('enabled', app['autosave_enabled'])
-                    interval = payload.get('interval_sec', app['autosave_interval'])
-                    try:
-                        interval = float(interval)
-                        if interval <= 0:
-                            interval = app['autosave_interval']
-                    except Exception:
-                        interval = app['autosave_interval']
-                    app['autosave_enabled'] = bool(enabled)
-                    app['autosave_interval'] = interval
-                    await ws.send_json({'type': 'autosave_settings', 'payload': {'enabled': app['autosave_enabled'], 'interval_sec': app['autosave_interval']}})
-                else:
-                    await ws.send_json({'type': 'error', 'payload': 'unknown type'})
-
+                await handle_message(app, ws, msg.data)
             elif msg.type == WSMsgType.ERROR:
                 logger.error('ws connection closed with exception %s' % ws.exception())
 
     finally:
         app['sockets'].remove(ws)
+        if app.get('analyzer') is not None:
+            app['analyzer'].unsubscribe(ws)
         logger.info('WebSocket client disconnected')
 
     return ws
 
 
-def map_yaml_to_state(yobj, channels=DEFAULT_CHANNELS):
+def map_yaml_to_state(yobj, channels=None):
+    """Map an imported YAML document to mixer channels.
+
+    With `channels=None` the channel count follows the document (mixer dest
+    count, state channels or gains length); otherwise the result is padded
+    or trimmed to `channels`.
+    """
     def default_channels(n):
-        return [{
-            'index': i,
-            'level_db': 0.0,
-            'mute': False,
-            'solo': False,
-            'eq': {'gain': 0.0, 'low': 0.0, 'mid': 0.0, 'high': 0.0}
-        } for i in range(n)]
+        return [MixerState.default_channel(i) for i in range(min(n, MAX_CHANNELS))]
+
+    def count(derived):
+        return channels if channels is not None else (derived or DEFAULT_CHANNELS)
 
     # If yaml already contains a state structure we recognize
     if isinstance(yobj, dict) and 'state' in yobj:
@@ -383,8 +912,8 @@ def map_yaml_to_state(yobj, channels=DEFAULT_CHANNELS):
         if isinstance(st, dict) and 'channels' in st:
             chs = st['channels']
             # sanitize and pad/trim
-            out = default_channels(channels)
-            for i in range(min(len(chs), channels)):
+            out = default_channels(count(len(chs)))
+            for i in range(min(len(chs), len(out))):
                 try:
                     out[i]['level_db'] = float(chs[i].get('level_db', 0.0))
                     out[i]['mute'] = bool(chs[i].get('mute', False))
@@ -398,37 +927,25 @@ def map_yaml_to_state(yobj, channels=DEFAULT_CHANNELS):
                     pass
             return ({'channels': out}, {'source': 'state'})
 
-    # Try CamillaDSP mixers mapping
-    if isinstance(yobj, dict) and 'mixers' in yobj and isinstance(yobj['mixers'], dict):
-        mixers = yobj['mixers']
-        # pick named '2x8' if present else first
-        mixer_name = '2x8' if '2x8' in mixers else next(iter(mixers))
-        mixer = mixers[mixer_name]
-        out = default_channels(channels)
+    # Try CamillaDSP mixers mapping (the mixer the strips control, indexed by dest)
+    if isinstance(yobj, dict) and 'mixers' in yobj and isinstance(yobj['mixers'], dict) and yobj['mixers']:
+        from .camilla_config import CamillaConfig
         try:
-            mapping = mixer.get('mapping', [])
-            for entry in mapping:
-                dest = int(entry.get('dest', -1))
-                if 0 <= dest < channels:
-                    mute = bool(entry.get('mute', False))
-                    srcs = entry.get('sources') or []
-                    gain = 0.0
-                    if srcs:
-                        s0 = srcs[0]
-                        gain = float(s0.get('gain', 0.0))
-                        mute = mute or bool(s0.get('mute', False))
-                        # if scale is linear, convert to dB if possible; assume dB if 'scale'=='dB'
-                        # otherwise keep as-is
-                    out[dest]['level_db'] = gain
-                    out[dest]['mute'] = mute
-            return ({'channels': out}, {'source': 'mixers', 'mixer': mixer_name})
+            model = CamillaConfig(yobj)
+            out = default_channels(count(model.channel_count))
+            for dest, ch_state in model.to_state().items():
+                if dest < len(out):
+                    out[dest]['level_db'] = ch_state['level_db']
+                    out[dest]['mute'] = ch_state['mute']
+                    out[dest]['eq'] = ch_state['eq']
+            return ({'channels': out}, {'source': 'mixers', 'mixer': model.mixer_name, 'mixers': model.mixer_names})
         except Exception:
             pass
 
     # Fallback: look for a flat gains list
     if isinstance(yobj, dict) and 'gains' in yobj and isinstance(yobj['gains'], list):
-        out = default_channels(channels)
-        for i in range(min(channels, len(yobj['gains']))):
+        out = default_channels(count(len(yobj['gains'])))
+        for i in range(min(len(out), len(yobj['gains']))):
             try:
                 out[i]['level_db'] = float(yobj['gains'][i])
             except Exception:
@@ -436,17 +953,130 @@ def map_yaml_to_state(yobj, channels=DEFAULT_CHANNELS):
         return ({'channels': out}, {'source': 'gains'})
 
     # Default
-    return ({'channels': default_channels(channels)}, {'source': 'default'})
+    return ({'channels': default_channels(count(None))}, {'source': 'default'})
 
-async def broadcast_state(app):
-    payload = {'type': 'state', 'payload': app['mixer'].to_dict()}
-    websockets = list(app['sockets'])
-    for ws in websockets:
+def map_to_console(app, yobj) -> tuple:
+    """Map a YAML document or preset onto the console (see `map_yaml_to_state`).
+
+    While the DSP is connected its config sets the channel count and the
+    document is padded or trimmed to it; otherwise the document sizes the
+    console, or keeps its size when nothing in it is recognized.
+    """
+    current = len(app['mixer'].channels)
+    if getattr(app['adapter'], '_py_connected', False):
+        return map_yaml_to_state(yobj, channels=current)
+    mapped, info = map_yaml_to_state(yobj)
+    if info['source'] == 'default':
+        mapped, info = map_yaml_to_state(yobj, channels=current)
+    return mapped, info
+
+
+def parse_window(start, count) -> Optional[tuple]:
+    """Validate a channel window request; None means all channels."""
+    if start is None and count is None:
+        return None
+    try:
+        start = int(start or 0)
+        count = int(count if count is not None else MAX_CHANNELS)
+    except (ValueError, TypeError):
+        raise ValueError('window start and count must be integers')
+    if start < 0 or count < 0:
+        raise ValueError('window start and count must be positive')
+    if count == 0:
+        return None
+    return (start, min(count, MAX_CHANNELS))
+
+
+def window_bounds(ws, total: int) -> tuple:
+    """Resolve a client's channel window to (start, stop) for `total` channels."""
+    window = ws.get('window') if hasattr(ws, 'get') else None
+    if not window:
+        return (0, None)
+    start, count = window
+    start = min(start, total)
+    stop = min(start + count, total)
+    if start == 0 and stop == total:
+        return (0, None)
+    return (start, stop)
+
+
+async def send_windowed(app, build, frames: Optional[dict] = None):
+    """Send a per-window payload to every client, encoding it once per window.
+
+    `build(start, stop)` returns the message for channels [start, stop)
+    (`stop=None` meaning all channels). Clients sharing a window share the
+    encoded frame, so cost scales with distinct windows, not clients.
+    `frames` may hold already encoded frames by (start, stop).
+    """
+    total = len(app['mixer'].channels)
+    frames = dict(frames or {})
+    for ws in list(app['sockets']):
+        bounds = window_bounds(ws, total)
+        data = frames.get(bounds)
+        if data is None:
+            data = frames[bounds] = json.dumps(build(*bounds))
         try:
-            await ws.send_json(payload)
+            await ws.send_str(data)
         except Exception:
             pass
 
+
+async def broadcast_state(app):
+    mixer = app['mixer']
+    app['broadcast_revision'] = mixer.revision
+    await send_windowed(app, lambda start, stop: state_message(mixer, start, stop))
+
+
+def patch_entries(mixer, changes: list) -> list:
+    """`state_patch` entries for `MixerState.changes_since` results."""
+    return [{'channel': ch, 'field': field, 'value': mixer.value(ch, field), 'rev': rev}
+            for ch, field, rev in changes]
+
+
+def patch_message(mixer, entries: list, any_solo: bool, start: int = 0, stop: Optional[int] = None) -> dict:
+    """`state_patch` with the entries for master and channels [start, stop)."""
+    return {'type': 'state_patch', 'payload': {
+        'rev': mixer.revision, 'any_solo': any_solo,
+        'changes': [e for e in entries if e['channel'] == 'master'
+                    or (e['channel'] >= start and (stop is None or e['channel'] < stop))]}}
+
+
+def resume_changes(mixer, token: Optional[str]) -> Optional[list]:
+    """Changes a returning client missed, from its `<instance>:<rev>` resume token.
+
+    Returns None when the client needs a full state: no or malformed token,
+    another server instance, or a wholesale change since that revision.
+    """
+    instance, _, rev = (token or '').partition(':')
+    if instance != mixer.instance:
+        return None
+    try:
+        rev = int(rev)
+    except ValueError:
+        return None
+    if rev > mixer.revision:
+        return None
+    return mixer.changes_since(rev)
+
+
+async def broadcast_changes(app):
+    """Broadcast what changed since the last state broadcast.
+
+    Field changes go out as a `state_patch` carrying only those fields (and
+    their revisions); after a wholesale change the full state is sent.
+    """
+    mixer = app['mixer']
+    changes = mixer.changes_since(app.get('broadcast_revision', 0))
+    if changes is None:
+        await broadcast_state(app)
+        return
+    app['broadcast_revision'] = mixer.revision
+    if not changes:
+        return
+    entries = patch_entries(mixer, changes)
+    any_solo = any(ch['solo'] for ch in mixer.channels)
+    await send_windowed(app, lambda start, stop: patch_message(mixer, entries, any_solo, start, stop))
+
 def get_camilla_status(adapter):
     """Return CamillaDSP connection status"""
     if not adapter:
@@ -455,19 +1085,24 @@ def get_camilla_status(adapter):
     ws_connected = adapter._ws is not None and not adapter._ws.closed if adapter._ws else False
     tcp_connected = getattr(adapter, '_py_connected', False)
 
-    # Try reading main volume if connected via pycamilladsp
+    # Try reading main volume if connected via pycamilladsp; the client is
+    # shared with worker threads, so skip the read rather than wait for one
     main_volume_db = None
     external_volume = getattr(adapter, '_py_external_volume', False)
-    try:
-        if tcp_connected and getattr(adapter, '_py_client', None):
+    lock = getattr(adapter, '_lock', None)
+    if tcp_connected and getattr(adapter, '_py_client', None) and (lock is None or lock.acquire(blocking=False)):
+        try:
             vol = adapter._py_client.volume
             if external_volume and hasattr(vol, 'volume'):
                 # external mode: read fader 0 volume if available
                 main_volume_db = float(vol.volume(0))
             elif hasattr(vol, 'main_volume'):
                 main_volume_db = float(vol.main_volume())
-    except Exception:
-        main_volume_db = None
+        except Exception:
+            main_volume_db = None
+        finally:
+            if lock is not None:
+                lock.release()
 
     return {
         'connected': ws_connected or tcp_connected,
@@ -493,9 +1128,29 @@ async def broadcast_camilla_status(app):
             pass
 
 
+def simulated_levels(mixer, start: int = 0, stop: Optional[int] = None) -> list:
+    """Mock meter levels derived from fader positions (master first)."""
+    master_level = max(-60.0, min(12.0, mixer.master['level_db']))
+    levels = [{'channel': 'master', 'level_db': master_level, 'peak_db': master_level + 0.5}]
+    for ch in mixer.channels[start:stop]:
+        # simple mapping from level_db to a mock peak
+        level = max(-60.0, min(12.0, ch['level_db']))
+        levels.append({'channel': ch['index'], 'level_db': level, 'peak_db': level + 0.5})
+    return levels
+
+
+def levels_message(levels: list, ts: float, start: int = 0, stop: Optional[int] = None) -> dict:
+    """`levels` message with master and channels [start, stop)."""
+    if start != 0 or stop is not None:
+        # levels[0] is master, channel i is at levels[i + 1]
+        levels = levels[:1] + levels[start + 1:None if stop is None else stop + 1]
+    return {'type': 'levels', 'payload': {'channels': levels, 'ts': ts}}
+
+
 async def levels_broadcaster(app):
     # Broadcast levels (real or simulated)
     while True:
+        tick_start = time.perf_counter()
         try:
             levels = []
             real_levels = None
@@ -518,7 +1173,7 @@ async def levels_broadcaster(app):
                 levels.append({'channel': 'master', 'level_db': master_rms, 'peak_db': master_peak})
                 
                 # Map channels
-                # Assuming 1:1 mapping between UI channels (0..7) and playback channels (0..7)
+                # Assuming 1:1 mapping between UI channels and playback channels
                 for ch in app['mixer'].channels:
                     idx = ch['index']
                     if idx < len(rms_values):
@@ -527,26 +1182,19 @@ async def levels_broadcaster(app):
                         levels.append({'channel': idx, 'level_db': -100.0, 'peak_db': -100.0})
             else:
                 # Fallback to simulation based on fader positions
-                # Add master level first
-                master_level = max(-60.0, min(12.0, app['mixer'].master['level_db']))
-                levels.append({'channel': 'master', 'level_db': master_level, 'peak_db': master_level + 0.5})
-                # Add channel levels
-                for ch in app['mixer'].channels:
-                    # simple mapping from level_db to a mock peak
-                    level = max(-60.0, min(12.0, ch['level_db']))
-                    levels.append({'channel': ch['index'], 'level_db': level, 'peak_db': level + 0.5})
+                levels = simulated_levels(app['mixer'])
 
-            payload = {'type': 'levels', 'payload': {'channels': levels}}
-            for ws in list(app['sockets']):
-                try:
-                    await ws.send_json(payload)
-                except Exception:
-                    pass
+            # ts (server wall clock) lets clients measure meter delivery latency
+            ts = time.time()
+            await send_windowed(app, lambda start, stop: levels_message(levels, ts, start, stop))
+            ring = app.get('meter_ring')
+            if ring is not None:
+                ring.publish_levels(levels, ts, simulated=not (real_levels and real_levels.get('rms')))
 
             # if state update requested, broadcast state (debounced by this periodic loop)
             if app.get('state_needs_broadcast'):
                 try:
-                    await broadcast_state(app)
+                    await broadcast_changes(app)
                 except Exception:
                     logger.exception('failed broadcasting state')
                 app['state_needs_broadcast'] = False
@@ -565,11 +1213,10 @@ async def levels_broadcaster(app):
         except Exception:
             logger.exception('error in levels broadcaster')
 
+        sleep_start = time.perf_counter()
+        BROADCAST_TICK_SECONDS.observe(sleep_start - tick_start)
         await asyncio.sleep(LEVELS_BROADCAST_INTERVAL)
-
-
-async def index(request):
-    return web.FileResponse(os.path.join(FRONTEND_DIR, 'index.html'))
+        BROADCAST_LAG_SECONDS.observe(max(0.0, time.perf_counter() - sleep_start - LEVELS_BROADCAST_INTERVAL))
 
 
 def create_app():
@@ -582,17 +1229,77 @@ def create_app():
     app['autosave_interval'] = AUTOSAVE_DEFAULT_INTERVAL
     from .camilla_adapter import CamillaAdapter
     from .presets import PresetManager
-    from .logger import setup_logging
-    # configure logging to file
-    setup_logging()
+    from .logger import setup_logging, set_console_enabled, get_console_enabled
+    from .audit import ActionLog
+    from .watchdog import LoopWatchdog
+    from .scenes import SceneEngine
+    from .static import StaticAssets
+    from .analyzer import SpectrumAnalyzer
+    from .dsp_sync import DspStateSync, DspWatcher
+    from .preset_archive import ArchiveJobs, CHUNK_SIZE, MAX_ARCHIVE_BYTES
+    # route logging (console + rotating actions.log) through a background queue
+    setup_logging(console_enabled=SERVER_CONFIG.get('console_enabled', True))
     # adapter will be started on app startup
     app['adapter'] = CamillaAdapter()
-    app['presets'] = PresetManager(PRESETS_DIR)
+    if PRESET_BACKEND == 'sqlite':
+        from .presets_sqlite import SQLitePresetManager
+        app['presets'] = SQLitePresetManager(PRESETS_DIR, max_versions=PRESET_MAX_VERSIONS)
+    else:
+        app['presets'] = PresetManager(PRESETS_DIR)
+    try:
+        app['audit'] = ActionLog(AUDIT_DIR)
+    except Exception:
+        logger.exception('audit log unavailable')
+        app['audit'] = None
+    app['archive_jobs'] = ArchiveJobs(app['presets'], notify=lambda status: broadcast_preset_job(app, status))
+    app['watchdog'] = LoopWatchdog(threshold=LOOP_STALL_THRESHOLD_MS / 1000.0)
+    app['control_writer'] = ControlWriter(app)
+
+    def scene_updated():
+        # the engine touched the fields it moved: they go out as a state_patch
+        app['state_needs_broadcast'] = True
+
+    def scene_finished(status):
+        app['mixer'].touch_all()
+        app['state_needs_broadcast'] = True
+        asyncio.ensure_future(broadcast_scene_status(app))
+
+    app['scenes'] = SceneEngine(app['adapter'], rate_hz=SCENE_CONTROL_RATE_HZ,
+                                on_update=scene_updated, on_mutes=app['control_writer'].mutes_changed,
+                                on_finish=scene_finished)
+
+    def dsp_state_changed():
+        app['state_needs_broadcast'] = True
 
-    app.router.add_get('/', index)
+    app['dsp_sync'] = DspStateSync(app['adapter'], app['mixer'], ttl=DSP_SYNC_TTL, on_change=dsp_state_changed)
+    app['dsp_watcher'] = DspWatcher(app['adapter'], app['mixer'], interval=DSP_WATCH_INTERVAL,
+                                    config_every=DSP_WATCH_CONFIG_EVERY, on_change=dsp_state_changed)
+
+    try:
+        app['analyzer'] = SpectrumAnalyzer(ANALYZER_SOURCE, sample_rate=ANALYZER_SAMPLE_RATE,
+                                           channels=ANALYZER_CHANNELS, fft_size=ANALYZER_FFT_SIZE,
+                                           rate_hz=ANALYZER_RATE_HZ, bands_per_octave=ANALYZER_BANDS_PER_OCTAVE)
+    except ValueError as e:
+        logger.error('Spectrum analyzer disabled: %s', e)
+        app['analyzer'] = None
+    app['static'] = StaticAssets(FRONTEND_DIR, FRONTEND_DIST_DIR)
+    if app['static'].built:
+        logger.info('Serving built frontend from %s', FRONTEND_DIST_DIR)
+    app.router.add_get('/', app['static'].handle)
     app.router.add_get('/ws', websocket_handler)
     # Preset HTTP API
     async def list_presets(request):
+        query = request.query
+        if any(k in query for k in ('prefix', 'tag', 'order', 'limit')):
+            # indexed queries: ?prefix=&tag=&order=name|last_used|updated&limit=
+            if not hasattr(app['presets'], 'search'):
+                raise web.HTTPBadRequest(text='preset queries require PRESET_BACKEND=sqlite')
+            try:
+                results = app['presets'].search(prefix=query.get('prefix'), tag=query.get('tag'),
+                                                order=query.get('order', 'name'), limit=query.get('limit'))
+            except ValueError as e:
+                raise web.HTTPBadRequest(text=str(e))
+            return web.json_response({'presets': [r['name'] for r in results], 'results': results})
         presets = app['presets'].list_presets()
         # strip .json
         presets = [p[:-5] if p.endswith('.json') else p for p in presets]
@@ -600,11 +1307,65 @@ def create_app():
 
     async def get_preset(request):
         name = request.match_info.get('name')
-        state = await app['presets'].load_preset(name)
+        version = request.query.get('version')
+        if version is not None:
+            if not hasattr(app['presets'], 'history'):
+                raise web.HTTPBadRequest(text='preset versions require PRESET_BACKEND=sqlite')
+            try:
+                version = int(version)
+            except ValueError:
+                raise web.HTTPBadRequest(text='version must be an integer')
+            state = await app['presets'].load_preset(name, version=version)
+        else:
+            state = await app['presets'].load_preset(name)
         if state is None:
             raise web.HTTPNotFound(text='preset not found')
         return web.json_response({'name': name, 'state': state})
 
+    async def get_preset_diff(request):
+        # ?against=live (default) or another preset name; ?channels=0,1,master&params=level_db,eq
+        name = request.match_info.get('name')
+        against = request.query.get('against', 'live')
+        try:
+            channels = parse_channels(request.query.get('channels'))
+            params = parse_params(request.query.get('params'))
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        target = await app['presets'].load_preset(name)
+        if target is None:
+            raise web.HTTPNotFound(text='preset not found')
+        if against == 'live':
+            current = app['mixer'].to_dict()
+        else:
+            current = await app['presets'].load_preset(against)
+            if current is None:
+                raise web.HTTPNotFound(text=f'preset {against} not found')
+        diff = diff_states(current, target, channels, params)
+        return web.json_response({'name': name, 'against': against, **diff})
+
+    async def get_preset_history(request):
+        if not hasattr(app['presets'], 'history'):
+            raise web.HTTPBadRequest(text='preset versions require PRESET_BACKEND=sqlite')
+        try:
+            versions = app['presets'].history(request.match_info.get('name'))
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        if not versions:
+            raise web.HTTPNotFound(text='preset not found')
+        return web.json_response({'name': request.match_info.get('name'), 'versions': versions})
+
+    async def put_preset_tags(request):
+        if not hasattr(app['presets'], 'set_tags'):
+            raise web.HTTPBadRequest(text='preset tags require PRESET_BACKEND=sqlite')
+        try:
+            data = await request.json()
+            if not isinstance(data, dict):
+                raise ValueError('JSON object expected')
+            tags = app['presets'].set_tags(request.match_info.get('name'), data.get('tags'))
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        return web.json_response({'name': request.match_info.get('name'), 'tags': tags})
+
     async def post_preset(request):
         try:
             data = await request.json()
@@ -617,12 +1378,65 @@ def create_app():
         except Exception as e:
             raise web.HTTPBadRequest(text=str(e))
 
+    async def export_presets_archive(request):
+        # stream all (or ?names=a,b) presets as a tar.gz with a manifest
+        names = request.query.get('names')
+        try:
+            if names:
+                names = [validate_preset_name(n.strip()) for n in names.split(',') if n.strip()]
+            else:
+                names = sorted(app['presets'].list_presets())
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        resp = web.StreamResponse(headers={
+            'Content-Type': 'application/gzip',
+            'Content-Disposition': f'attachment; filename="presets-{time.strftime("%Y%m%d-%H%M%S")}.tar.gz"',
+        })
+        await resp.prepare(request)
+        await app['archive_jobs'].export(names, resp.write)
+        await resp.write_eof()
+        return resp
+
+    async def import_presets_archive(request):
+        # spool the upload to a temp file, then validate and import in the background
+        overwrite = request.query.get('overwrite', '0') not in ('0', 'false', 'False', '')
+        fd, path = tempfile.mkstemp(prefix='presets-import-', suffix='.tar.gz')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                async for chunk in request.content.iter_chunked(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_ARCHIVE_BYTES:
+                        raise web.HTTPRequestEntityTooLarge(max_size=MAX_ARCHIVE_BYTES, actual_size=size)
+                    f.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        if not size:
+            os.unlink(path)
+            raise web.HTTPBadRequest(text='empty archive')
+        status = app['archive_jobs'].start_import(path, overwrite=overwrite)
+        return web.json_response(status, status=202)
+
+    async def get_preset_job(request):
+        job = app['archive_jobs'].get(request.match_info.get('job_id'))
+        if job is None:
+            raise web.HTTPNotFound(text='job not found')
+        return web.json_response(app['archive_jobs'].public(job))
+
     async def get_current_state(request):
         # return current mixer state
         return web.json_response({'state': app['mixer'].to_dict()})
 
     app.router.add_get('/api/presets', list_presets)
+    # archive routes go before /api/presets/{name}
+    app.router.add_get('/api/presets/archive', export_presets_archive)
+    app.router.add_post('/api/presets/archive', import_presets_archive)
+    app.router.add_get('/api/presets/archive/jobs/{job_id}', get_preset_job)
     app.router.add_get('/api/presets/{name}', get_preset)
+    app.router.add_get('/api/presets/{name}/history', get_preset_history)
+    app.router.add_get('/api/presets/{name}/diff', get_preset_diff)
+    app.router.add_put('/api/presets/{name}/tags', put_preset_tags)
     app.router.add_post('/api/presets', post_preset)
     app.router.add_get('/api/presets/current', get_current_state)
 
@@ -670,8 +1484,9 @@ def create_app():
             logger.error(f"Unexpected error parsing YAML: {e}")
             raise web.HTTPBadRequest(text=f'Failed to parse YAML: {str(e)[:100]}')
 
-        mapped, info = map_yaml_to_state(yobj, channels=len(app['mixer'].channels))
+        mapped, info = map_to_console(app, yobj)
         app['mixer'].channels = mapped['channels']
+        app['mixer'].touch_all()
         await broadcast_state(app)
         # save as preset
         await app['presets'].save_preset(preset_name, app['mixer'].to_dict())
@@ -752,27 +1567,13 @@ def create_app():
     app.router.add_post('/api/camilla_config', post_camilla_config)
 
     async def get_logging(request):
-        enabled = True
-        root_logger = logging.getLogger()
-        for handler in root_logger.handlers:
-            if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
-                if handler.level >= logging.CRITICAL:
-                    enabled = False
-                break
-        return web.json_response({'console_enabled': enabled})
+        return web.json_response({'console_enabled': get_console_enabled()})
 
     async def post_logging(request):
         try:
             data = await request.json()
             enabled = bool(data.get('console_enabled', True))
-            
-            root_logger = logging.getLogger()
-            for handler in root_logger.handlers:
-                if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
-                    if enabled:
-                        handler.setLevel(logging.INFO)
-                    else:
-                        handler.setLevel(logging.CRITICAL + 1)
+            set_console_enabled(enabled)
             
             # Save to config
             SERVER_CONFIG['console_enabled'] = enabled
@@ -791,7 +1592,71 @@ def create_app():
     app.router.add_get('/api/logging', get_logging)
     app.router.add_post('/api/logging', post_logging)
 
-    app.router.add_static('/', FRONTEND_DIR, show_index=True)
+    # Event-loop lag / blocking-call detector
+    async def get_loop_debug(request):
+        return web.json_response(app['watchdog'].stats())
+
+    async def post_loop_debug(request):
+        try:
+            data = await request.json()
+            threshold_ms = data.get('threshold_ms')
+            app['watchdog'].configure(
+                enabled=data.get('enabled'),
+                threshold=float(threshold_ms) / 1000.0 if threshold_ms is not None else None)
+            if data.get('clear'):
+                app['watchdog'].clear()
+            return web.json_response(app['watchdog'].stats())
+        except (ValueError, TypeError) as e:
+            raise web.HTTPBadRequest(text=f'Invalid watchdog settings: {str(e)}')
+
+    app.router.add_get('/api/debug/loop', get_loop_debug)
+    app.router.add_post('/api/debug/loop', post_loop_debug)
+
+    # Action audit log query API
+    async def get_actions(request):
+        audit = app.get('audit')
+        if audit is None:
+            raise web.HTTPServiceUnavailable(text='audit log unavailable')
+        q = request.query
+        try:
+            start = float(q['start']) if 'start' in q else None
+            end = float(q['end']) if 'end' in q else None
+            channel = q.get('channel')
+            if channel is not None and channel != 'master':
+                channel = int(channel)
+            limit = int(q.get('limit', 100))
+            cursor = int(q['cursor']) if 'cursor' in q else None
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=f'Invalid query: {str(e)}')
+        result = await asyncio.to_thread(audit.query, start, end, channel, limit, cursor)
+        return web.json_response(result)
+
+    app.router.add_get('/api/actions', get_actions)
+
+    # Prometheus metrics (per-client gauges are computed at scrape time only)
+    def send_buffer_sizes():
+        for ws in list(app['sockets']):
+            transport = ws.get('transport')
+            if transport is not None and not transport.is_closing():
+                yield (ws.get('client_id'),), transport.get_write_buffer_size()
+
+    WS_SEND_BUFFER_BYTES.set_function(send_buffer_sizes)
+    # a cluster viewer process counts for its clients
+    WS_CLIENTS.set_function(lambda: [((), sum(ws.get('client_count', 1) for ws in app['sockets']))])
+
+    async def get_metrics(request):
+        return web.Response(body=REGISTRY.render().encode('utf-8'),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    app.router.add_get('/metrics', get_metrics)
+
+    if SERVER_WORKERS > 1:
+        # viewer processes subscribe here, over the Unix socket only
+        from .cluster import BUS_ROUTE, bus_handler
+        app.router.add_get(BUS_ROUTE, bus_handler)
+
+    # frontend assets (ETag, cache headers, precompressed variants); keep last
+    app.router.add_get('/{path:.+}', app['static'].handle)
 
     async def on_startup(app):
         # start adapter if needed
@@ -801,8 +1666,31 @@ def create_app():
                 await adapter.start()
             except Exception:
                 logger.exception('adapter start failed')
+        # size the console from the active DSP config (mixer dest count)
+        if getattr(adapter, '_py_connected', False) and hasattr(adapter, 'get_channel_count'):
+            try:
+                count = await asyncio.to_thread(adapter.get_channel_count)
+                if count and app['mixer'].resize(count):
+                    logger.info('Mixer sized to %d channels from the DSP config', count)
+            except Exception:
+                logger.exception('failed to read channel count from DSP config')
+            app['precompile_task'] = asyncio.create_task(precompile_presets(app))
+        # start event-loop watchdog
+        if LOOP_WATCHDOG_ENABLED:
+            await app['watchdog'].start()
+        # same meter frames for local processes, without a socket
+        if METER_RING_PATH:
+            from .meter_ring import MeterRing
+            ring = MeterRing(METER_RING_PATH, MAX_CHANNELS + 1, slots=METER_RING_SLOTS)
+            try:
+                ring.open()
+                app['meter_ring'] = ring
+            except OSError as e:
+                logger.error('Meter ring disabled: %s', e)
         # start levels broadcaster
         app['broadcaster_task'] = asyncio.create_task(levels_broadcaster(app))
+        # follow changes made on the DSP by other clients
+        app['dsp_watcher'].start()
         # start autosave task
         async def autosave_loop():
             while True:
@@ -811,7 +1699,8 @@ def create_app():
                     if not app['autosave_enabled']:
                         continue
                     name = 'autosave'
-                    await app['presets'].save_preset(name, app['mixer'].to_dict())
+                    with AUTOSAVE_SECONDS.time():
+                        await app['presets'].save_preset(name, app['mixer'].to_dict())
                     logger.info('autosaved preset')
                 except asyncio.CancelledError:
                     break
@@ -820,7 +1709,37 @@ def create_app():
 
         app['autosave_task'] = asyncio.create_task(autosave_loop())
 
+        # flush the action audit log off the event loop
+        async def audit_flush_loop():
+            while True:
+                try:
+                    await asyncio.sleep(AUDIT_FLUSH_INTERVAL)
+                    if app.get('audit') is not None:
+                        await asyncio.to_thread(app['audit'].flush)
+                except asyncio.CancelledError:
+                    break
+                except Exception:
+                    logger.exception('audit flush failed')
+
+        app['audit_task'] = asyncio.create_task(audit_flush_loop())
+
     async def on_cleanup(app):
+        await app['watchdog'].stop()
+        await app['scenes'].stop()
+        await app['archive_jobs'].stop()
+        await app['dsp_sync'].stop()
+        await app['dsp_watcher'].stop()
+        if app.get('meter_ring') is not None:
+            app['meter_ring'].close()
+        if app.get('analyzer') is not None:
+            await app['analyzer'].stop()
+        pt = app.get('precompile_task')
+        if pt:
+            pt.cancel()
+            try:
+                await pt
+            except asyncio.CancelledError:
+                pass
         # stop broadcaster
         task = app.get('broadcaster_task')
         if task:
@@ -837,6 +1756,23 @@ def create_app():
                 await at
             except asyncio.CancelledError:
                 pass
+        # stop audit flusher and write what is left
+        aut = app.get('audit_task')
+        if aut:
+            aut.cancel()
+            try:
+                await aut
+            except asyncio.CancelledError:
+                pass
+        if app.get('audit') is not None:
+            try:
+                await asyncio.to_thread(app['audit'].close)
+            except Exception:
+                logger.exception('audit close failed')
+        if hasattr(app['presets'], 'close'):
+            app['presets'].close()
+        # push the last control changes before the adapter goes away
+        await app['control_writer'].wait()
         # stop adapter
         adapter = app.get('adapter')
         if hasattr(adapter, 'stop'):
@@ -853,6 +1789,10 @@ def create_app():
 
 def main():
     app = create_app()
+    if SERVER_WORKERS > 1:
+        from .cluster import run_cluster
+        run_cluster(app, SERVER_WORKERS, CLUSTER_SOCKET, host='0.0.0.0', port=8001)
+        return
     web.run_app(app, host='0.0.0.0', port=8001)
 
 
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+from typing import Optional
+
+from aiohttp import web
+
+logger = logging.getLogger('static')
+
+MANIFEST_NAME = 'asset-manifest.json'
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+# precompressed variants, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+TEXT_TYPES = ('text/', 'application/javascript', 'application/json')
+
+
+def accepted_encodings(header: Optional[str]) -> set:
+    """Parse Accept-Encoding into the set of codings with a non-zero q."""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+class StaticAssets:
+    """Serves the frontend with ETags, cache headers and precompressed files.
+
+    When `dist_dir` holds a build from `scripts/build_frontend.py` (it has an
+    `asset-manifest.json`), the content-hashed JS/CSS files are served with a
+    one-year immutable cache and everything else (index.html) is revalidated
+    through its ETag. `.br`/`.gz` variants are picked by Accept-Encoding.
+    Without a build the sources are served with ETag revalidation only.
+
+    File contents are kept in memory and re-read when their mtime or size
+    changes.
+    """
+
+    def __init__(self, source_dir: str, dist_dir: Optional[str] = None):
+        self.built = bool(dist_dir) and os.path.isfile(os.path.join(dist_dir, MANIFEST_NAME))
+        self.root = os.path.realpath(dist_dir if self.built else source_dir)
+        self.hashed = set()
+        if self.built:
+            with open(os.path.join(self.root, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                self.hashed = set(json.load(f).values())
+        # file path -> (mtime_ns, size, etag, {encoding: bytes})
+        self._cache = {}
+
+    def _resolve(self, rel: str) -> Optional[str]:
+        rel = rel.lstrip('/') or 'index.html'
+        if any(part.startswith('.') for part in rel.split('/')):
+            return None
+        path = os.path.realpath(os.path.join(self.root, rel))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def _entry(self, path: str) -> tuple:
+        st = os.stat(path)
+        cached = self._cache.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached
+        with open(path, 'rb') as f:
+            data = f.read()
+        variants = {'identity': data}
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                with open(path + suffix, 'rb') as f:
+                    variants[encoding] = f.read()
+        etag = hashlib.sha1(data).hexdigest()[:20]
+        entry = (st.st_mtime_ns, st.st_size, etag, variants)
+        self._cache[path] = entry
+        return entry
+
+    def cache_control(self, path: str) -> str:
+        if self.built and os.path.basename(path) in self.hashed:
+            return IMMUTABLE_CACHE
+        return REVALIDATE_CACHE
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        path = self._resolve(request.match_info.get('path', ''))
+        if path is None:
+            raise web.HTTPNotFound()
+        _, _, etag, variants = self._entry(path)
+
+        encoding = 'identity'
+        if len(variants) > 1:
+            accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+            for candidate, _ in ENCODINGS:
+                if candidate in variants and candidate in accepted:
+                    encoding = candidate
+                    break
+        tag = f'"{etag}"' if encoding == 'identity' else f'"{etag}-{encoding}"'
+        headers = {'ETag': tag, 'Cache-Control': self.cache_control(path)}
+        if len(variants) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+
+        # every variant has the same content, so any of our tags validates
+        if_none_match = request.headers.get('If-None-Match', '')
+        if if_none_match.strip() == '*' or any(
+                t.strip().removeprefix('W/').strip('"').split('-')[0] == etag for t in if_none_match.split(',')):
+            return web.Response(status=304, headers=headers)
+
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith(TEXT_TYPES):
+            content_type += '; charset=utf-8'
+        headers['Content-Type'] = content_type
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return web.Response(body=variants[encoding], headers=headers)
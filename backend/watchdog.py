@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from .metrics import LOOP_LAG_SECONDS, LOOP_STALLS_TOTAL
+
+logger = logging.getLogger('watchdog')
+
+DEFAULT_PROBE_INTERVAL = 0.05
+DEFAULT_STALL_THRESHOLD = 0.1
+MAX_STACK_FRAMES = 40
+
+
+class LoopWatchdog:
+    """Measure event-loop lag and capture the stack of callbacks that block it.
+
+    A probe coroutine sleeps `interval` seconds in a loop and records how late
+    it wakes up (the loop lag), refreshing a heartbeat each time. A daemon
+    thread watches the heartbeat: when it is older than `interval + threshold`
+    the loop is stuck in a callback, and the thread snapshots the loop
+    thread's current stack via `sys._current_frames()` while the offending
+    code is still running.
+    """
+
+    def __init__(self, interval: float = DEFAULT_PROBE_INTERVAL, threshold: float = DEFAULT_STALL_THRESHOLD,
+                 max_stalls: int = 50, max_samples: int = 1200):
+        self.interval = interval
+        self.threshold = threshold
+        self.enabled = True
+        self.stall_count = 0
+        self._stalls = deque(maxlen=max_stalls)
+        self._lags = deque(maxlen=max_samples)
+        self._max_lag = 0.0
+        self._heartbeat = time.perf_counter()
+        self._current_stall: Optional[dict] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._thread = threading.Thread(target=self._monitor, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    async def _probe(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._heartbeat = now
+            lag = max(0.0, now - start - self.interval)
+            self._lags.append(lag)
+            if lag > self._max_lag:
+                self._max_lag = lag
+            LOOP_LAG_SECONDS.observe(lag)
+            stall = self._current_stall
+            if stall is not None:
+                # the blocking callback returned: record how long it held the loop
+                stall['duration_ms'] = round(lag * 1000.0, 1)
+                self._current_stall = None
+
+    def _monitor(self):
+        poll = max(0.005, self.interval / 2)
+        while not self._stop.wait(poll):
+            if not self.enabled or self._current_stall is not None:
+                continue
+            blocked = time.perf_counter() - self._heartbeat - self.interval
+            if blocked > self.threshold:
+                self._capture(blocked)
+
+    def _capture(self, blocked: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame, limit=MAX_STACK_FRAMES) if frame is not None else []
+        stall = {
+            'at': time.time(),
+            'blocked_ms_at_capture': round(blocked * 1000.0, 1),
+            'duration_ms': None,  # filled in once the loop resumes
+            'stack': [line.rstrip() for line in stack],
+        }
+        self._current_stall = stall
+        self._stalls.append(stall)
+        self.stall_count += 1
+        LOOP_STALLS_TOTAL.inc()
+        logger.warning('Event loop blocked for more than %.0f ms', blocked * 1000.0)
+
+    def configure(self, enabled: Optional[bool] = None, threshold: Optional[float] = None):
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if threshold is not None:
+            if threshold <= 0:
+                raise ValueError('threshold must be positive')
+            self.threshold = float(threshold)
+
+    def clear(self):
+        self._stalls.clear()
+        self._lags.clear()
+        self._max_lag = 0.0
+        self.stall_count = 0
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+
+        def pct(p):
+            if not lags:
+                return 0.0
+            return round(lags[min(len(lags) - 1, int(p * len(lags)))] * 1000.0, 2)
+
+        return {
+            'enabled': self.enabled,
+            'running': self._task is not None,
+            'interval_ms': self.interval * 1000.0,
+            'threshold_ms': self.threshold * 1000.0,
+            'lag_ms': {
+                'last': round(self._lags[-1] * 1000.0, 2) if self._lags else 0.0,
+                'p50': pct(0.5),
+                'p99': pct(0.99),
+                'max': round(self._max_lag * 1000.0, 2),
+                'samples': len(lags),
+            },
+            'stall_count': self.stall_count,
+            'stalls': list(self._stalls),
+        }
@@ -0,0 +1,137 @@
+"""Fader-to-DSP latency against the fake CamillaDSP server.
+
+Two measurements per config size:
+
+* adapter: direct `CamillaAdapter` calls (`set_level`, `get_current_state`,
+  `get_playback_levels`), i.e. the cost of the `config.active()` /
+  `set_active()` round-trips through pycamilladsp;
+* end-to-end: a WebSocket client sends `set_channel_level` to the backend
+  and the clock stops when the fake DSP receives the resulting config.
+
+Requires the pycamilladsp client library (the adapter's only DSP
+transport). Usage::
+
+    python -m benchmarks.bench_dsp_latency --channels 8 32 128 --iterations 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from .common import isolate_backend, summarize
+from .configs import make_camilla_config
+from .fake_camilladsp import FakeCamillaDSP
+
+
+async def _connected_adapter(port: int):
+    from backend.camilla_adapter import CamillaAdapter
+    adapter = CamillaAdapter(url='')
+    adapter._py_port = port
+    await adapter.start()
+    if not adapter._py_connected:
+        raise RuntimeError('adapter could not connect to the fake CamillaDSP')
+    return adapter
+
+
+async def bench_adapter(port: int, channels: int, iterations: int) -> list:
+    adapter = await _connected_adapter(port)
+    results = []
+    try:
+        calls = {
+            'set_level': lambda i: adapter.set_level(1 + i % channels, -float(i % 60)),
+            'get_current_state': lambda i: adapter.get_current_state(),
+            'get_playback_levels': lambda i: adapter.get_playback_levels(),
+        }
+        for name, call in calls.items():
+            samples = []
+            for i in range(iterations):
+                start = time.perf_counter()
+                call(i)
+                samples.append(time.perf_counter() - start)
+            results.append(summarize(f'adapter.{name}', samples))
+    finally:
+        await adapter.stop()
+    return results
+
+
+async def bench_end_to_end(fake: FakeCamillaDSP, channels: int, iterations: int) -> list:
+    from aiohttp.test_utils import TestClient, TestServer
+    from backend.server import create_app
+
+    app = create_app()
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    samples = []
+    try:
+        ws = await client.ws_connect('/ws')
+        await ws.receive_json()  # initial state
+        mixer_channels = len(app['mixer'].channels)
+        for i in range(iterations):
+            seen = len(fake.set_config_times)
+            start = time.perf_counter()
+            await ws.send_json({'type': 'set_channel_level',
+                                'payload': {'channel': i % min(channels, mixer_channels),
+                                            'level_db': -float(1 + i % 60)}})
+            deadline = start + 5.0
+            while len(fake.set_config_times) == seen and time.perf_counter() < deadline:
+                await asyncio.sleep(0.0002)
+            if len(fake.set_config_times) > seen:
+                samples.append(fake.set_config_times[-1] - start)
+        await ws.close()
+    finally:
+        await client.close()
+    return [summarize('end_to_end.set_channel_level', samples)]
+
+
+async def run(args) -> list:
+    report = []
+    for channels in args.channels:
+        config = make_camilla_config(channels, args.inputs, args.filters_per_channel)
+        fake = FakeCamillaDSP(config, latency=args.latency_ms / 1000.0,
+                              config_latency_per_kb=args.config_latency_ms_per_kb / 1000.0)
+        port = fake.start_in_thread()
+        os.environ['CAMILLA_PORT'] = str(port)
+        try:
+            rows = await bench_adapter(port, channels, args.iterations)
+            rows += await bench_end_to_end(fake, channels, args.iterations)
+        finally:
+            fake.stop_thread()
+        size_kb = round(len(json.dumps(config)) / 1024.0, 1)
+        for row in rows:
+            row.update(channels=channels, config_kb=size_kb)
+        report.extend(rows)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure fader-to-DSP latency against a fake CamillaDSP.')
+    parser.add_argument('--channels', type=int, nargs='+', default=[8, 32, 128])
+    parser.add_argument('--inputs', type=int, default=2)
+    parser.add_argument('--filters-per-channel', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--config-latency-ms-per-kb', type=float, default=0.0)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    from backend.camilla_adapter import CamillaClient
+    if CamillaClient is None:
+        print('pycamilladsp is not installed; the adapter has no DSP transport to benchmark.', file=sys.stderr)
+        return 2
+
+    isolate_backend()
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'channels':>8} {'config KiB':>10}  {'measurement':<32} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for row in report:
+            print(f"{row['channels']:>8} {row['config_kb']:>10}  {row['name']:<32} "
+                  f"{row['p50_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
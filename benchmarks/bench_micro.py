@@ -0,0 +1,132 @@
+"""Microbenchmarks for the backend's serialization and state paths.
+
+Stand-alone (timeit based, no extra dependency). Each case is timed with
+`timeit.Timer.autorange()` to pick a loop count, then repeated; the best
+and median per-call times are reported in microseconds.
+
+Cases:
+
+* `to_dict[N]`: `MixerState.to_dict()` plus its JSON encoding (what every
+  state broadcast does);
+* `map_yaml_to_state[N]`: mapping a parsed large CamillaDSP config, and
+  `import_yaml[N]` including the YAML parse;
+* `update_dsp_mutes[N]`: mute/solo resolution through the stub adapter;
+* `preset_save[N]` / `preset_load[N]`: `PresetManager` round-trip to disk;
+* `preset_compile[N]`: compiling a preset against a large base config (done
+  once per preset and base config, off the recall path);
+* `levels_frame[N]`: building and encoding one levels broadcast frame.
+
+N is the channel count (8, 64 and 256 by default). Usage::
+
+    python -m benchmarks.bench_micro
+    python -m benchmarks.bench_micro -k preset --check
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import timeit
+
+import yaml
+
+from .common import check_baseline, isolate_backend, save_baseline
+from .configs import make_camilla_config, make_mixer_state
+
+SUITE = 'micro'
+DEFAULT_SIZES = (8, 64, 256)
+# extra peaking filters per channel in the "large config" cases
+LARGE_CONFIG_FILTERS = 8
+
+
+def build_cases(sizes, scratch: str) -> dict:
+    """Return {case name: zero-argument callable}."""
+    from backend.camilla_adapter import CamillaAdapter
+    from backend.camilla_config import CamillaConfig
+    from backend.presets import PresetManager
+    from backend.server import MixerState, map_yaml_to_state, update_dsp_mutes
+
+    loop = asyncio.new_event_loop()
+    presets = PresetManager(os.path.join(scratch, 'presets'))
+    cases = {}
+    for n in sizes:
+        mixer = MixerState(channels=n)
+        mixer.channels = make_mixer_state(n)['channels']
+        cases[f'to_dict[{n}]'] = lambda mixer=mixer: json.dumps({'type': 'state', 'payload': mixer.to_dict()})
+
+        config = make_camilla_config(n, filters_per_channel=LARGE_CONFIG_FILTERS)
+        raw_yaml = yaml.safe_dump(config)
+        cases[f'map_yaml_to_state[{n}]'] = lambda config=config, n=n: map_yaml_to_state(config, channels=n)
+        cases[f'import_yaml[{n}]'] = lambda raw=raw_yaml, n=n: map_yaml_to_state(yaml.safe_load(raw), channels=n)
+
+        app = {'mixer': MixerState(channels=n), 'adapter': CamillaAdapter(url='')}
+        app['mixer'].channels[n // 2]['solo'] = True
+        cases[f'update_dsp_mutes[{n}]'] = lambda app=app: update_dsp_mutes(app)
+
+        state = make_mixer_state(n)
+        name = f'bench_{n}'
+        loop.run_until_complete(presets.save_preset(name, state))
+        cases[f'preset_save[{n}]'] = lambda name=name, state=state: loop.run_until_complete(presets.save_preset(name, state))
+        cases[f'preset_load[{n}]'] = lambda name=name: loop.run_until_complete(presets.load_preset(name))
+        base = CamillaConfig(config)
+        cases[f'preset_compile[{n}]'] = lambda base=base, state=state: base.compile_state(state)
+
+        def levels_frame(mixer=mixer):
+            levels = [{'channel': 'master', 'level_db': -6.0, 'peak_db': -5.5}]
+            for ch in mixer.channels:
+                level = max(-60.0, min(12.0, ch['level_db']))
+                levels.append({'channel': ch['index'], 'level_db': level, 'peak_db': level + 0.5})
+            return json.dumps({'type': 'levels', 'payload': {'channels': levels, 'ts': time.time()}})
+        cases[f'levels_frame[{n}]'] = levels_frame
+    return cases
+
+
+def time_case(fn, repeat: int = 5) -> dict:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'number': number,
+        'best_us': round(min(runs) * 1e6, 2),
+        'median_us': round(statistics.median(runs) * 1e6, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Microbenchmarks for CamillaMixer backend hot paths.')
+    parser.add_argument('-k', dest='keyword', help='only run cases whose name contains this text')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='channel counts')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--check', action='store_true', help='compare against baselines.json')
+    parser.add_argument('--update-baseline', action='store_true', help='store results as the new baseline')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    scratch = isolate_backend()
+    cases = build_cases(args.sizes, scratch)
+    report = {}
+    regressions = []
+    for name, fn in cases.items():
+        if args.keyword and args.keyword not in name:
+            continue
+        result = time_case(fn, args.repeat)
+        report[name] = result
+        if not args.json:
+            print(f"{name:<28} best {result['best_us']:>12.2f} us   median {result['median_us']:>12.2f} us")
+        metrics = {'best_us': result['best_us']}
+        if args.update_baseline:
+            save_baseline(SUITE, name, metrics)
+        if args.check:
+            regressions.extend(check_baseline(SUITE, name, metrics))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    for line in regressions:
+        print(f'REGRESSION {line}', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
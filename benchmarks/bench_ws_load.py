@@ -0,0 +1,282 @@
+"""WebSocket load benchmark: how many control surfaces and meter viewers one
+instance can serve.
+
+The backend (`create_app()`) runs in this process on a real TCP port; the
+simulated clients run in a spawned child process so that the CPU time and
+RSS measured here belong to the server alone. Two kinds of clients:
+
+* faders: drag one channel at `--fader-hz` (60 Hz by default), each move a
+  `set_channel_level` with a distinct value;
+* viewers: connect, send `subscribe_levels` and only consume broadcasts.
+
+Reported per scenario:
+
+* meter delivery latency: receive time minus the `ts` stamped into each
+  `levels` frame by the broadcaster (same host, same clock);
+* command-to-broadcast latency: from sending a fader move to the first
+  `state` broadcast carrying that move or a later one (state broadcasts are
+  debounced by the broadcaster period);
+* server CPU (percent of one core) and CPU / RSS per connected client.
+
+Results can be checked against `baselines.json` (`--check`, non-zero exit on
+regression) or recorded as the new baseline (`--update-baseline`). Baselines
+are machine-specific: record them on the box that runs the check.
+
+Usage::
+
+    python -m benchmarks.bench_ws_load --scenario small medium --check
+    python -m benchmarks.bench_ws_load --faders 32 --viewers 500 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .common import check_baseline, isolate_backend, percentile, save_baseline
+
+SUITE = 'ws_load'
+SCENARIOS = {
+    'small': {'faders': 2, 'viewers': 20, 'channels': 8},
+    'medium': {'faders': 8, 'viewers': 200, 'channels': 16},
+    'large': {'faders': 32, 'viewers': 500, 'channels': 64},
+}
+# metrics compared against the baseline (all lower-is-better)
+CHECKED_METRICS = ('meter_p50_ms', 'meter_p99_ms', 'command_p50_ms', 'command_p99_ms',
+                   'cpu_percent', 'rss_kib_per_client')
+MAX_PENDING = 256
+
+
+def _rss_kib() -> int:
+    """Current resident set size of this process in KiB (Linux)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# -- client side (child process) -------------------------------------------
+
+class _ClientStats:
+    def __init__(self):
+        self.meter_latencies = []
+        self.command_latencies = []
+        self.frames = 0
+        self.bytes = 0
+        self.commands_sent = 0
+        self.errors = 0
+
+
+async def _reader(ws, stats: _ClientStats, channel=None, pending=None):
+    async for msg in ws:
+        if msg.type.name != 'TEXT':
+            continue
+        now = time.time()
+        stats.frames += 1
+        stats.bytes += len(msg.data)
+        data = json.loads(msg.data)
+        typ = data.get('type')
+        if typ == 'levels':
+            ts = data.get('payload', {}).get('ts')
+            if ts:
+                stats.meter_latencies.append(now - ts)
+        elif typ in ('state', 'state_patch') and pending:
+            payload = data.get('payload', {})
+            if typ == 'state':
+                channels = payload.get('channels', [])
+                level = channels[channel].get('level_db') if channel < len(channels) else None
+            else:
+                level = next((c['value'] for c in payload.get('changes', [])
+                              if c['channel'] == channel and c['field'] == 'level_db'), None)
+            sent_at = pending.get(level)
+            if sent_at is not None:
+                # this broadcast delivers the visible move and every
+                # earlier move it superseded
+                for lv in [lv for lv, t in pending.items() if t <= sent_at]:
+                    stats.command_latencies.append(now - pending.pop(lv))
+
+
+async def _fader_client(session, url, channel, hz, stop_at, stats):
+    ws = await session.ws_connect(url, max_msg_size=0)
+    pending = {}
+    reader = asyncio.create_task(_reader(ws, stats, channel, pending))
+    period = 1.0 / hz
+    seq = 0
+    try:
+        while time.time() < stop_at:
+            seq += 1
+            level = -round((seq % 600) / 10.0, 1)
+            pending[level] = time.time()
+            if len(pending) > MAX_PENDING:
+                del pending[next(iter(pending))]
+            await ws.send_str(json.dumps({'type': 'set_channel_level',
+                                          'payload': {'channel': channel, 'level_db': level}}))
+            stats.commands_sent += 1
+            await asyncio.sleep(period)
+    finally:
+        await ws.close()
+        reader.cancel()
+
+
+async def _viewer_client(session, url, stop_at, stats):
+    ws = await session.ws_connect(url, max_msg_size=0)
+    await ws.send_str(json.dumps({'type': 'subscribe_levels', 'payload': {'interval_ms': 100}}))
+    reader = asyncio.create_task(_reader(ws, stats))
+    try:
+        await asyncio.sleep(max(0.0, stop_at - time.time()))
+    finally:
+        await ws.close()
+        reader.cancel()
+
+
+async def _run_clients(url, faders, viewers, channels, hz, duration, connected):
+    import aiohttp
+    stats = _ClientStats()
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # connect everybody first so the load phase starts all at once
+        gate = asyncio.Event()
+        holders = []
+
+        async def hold(kind, i):
+            try:
+                await gate.wait()
+                stop_at = start_at + duration
+                if kind == 'fader':
+                    await _fader_client(session, url, i % channels, hz, stop_at, stats)
+                else:
+                    await _viewer_client(session, url, stop_at, stats)
+            except Exception:
+                stats.errors += 1
+
+        for i in range(faders):
+            holders.append(asyncio.create_task(hold('fader', i)))
+        for i in range(viewers):
+            holders.append(asyncio.create_task(hold('viewer', i)))
+        start_at = time.time()
+        connected.put(('start', start_at))
+        gate.set()
+        await asyncio.gather(*holders)
+    return stats
+
+
+def _client_process(url, faders, viewers, channels, hz, duration, results):
+    stats = asyncio.run(_run_clients(url, faders, viewers, channels, hz, duration, results))
+    results.put(('done', {
+        'meter': stats.meter_latencies,
+        'command': stats.command_latencies,
+        'frames': stats.frames,
+        'bytes': stats.bytes,
+        'commands_sent': stats.commands_sent,
+        'errors': stats.errors,
+    }))
+
+
+# -- server side -------------------------------------------------------------
+
+async def run_scenario(faders: int, viewers: int, channels: int, hz: float = 60.0,
+                       duration: float = 5.0) -> dict:
+    from aiohttp.test_utils import TestServer
+    from backend.server import MixerState, create_app
+
+    app = create_app()
+    app['mixer'] = MixerState(channels=channels)
+    server = TestServer(app)
+    await server.start_server()
+    url = str(server.make_url('/ws'))
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    try:
+        await asyncio.sleep(0.2)  # let startup tasks settle
+        rss_idle = _rss_kib()
+        proc = ctx.Process(target=_client_process,
+                           args=(url, faders, viewers, channels, hz, duration, results), daemon=True)
+        proc.start()
+        kind, _ = await asyncio.to_thread(results.get, True, 60.0)
+        assert kind == 'start'
+        # wait for the connection storm to finish before sampling
+        clients = faders + viewers
+        deadline = time.time() + 30.0
+        while len(app['sockets']) < clients and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        connected = len(app['sockets'])
+        rss_loaded = _rss_kib()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        kind, data = await asyncio.to_thread(results.get, True, duration + 60.0)
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+        await asyncio.to_thread(proc.join, 10.0)
+    finally:
+        await server.close()
+
+    cpu_percent = 100.0 * cpu / wall if wall > 0 else 0.0
+    return {
+        'faders': faders,
+        'viewers': viewers,
+        'channels': channels,
+        'connected': connected,
+        'errors': data['errors'],
+        'commands_sent': data['commands_sent'],
+        'frames_received': data['frames'],
+        'mib_received': round(data['bytes'] / (1024.0 * 1024.0), 2),
+        'meter_p50_ms': round(percentile(data['meter'], 0.5) * 1000.0, 2),
+        'meter_p99_ms': round(percentile(data['meter'], 0.99) * 1000.0, 2),
+        'command_p50_ms': round(percentile(data['command'], 0.5) * 1000.0, 2),
+        'command_p99_ms': round(percentile(data['command'], 0.99) * 1000.0, 2),
+        'cpu_percent': round(cpu_percent, 1),
+        'cpu_percent_per_client': round(cpu_percent / max(1, connected), 3),
+        'rss_kib_per_client': round(max(0, rss_loaded - rss_idle) / max(1, connected), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='WebSocket load benchmark for the CamillaMixer backend.')
+    parser.add_argument('--scenario', nargs='+', choices=sorted(SCENARIOS),
+                        help='predefined scenarios (default: small)')
+    parser.add_argument('--faders', type=int, help='custom scenario: fader clients')
+    parser.add_argument('--viewers', type=int, default=0, help='custom scenario: level viewers')
+    parser.add_argument('--channels', type=int, default=8, help='custom scenario: mixer channels')
+    parser.add_argument('--fader-hz', type=float, default=60.0)
+    parser.add_argument('--duration', type=float, default=5.0, help='load phase length in seconds')
+    parser.add_argument('--check', action='store_true', help='compare against baselines.json')
+    parser.add_argument('--update-baseline', action='store_true', help='store results as the new baseline')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    isolate_backend()
+    if args.faders is not None:
+        scenarios = {'custom': {'faders': args.faders, 'viewers': args.viewers, 'channels': args.channels}}
+    else:
+        scenarios = {name: SCENARIOS[name] for name in (args.scenario or ['small'])}
+
+    report = {}
+    regressions = []
+    for name, spec in scenarios.items():
+        result = asyncio.run(run_scenario(hz=args.fader_hz, duration=args.duration, **spec))
+        report[name] = result
+        metrics = {k: result[k] for k in CHECKED_METRICS}
+        if args.update_baseline and name != 'custom':
+            save_baseline(SUITE, name, metrics)
+        if args.check and name != 'custom':
+            regressions.extend(check_baseline(SUITE, name, metrics))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, result in report.items():
+            print(f'[{name}]')
+            for key, value in result.items():
+                print(f'  {key:<24} {value}')
+    for line in regressions:
+        print(f'REGRESSION {line}', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
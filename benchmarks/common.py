@@ -0,0 +1,80 @@
+"""Shared helpers for the benchmark scripts: statistics, baselines, isolation."""
+import json
+import os
+import tempfile
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+# a result regresses when it is worse than baseline * (1 + tolerance) + slack;
+# the absolute slack keeps near-zero metrics (sub-ms latencies) from flapping
+DEFAULT_TOLERANCE = 0.5
+ABSOLUTE_SLACK = 1.0
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def summarize(name: str, samples: list) -> dict:
+    """Summarize durations in seconds as p50/p99/max milliseconds."""
+    return {
+        'name': name,
+        'n': len(samples),
+        'p50_ms': round(percentile(samples, 0.5) * 1000.0, 3),
+        'p99_ms': round(percentile(samples, 0.99) * 1000.0, 3),
+        'max_ms': round(max(samples) * 1000.0, 3) if samples else 0.0,
+    }
+
+
+def isolate_backend(prefix: str = 'camillamix-bench-') -> str:
+    """Keep backend side effects (logs, audit, autosave) out of the source tree.
+
+    Must run before `backend.server` is imported, since it reads its
+    settings from the environment at import time. Returns the scratch
+    directory used.
+    """
+    scratch = tempfile.mkdtemp(prefix=prefix)
+    os.environ.setdefault('AUDIT_LOG_DIR', os.path.join(scratch, 'audit'))
+    os.environ.setdefault('AUTOSAVE_ENABLED', '0')
+    from backend.logger import setup_logging
+    # later setup_logging() calls from create_app() are no-ops
+    setup_logging(log_path=os.path.join(scratch, 'actions.log'), console_enabled=False)
+    return scratch
+
+
+def load_baselines(path: str = BASELINES_PATH) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(suite: str, scenario: str, metrics: dict, path: str = BASELINES_PATH):
+    baselines = load_baselines(path)
+    baselines.setdefault(suite, {})[scenario] = metrics
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def check_baseline(suite: str, scenario: str, metrics: dict, tolerance: float = DEFAULT_TOLERANCE,
+                   path: str = BASELINES_PATH) -> list:
+    """Compare lower-is-better metrics against the stored baseline.
+
+    Returns a list of human-readable regressions (empty when within
+    tolerance or when no baseline is stored for the scenario).
+    """
+    baseline = load_baselines(path).get(suite, {}).get(scenario)
+    if not baseline:
+        return []
+    regressions = []
+    for key, expected in baseline.items():
+        actual = metrics.get(key)
+        if not isinstance(expected, (int, float)) or not isinstance(actual, (int, float)):
+            continue
+        if actual > expected * (1.0 + tolerance) + ABSOLUTE_SLACK:
+            regressions.append(f'{scenario}.{key}: {actual} > baseline {expected} (+{tolerance:.0%})')
+    return regressions
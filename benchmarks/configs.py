@@ -0,0 +1,60 @@
+"""Synthetic CamillaDSP configs and mixer states for benchmarks and load tests."""
+
+
+def make_camilla_config(channels: int = 8, inputs: int = 2, filters_per_channel: int = 0,
+                        samplerate: int = 48000) -> dict:
+    """Build a CamillaDSP config with an `inputs` x `channels` mixer.
+
+    Every output channel gets the reference tone controls (`Gain_N`,
+    `Bass_N`, `Mid_N`, `Treble_N`) plus `filters_per_channel` extra peaking
+    filters, which is the knob used to grow the config size.
+    """
+    filters = {}
+    pipeline = []
+    mixer_name = f'{inputs}x{channels}'
+    mapping = []
+    for ch in range(channels):
+        mapping.append({
+            'dest': ch,
+            'mute': False,
+            'sources': [{'channel': src, 'gain': 0.0, 'inverted': False, 'mute': False}
+                        for src in range(inputs)],
+        })
+        names = [f'Gain_{ch}', f'Bass_{ch}', f'Mid_{ch}', f'Treble_{ch}']
+        filters[f'Gain_{ch}'] = {'type': 'Gain', 'parameters': {'gain': 0.0, 'inverted': False}}
+        filters[f'Bass_{ch}'] = {'type': 'Biquad', 'parameters': {'type': 'Lowshelf', 'freq': 120.0, 'q': 0.7, 'gain': 0.0}}
+        filters[f'Mid_{ch}'] = {'type': 'Biquad', 'parameters': {'type': 'Peaking', 'freq': 1000.0, 'q': 0.9, 'gain': 0.0}}
+        filters[f'Treble_{ch}'] = {'type': 'Biquad', 'parameters': {'type': 'Highshelf', 'freq': 8000.0, 'q': 0.7, 'gain': 0.0}}
+        for k in range(filters_per_channel):
+            name = f'peq_{ch}_{k}'
+            filters[name] = {'type': 'Biquad', 'parameters': {'type': 'Peaking', 'freq': 40.0 * (k + 1), 'q': 2.0, 'gain': 0.0}}
+            names.append(name)
+        pipeline.append({'type': 'Filter', 'channels': [ch], 'names': names})
+    pipeline.insert(0, {'type': 'Mixer', 'name': mixer_name})
+    return {
+        'title': f'synthetic {inputs}x{channels}',
+        'devices': {
+            'samplerate': samplerate,
+            'chunksize': 1024,
+            'capture': {'type': 'Stdin', 'channels': inputs, 'format': 'S32LE'},
+            'playback': {'type': 'Stdout', 'channels': channels, 'format': 'S32LE'},
+        },
+        'filters': filters,
+        'mixers': {mixer_name: {'channels': {'in': inputs, 'out': channels}, 'mapping': mapping}},
+        'pipeline': pipeline,
+    }
+
+
+def make_mixer_state(channels: int = 8) -> dict:
+    """Build a MixerState-shaped dict with varied values."""
+    return {
+        'master': {'index': 'master', 'level_db': -6.0, 'mute': False, 'solo': False,
+                   'eq': {'gain': 0.0, 'low': 0.0, 'mid': 0.0, 'high': 0.0}},
+        'channels': [{
+            'index': i,
+            'level_db': -float(i % 40),
+            'mute': i % 7 == 0,
+            'solo': False,
+            'eq': {'gain': 0.5 * (i % 5), 'low': -1.0, 'mid': 0.0, 'high': 1.5},
+        } for i in range(channels)],
+    }
@@ -0,0 +1,302 @@
+"""Stand-in CamillaDSP WebSocket server for load tests and benchmarks.
+
+Speaks the JSON command protocol used by pycamilladsp: a request is either a
+bare command name (`"GetVolume"`) or a single-key object carrying the
+argument (`{"SetVolume": -10.0}`), and every reply is wrapped as
+`{"<Command>": {"result": "Ok" | "Error", "value": ...}}`. Only the commands
+the adapter uses are implemented: version/state, main and fader volume and
+mute, the active config (JSON), and playback/capture signal levels.
+
+Each reply is delayed by `latency` seconds, plus `config_latency_per_kb` per
+KiB of JSON for config transfers, to model a remote DSP and the cost of
+parsing a large config. Config size is controlled with the generator
+arguments in `configs.make_camilla_config`.
+
+Run standalone with::
+
+    python -m benchmarks.fake_camilladsp --port 1234 --channels 32 --latency-ms 1
+
+then start the backend with `CAMILLA_HOST`/`CAMILLA_PORT` pointing at it.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web, WSMsgType
+
+from .configs import make_camilla_config
+
+logger = logging.getLogger('fake_camilladsp')
+
+VERSION = '3.0.0'
+NUM_FADERS = 5
+
+
+class CommandError(Exception):
+    """Raised by a command handler to produce a `result: Error` reply."""
+
+
+class FakeCamillaDSP:
+    """In-memory CamillaDSP model served over a WebSocket.
+
+    Every received command is counted in `commands` and the arrival time of
+    config uploads is kept in `set_config_times`, so benchmarks can measure
+    when a change actually reached the DSP side.
+    """
+
+    def __init__(self, config: Optional[dict] = None, latency: float = 0.0,
+                 config_latency_per_kb: float = 0.0):
+        self.config = config if config is not None else make_camilla_config()
+        self.latency = latency
+        self.config_latency_per_kb = config_latency_per_kb
+        self.state = 'Running'
+        self.faders = [[0.0, False] for _ in range(NUM_FADERS)]
+        self.commands = Counter()
+        self.set_config_times = []
+        self.port: Optional[int] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._handlers = {
+            'GetVersion': lambda arg: VERSION,
+            'GetState': lambda arg: self.state,
+            'GetVolume': lambda arg: self.faders[0][0],
+            'SetVolume': self._set_main_volume,
+            'GetMute': lambda arg: self.faders[0][1],
+            'SetMute': self._set_main_mute,
+            'GetFaders': lambda arg: [{'volume': v, 'mute': m} for v, m in self.faders],
+            'GetFaderVolume': lambda arg: [self._fader(arg), self.faders[self._fader(arg)][0]],
+            'SetFaderVolume': self._set_fader_volume,
+            'SetFaderExternalVolume': self._set_fader_volume,
+            'AdjustFaderVolume': self._adjust_fader_volume,
+            'GetFaderMute': lambda arg: [self._fader(arg), self.faders[self._fader(arg)][1]],
+            'SetFaderMute': self._set_fader_mute,
+            'GetConfigJson': lambda arg: json.dumps(self.config),
+            'SetConfigJson': self._set_config_json,
+            'GetConfigTitle': lambda arg: self.config.get('title'),
+            'GetPlaybackSignalRms': lambda arg: self._levels('playback', rms=True),
+            'GetPlaybackSignalPeak': lambda arg: self._levels('playback', rms=False),
+            'GetCaptureSignalRms': lambda arg: self._levels('capture', rms=True),
+            'GetCaptureSignalPeak': lambda arg: self._levels('capture', rms=False),
+            'GetSignalLevels': self._signal_levels,
+        }
+
+    # -- command handlers -------------------------------------------------
+
+    def _fader(self, arg) -> int:
+        index = int(arg)
+        if not 0 <= index < NUM_FADERS:
+            raise CommandError(f'Invalid fader index: {index}')
+        return index
+
+    def _set_main_volume(self, arg):
+        self.faders[0][0] = float(arg)
+
+    def _set_main_mute(self, arg):
+        self.faders[0][1] = bool(arg)
+
+    def _set_fader_volume(self, arg):
+        index, value = arg
+        self.faders[self._fader(index)][0] = float(value)
+
+    def _adjust_fader_volume(self, arg):
+        index, delta = arg
+        fader = self.faders[self._fader(index)]
+        fader[0] = max(-150.0, min(50.0, fader[0] + float(delta)))
+        return [index, fader[0]]
+
+    def _set_fader_mute(self, arg):
+        index, value = arg
+        self.faders[self._fader(index)][1] = bool(value)
+
+    def _set_config_json(self, arg):
+        try:
+            config = json.loads(arg)
+        except (TypeError, ValueError) as e:
+            raise CommandError(f'Invalid config: {e}')
+        if not isinstance(config, dict) or 'devices' not in config:
+            raise CommandError('Invalid config: missing devices')
+        self.config = config
+        self.set_config_times.append(time.perf_counter())
+
+    def _channel_gains(self, side: str) -> list:
+        devices = self.config.get('devices', {})
+        count = int(devices.get(side, {}).get('channels', 0))
+        gains = [0.0] * count
+        if side == 'playback':
+            for mixer in (self.config.get('mixers') or {}).values():
+                for entry in mixer.get('mapping', []):
+                    dest = entry.get('dest')
+                    if not isinstance(dest, int) or not 0 <= dest < count:
+                        continue
+                    sources = entry.get('sources') or [{}]
+                    if entry.get('mute') or all(s.get('mute') for s in sources):
+                        gains[dest] = None
+                    else:
+                        gains[dest] = float(sources[0].get('gain', 0.0))
+        return gains
+
+    def _levels(self, side: str, rms: bool) -> list:
+        volume, muted = self.faders[0]
+        base = -20.0 if rms else -14.0
+        out = []
+        for gain in self._channel_gains(side):
+            if muted or gain is None:
+                out.append(-1000.0)
+            else:
+                level = base + gain + (volume if side == 'playback' else 0.0) + random.uniform(-3.0, 3.0)
+                out.append(round(min(0.0, level), 2))
+        return out
+
+    def _signal_levels(self, arg):
+        return {
+            'playback_rms': self._levels('playback', True),
+            'playback_peak': self._levels('playback', False),
+            'capture_rms': self._levels('capture', True),
+            'capture_peak': self._levels('capture', False),
+        }
+
+    def handle_command(self, command: str, arg=None) -> dict:
+        """Run one command and return its `{"result", "value"}` reply body."""
+        self.commands[command] += 1
+        handler = self._handlers.get(command)
+        if handler is None:
+            return {'result': 'Error', 'value': f'Unknown command: {command}'}
+        try:
+            value = handler(arg)
+        except CommandError as e:
+            return {'result': 'Error', 'value': str(e)}
+        except (TypeError, ValueError) as e:
+            return {'result': 'Error', 'value': f'Invalid argument: {e}'}
+        reply = {'result': 'Ok'}
+        if value is not None:
+            reply['value'] = value
+        return reply
+
+    def _delay_for(self, command: str, arg, reply: dict) -> float:
+        delay = self.latency
+        if self.config_latency_per_kb:
+            if command == 'SetConfigJson' and isinstance(arg, str):
+                delay += self.config_latency_per_kb * len(arg) / 1024.0
+            elif command == 'GetConfigJson' and isinstance(reply.get('value'), str):
+                delay += self.config_latency_per_kb * len(reply['value']) / 1024.0
+        return delay
+
+    # -- transport --------------------------------------------------------
+
+    async def websocket_handler(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                query = json.loads(msg.data)
+            except ValueError:
+                await ws.send_str(json.dumps({'Invalid': {'result': 'Error', 'value': 'Invalid JSON'}}))
+                continue
+            if isinstance(query, str):
+                command, arg = query, None
+            elif isinstance(query, dict) and len(query) == 1:
+                command, arg = next(iter(query.items()))
+            else:
+                await ws.send_str(json.dumps({'Invalid': {'result': 'Error', 'value': 'Invalid command'}}))
+                continue
+            reply = self.handle_command(command, arg)
+            delay = self._delay_for(command, arg, reply)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await ws.send_str(json.dumps({command: reply}))
+        return ws
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/', self.websocket_handler)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        """Start serving on the current loop; returns the bound port."""
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info('Fake CamillaDSP listening on %s:%s', host, self.port)
+        return self.port
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        """Serve from a dedicated thread and event loop.
+
+        pycamilladsp is a blocking client, so when the adapter runs inside
+        the backend's event loop the fake server must not share that loop.
+        """
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start(host, port))
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='fake-camilladsp', daemon=True)
+        self._thread.start()
+        if not started.wait(5.0):
+            raise RuntimeError('fake CamillaDSP did not start')
+        return self.port
+
+    def stop_thread(self):
+        if self._loop and self._thread:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5.0)
+            self._thread = None
+            self._loop = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a fake CamillaDSP WebSocket server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1234)
+    parser.add_argument('--channels', type=int, default=8, help='mixer output channels')
+    parser.add_argument('--inputs', type=int, default=2, help='mixer input channels')
+    parser.add_argument('--filters-per-channel', type=int, default=0,
+                        help='extra peaking filters per channel (grows the config)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='delay added to every reply')
+    parser.add_argument('--config-latency-ms-per-kb', type=float, default=0.0,
+                        help='extra delay per KiB of config JSON transferred')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    config = make_camilla_config(args.channels, args.inputs, args.filters_per_channel)
+    fake = FakeCamillaDSP(config, latency=args.latency_ms / 1000.0,
+                          config_latency_per_kb=args.config_latency_ms_per_kb / 1000.0)
+    logger.info('Config size: %.1f KiB', len(json.dumps(config)) / 1024.0)
+
+    async def serve():
+        await fake.start(args.host, args.port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await fake.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
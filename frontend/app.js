@@ -1,30 +1,53 @@
 import { connect, camillaStatus } from './socket.js';
-import { initUI, initUIHandlers, renderMixer, applyState, updateLevels, applyAutosaveSettings, updateStatusBar } from './ui.js';
+import { initUI, initUIHandlers, renderMixer, applyState, applyStatePatch, noteAck, resyncState, forgetRevisions, applyAutosaveSettings, updateStatusBar, currentWindow, needsRender, updatePresetJob, updateSpectrum } from './ui.js';
+import { writeLevels } from './meters.js';
 
 function init() {
   initUI();
   initUIHandlers();
 
   connect({
+    getWindow: currentWindow,
     onOpen: () => {
       updateStatusBar(true, camillaStatus.connected);
     },
     onClose: () => {
+      forgetRevisions();
       updateStatusBar(false, false);
     },
     onState: (payload) => {
-      const mixerEl = document.getElementById('mixer');
-      if (!mixerEl || mixerEl.children.length === 0) {
+      // rebuild strips only when the page or channel count changed
+      if (needsRender(payload)) {
         renderMixer(payload);
       }
       applyState(payload);
     },
-    onLevels: (payload) => {
-      updateLevels(payload.channels);
+    onStatePatch: (payload) => {
+      applyStatePatch(payload);
+    },
+    onAck: (key, rev) => {
+      noteAck(key, rev);
+    },
+    onRejected: () => {
+      resyncState();
+    },
+    onLevels: (frame) => {
+      // stored only, drawn on the next animation frame
+      writeLevels(frame.start, frame.levels);
+    },
+    onSpectrum: (frame) => {
+      updateSpectrum(frame);
+    },
+    onAnalyzerInfo: (payload) => {
+      // keep the simulated spectrum when the server has no audio tap
+      if (!payload.available) console.info('Spectrum analyzer unavailable:', payload.reason);
     },
     onAutosaveSettings: (payload) => {
       applyAutosaveSettings(payload);
     },
+    onPresetJob: (payload) => {
+      updatePresetJob(payload);
+    },
     onCamillaStatus: (payload) => {
       updateStatusBar(true, payload.connected);
     }
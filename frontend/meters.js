@@ -0,0 +1,133 @@
+// Meter frame scheduler.
+// Incoming `levels` frames only copy into a Float32Array; a single
+// requestAnimationFrame pass then renders every visible meter with a
+// transform (no layout), and runs the other per-frame renderers (spectrum).
+// Nothing is scheduled while the tab is hidden.
+
+export const MIN_DB = -60;
+export const MAX_DB = 12;
+const MASTER_SLOT = 0;
+// meters are drawn in 0.5% steps: smaller changes are not worth a style write
+const SCALE_STEPS = 200;
+
+let store = new Float32Array(1).fill(MIN_DB);
+let dirty = false;
+let framePending = false;
+const meters = new Map();   // slot -> {el, visible, shown}
+const frameCallbacks = new Set();
+
+const observer = typeof IntersectionObserver !== 'undefined'
+  ? new IntersectionObserver(entries => {
+      for (const entry of entries) {
+        const meter = entry.target._meter;
+        if (!meter) continue;
+        meter.visible = entry.isIntersecting;
+        // redraw on reappearance, the value may have changed meanwhile
+        if (meter.visible) { meter.shown = -1; dirty = true; }
+      }
+      scheduleFrame();
+    })
+  : null;
+
+function slotOf(channel) {
+  return channel === 'master' ? MASTER_SLOT : channel + 1;
+}
+
+function ensureCapacity(slot) {
+  if (slot < store.length) return;
+  const grown = new Float32Array(Math.max(slot + 1, store.length * 2)).fill(MIN_DB);
+  grown.set(store);
+  store = grown;
+}
+
+// `levels` as posted by the socket worker: master first, then channels
+// start, start + 1, ...; NaN for unknown values
+export function writeLevels(start, levels) {
+  if (levels.length > 1) ensureCapacity(start + levels.length - 1);
+  if (!Number.isNaN(levels[0])) store[MASTER_SLOT] = levels[0];
+  for (let i = 1; i < levels.length; i++) {
+    if (!Number.isNaN(levels[i])) store[start + i] = levels[i];
+  }
+  dirty = true;
+  scheduleFrame();
+}
+
+export function getLevel(channel) {
+  const slot = slotOf(channel);
+  return slot < store.length ? store[slot] : MIN_DB;
+}
+
+// `el` is the `.level` bar of a strip (or of the master section)
+export function registerMeter(channel, el) {
+  const slot = slotOf(channel);
+  ensureCapacity(slot);
+  unregisterMeter(channel);
+  const meter = {el, visible: !observer, shown: -1};
+  el._meter = meter;
+  meters.set(slot, meter);
+  if (observer) observer.observe(el);
+  dirty = true;
+  scheduleFrame();
+}
+
+export function unregisterMeter(channel) {
+  const slot = slotOf(channel);
+  const meter = meters.get(slot);
+  if (!meter) return;
+  if (observer) observer.unobserve(meter.el);
+  meter.el._meter = null;
+  meters.delete(slot);
+}
+
+// drops the strip meters (before a re-render), keeps the master one
+export function clearChannelMeters() {
+  for (const slot of Array.from(meters.keys())) {
+    if (slot !== MASTER_SLOT) unregisterMeter(slot - 1);
+  }
+}
+
+// `fn(now)` runs once per animation frame until the returned function is called
+export function onFrame(fn) {
+  frameCallbacks.add(fn);
+  scheduleFrame();
+  return () => frameCallbacks.delete(fn);
+}
+
+function renderMeters() {
+  for (const [slot, meter] of meters) {
+    if (!meter.visible) continue;
+    const v = Math.max(MIN_DB, Math.min(MAX_DB, store[slot]));
+    const scaled = Math.round(((v - MIN_DB) / (MAX_DB - MIN_DB)) * SCALE_STEPS);
+    if (scaled === meter.shown) continue;
+    meter.shown = scaled;
+    meter.el.style.transform = 'scaleY(' + (scaled / SCALE_STEPS) + ')';
+  }
+}
+
+function frame(now) {
+  framePending = false;
+  if (document.hidden) return;
+  if (dirty) {
+    dirty = false;
+    renderMeters();
+  }
+  for (const fn of frameCallbacks) {
+    try { fn(now); } catch (e) { console.error(e); }
+  }
+  if (frameCallbacks.size) scheduleFrame();
+}
+
+function scheduleFrame() {
+  if (framePending || document.hidden) return;
+  if (!dirty && !frameCallbacks.size) return;
+  framePending = true;
+  requestAnimationFrame(frame);
+}
+
+document.addEventListener('visibilitychange', () => {
+  if (!document.hidden) {
+    for (const meter of meters.values()) meter.shown = -1;
+    dirty = true;
+    scheduleFrame();
+  }
+});
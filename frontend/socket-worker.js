@@ -0,0 +1,406 @@
+// WebSocket connection and message decoding, off the main thread.
+//
+// Runs as a SharedWorker when the browser has them (one server connection
+// for every tab), otherwise as a dedicated Worker per tab. The worker parses
+// every server message, keeps the mixer model of the channels the tabs show
+// and posts each tab only what concerns its channel window: states and
+// patches restricted to the window, meters and spectrum bands as
+// transferable Float32Arrays. When the connection drops it reconnects with
+// a jittered backoff and resumes from the last revision it saw
+// (`?resume=<instance>:<rev>`): the server answers with the missed changes
+// only. Classic script on purpose: module SharedWorkers are not available
+// everywhere.
+//
+// Tab -> worker: {type: 'hello', window}, {type: 'send', message}, {type: 'bye'}
+// Worker -> tab: {kind: 'open'}, {kind: 'close'}, {kind: 'message', msg},
+//                {kind: 'state', state}, {kind: 'patch', patch},
+//                {kind: 'levels', start, levels, ts}, {kind: 'spectrum', bands, ts}
+
+const WS_URL = (location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws';
+// binary spectrum frames: kind u8, version u8, band count u16, ts f64, one byte per band
+const FRAME_KIND_SPECTRUM = 1;
+const FRAME_HEADER_BYTES = 12;
+const CONTROL_TYPES = ['set_channel_level', 'set_channel_mute', 'set_channel_solo', 'set_channel_eq'];
+// sent by the server once to a new connection; replayed to tabs that join later
+const REPLAYED_TYPES = ['autosave_settings', 'camilla_status'];
+// reconnect delay: random up to min(max, base * 2^attempt) ("full jitter"), so
+// clients dropped together by a Wi-Fi blip do not come back in lockstep
+const RECONNECT_BASE_MS = 250;
+const RECONNECT_MAX_MS = 10000;
+
+let ws = null;
+let open = false;
+let spectrumScale = {floor_db: -100, step_db: 0.5};
+const clients = new Set();   // {port, window, analyzer}
+const opOwners = new Map();  // op -> client that sent it
+const replay = new Map();    // message type -> last message
+let serverWindow = null;     // channel window of the server connection
+let analyzerEnabled = false;
+let analyzerInfo = null;
+let reconnectTimer = null;
+let reconnectAttempt = 0;
+let resuming = false;        // connected with a resume token, waiting for the catch-up patch
+
+// Mixer model for the channels of the server window
+const model = {
+  master: null,
+  channels: new Map(),  // index -> channel
+  count: 0,
+  anySolo: false,
+  rev: 0,
+  baseRev: 0,
+  revs: new Map(),      // 'master' or index -> {field: rev}
+  start: 0,
+  stop: 0,
+  window: null,         // server window the model was built for
+  instance: null,       // server instance the revisions belong to
+};
+
+function post(client, data, transfer) {
+  try {
+    client.port.postMessage(data, transfer || []);
+  } catch (e) {
+    clients.delete(client);
+  }
+}
+
+function postAll(data) {
+  clients.forEach((client) => post(client, data));
+}
+
+function bounds(win) {
+  const start = win ? win.start : 0;
+  const stop = win ? Math.min(model.count, start + win.count) : model.count;
+  return [start, Math.max(start, stop)];
+}
+
+// union of the windows shown by the tabs, which the server connection follows
+function unionWindow() {
+  let start = Infinity;
+  let stop = -Infinity;
+  for (const client of clients) {
+    if (!client.window) return null;
+    start = Math.min(start, client.window.start);
+    stop = Math.max(stop, client.window.start + client.window.count);
+  }
+  return start === Infinity ? null : {start, count: stop - start};
+}
+
+function sameWindow(a, b) {
+  return (!a && !b) || (a && b && a.start === b.start && a.count === b.count);
+}
+
+function transmit(message) {
+  if (ws && open) ws.send(JSON.stringify(message));
+}
+
+function updateServerWindow() {
+  const win = unionWindow();
+  if (sameWindow(win, serverWindow)) return;
+  serverWindow = win;
+  // the server answers with a state for the new window
+  if (win) transmit({type: 'subscribe_channels', payload: win});
+}
+
+function updateAnalyzer() {
+  const enabled = Array.from(clients).some((client) => client.analyzer);
+  if (enabled === analyzerEnabled) return;
+  analyzerEnabled = enabled;
+  transmit({type: 'subscribe_analyzer', payload: {enabled}});
+}
+
+function covers(client) {
+  if (!model.master) return false;
+  const [start, stop] = bounds(client.window);
+  return start >= model.start && stop <= model.stop;
+}
+
+function revsOf(channel) {
+  let revs = model.revs.get(channel);
+  if (!revs) {
+    revs = {};
+    model.revs.set(channel, revs);
+  }
+  return revs;
+}
+
+// same shape as a windowed state from the server
+function windowState(client) {
+  const [start, stop] = bounds(client.window);
+  const channels = [];
+  const revs = {};
+  const masterRevs = model.revs.get('master');
+  if (masterRevs) revs.master = masterRevs;
+  for (let i = start; i < stop; i++) {
+    channels.push(model.channels.get(i));
+    const r = model.revs.get(i);
+    if (r) revs[i] = r;
+  }
+  return {
+    master: model.master,
+    channels,
+    channel_count: model.count,
+    window: {start, count: stop - start},
+    any_solo: model.anySolo,
+    rev: model.rev,
+    base_rev: model.baseRev,
+    revs,
+  };
+}
+
+function onState(state) {
+  const channels = state.channels || [];
+  const start = state.window ? state.window.start : 0;
+  // a state replaces the whole model: it covers the server window
+  model.master = state.master;
+  model.count = state.channel_count !== undefined ? state.channel_count : channels.length;
+  model.anySolo = state.any_solo !== undefined ? state.any_solo : channels.some((c) => c.solo);
+  model.rev = state.rev;
+  model.baseRev = state.base_rev;
+  model.instance = state.instance;
+  model.window = serverWindow;
+  model.channels.clear();
+  model.start = start;
+  model.stop = start + channels.length;
+  model.revs.clear();
+  channels.forEach((ch, pos) => {
+    model.channels.set(ch.index !== undefined ? ch.index : start + pos, ch);
+  });
+  for (const [channel, revs] of Object.entries(state.revs || {})) {
+    model.revs.set(channel === 'master' ? 'master' : Number(channel), Object.assign({}, revs));
+  }
+  clients.forEach((client) => {
+    if (covers(client)) post(client, {kind: 'state', state: windowState(client)});
+  });
+}
+
+function onStatePatch(patch) {
+  for (const change of patch.changes || []) {
+    const target = change.channel === 'master' ? model.master : model.channels.get(change.channel);
+    if (!target) continue;
+    if (change.field.startsWith('eq.')) {
+      if (target.eq) target.eq[change.field.slice(3)] = change.value;
+    } else {
+      target[change.field] = change.value;
+    }
+    revsOf(change.channel)[change.field] = change.rev;
+  }
+  model.rev = patch.rev;
+  if (patch.any_solo !== undefined) model.anySolo = patch.any_solo;
+  if (resuming) {
+    // catch-up after a reconnect: tabs dropped their revisions, show them the whole window again
+    resuming = false;
+    clients.forEach((client) => {
+      if (covers(client)) post(client, {kind: 'state', state: windowState(client)});
+    });
+    return;
+  }
+  clients.forEach((client) => {
+    const [start, stop] = bounds(client.window);
+    const changes = (patch.changes || []).filter((c) =>
+      c.channel === 'master' || (c.channel >= start && c.channel < stop));
+    if (changes.length || patch.any_solo !== undefined) {
+      post(client, {kind: 'patch', patch: {rev: patch.rev, any_solo: patch.any_solo, changes}});
+    }
+  });
+}
+
+// levels[0] is master, levels[k + 1] is channel start + k; NaN where unknown
+function onLevels(payload) {
+  clients.forEach((client) => {
+    const [start, stop] = bounds(client.window);
+    const levels = new Float32Array(1 + stop - start).fill(NaN);
+    for (const l of payload.channels || []) {
+      if (typeof l.level_db !== 'number') continue;
+      if (l.channel === 'master') levels[0] = l.level_db;
+      else if (l.channel >= start && l.channel < stop) levels[l.channel - start + 1] = l.level_db;
+    }
+    post(client, {kind: 'levels', start, levels, ts: payload.ts}, [levels.buffer]);
+  });
+}
+
+function onSpectrum(buf) {
+  if (buf.byteLength < FRAME_HEADER_BYTES) return;
+  const view = new DataView(buf);
+  if (view.getUint8(0) !== FRAME_KIND_SPECTRUM) return;
+  const count = view.getUint16(2, true);
+  const bytes = new Uint8Array(buf, FRAME_HEADER_BYTES, Math.min(count, buf.byteLength - FRAME_HEADER_BYTES));
+  const bands = new Float32Array(bytes.length);
+  for (let i = 0; i < bytes.length; i++) bands[i] = spectrumScale.floor_db + bytes[i] * spectrumScale.step_db;
+  const ts = view.getFloat64(4, true);
+  clients.forEach((client) => {
+    if (!client.analyzer) return;
+    const copy = bands.slice();
+    post(client, {kind: 'spectrum', bands: copy, ts}, [copy.buffer]);
+  });
+}
+
+// replies to a change go to the tab that made it
+function route(op, msg) {
+  const owner = opOwners.get(op);
+  opOwners.delete(op);
+  if (owner) post(owner, {kind: 'message', msg});
+  else postAll({kind: 'message', msg});
+}
+
+function onBatchAck(payload) {
+  const byOwner = new Map();
+  const entry = (op) => {
+    const owner = opOwners.get(op) || null;
+    opOwners.delete(op);
+    if (!byOwner.has(owner)) byOwner.set(owner, {acks: [], errors: []});
+    return byOwner.get(owner);
+  };
+  payload.acks.forEach((a) => entry(a.op).acks.push(a));
+  payload.errors.forEach((e) => entry(e.op).errors.push(e));
+  byOwner.forEach((part, owner) => {
+    const msg = {type: 'batch_ack', payload: part};
+    if (owner) post(owner, {kind: 'message', msg});
+    else postAll({kind: 'message', msg});
+  });
+}
+
+function onMessage(ev) {
+  if (ev.data instanceof ArrayBuffer) {
+    onSpectrum(ev.data);
+    return;
+  }
+  let msg;
+  try {
+    msg = JSON.parse(ev.data);
+  } catch (e) {
+    return;
+  }
+  if (msg.type === 'state') {
+    resuming = false;
+    onState(msg.payload);
+  }
+  else if (msg.type === 'state_patch') onStatePatch(msg.payload);
+  else if (msg.type === 'levels') onLevels(msg.payload);
+  else if (msg.type === 'ack') route(msg.payload.op, msg);
+  else if (msg.type === 'batch_ack') onBatchAck(msg.payload);
+  else if (msg.type === 'error' && msg.op) route(msg.op, msg);
+  else {
+    if (msg.type === 'analyzer_info') {
+      analyzerInfo = msg;
+      if (msg.payload.available) spectrumScale = msg.payload;
+    }
+    if (REPLAYED_TYPES.includes(msg.type)) replay.set(msg.type, msg);
+    postAll({kind: 'message', msg});
+  }
+}
+
+// `<instance>:<rev>` when the model can be caught up with the changes since rev
+function resumeToken() {
+  if (!model.master || !model.instance || !sameWindow(model.window, serverWindow)) return null;
+  return model.instance + ':' + model.rev;
+}
+
+function connect() {
+  clearTimeout(reconnectTimer);
+  reconnectTimer = null;
+  serverWindow = unionWindow();
+  const win = serverWindow;
+  const params = new URLSearchParams();
+  if (win) {
+    params.set('start', win.start);
+    params.set('count', win.count);
+  }
+  const token = resumeToken();
+  if (token) params.set('resume', token);
+  resuming = !!token;
+  const query = params.toString();
+  ws = new WebSocket(query ? `${WS_URL}?${query}` : WS_URL);
+  ws.binaryType = 'arraybuffer';
+  ws.addEventListener('open', () => {
+    open = true;
+    reconnectAttempt = 0;
+    analyzerEnabled = false;
+    postAll({kind: 'open'});
+    // tabs that joined while connecting
+    updateServerWindow();
+    updateAnalyzer();
+  });
+  ws.addEventListener('message', onMessage);
+  ws.addEventListener('close', () => {
+    ws = null;
+    open = false;
+    opOwners.clear();
+    replay.clear();
+    analyzerInfo = null;
+    // the model is kept: it is what the next connection resumes from
+    postAll({kind: 'close'});
+    scheduleReconnect();
+  });
+}
+
+function scheduleReconnect() {
+  if (reconnectTimer || !clients.size) return;
+  const ceiling = Math.min(RECONNECT_MAX_MS, RECONNECT_BASE_MS * 2 ** reconnectAttempt);
+  reconnectAttempt++;
+  reconnectTimer = setTimeout(connect, Math.random() * ceiling);
+}
+
+// back on the network: no point waiting for the timer
+self.addEventListener('online', () => {
+  if (reconnectTimer) connect();
+});
+
+function onSend(client, message) {
+  if (!message || !open) return;
+  if (message.type === 'subscribe_channels') {
+    client.window = message.payload;
+    if (covers(client)) post(client, {kind: 'state', state: windowState(client)});
+    updateServerWindow();
+    return;
+  }
+  if (message.type === 'subscribe_analyzer') {
+    client.analyzer = !!(message.payload && message.payload.enabled !== false);
+    const enabled = analyzerEnabled;
+    updateAnalyzer();
+    // already running for another tab: the server will not answer again
+    if (enabled === analyzerEnabled && analyzerInfo) post(client, {kind: 'message', msg: analyzerInfo});
+    return;
+  }
+  if (CONTROL_TYPES.includes(message.type) && message.op) {
+    opOwners.set(message.op, client);
+  } else if (message.type === 'batch') {
+    message.payload.ops.forEach((item) => {
+      if (item.op) opOwners.set(item.op, client);
+    });
+  }
+  transmit(message);
+}
+
+function attach(port) {
+  const client = {port, window: null, analyzer: false};
+  port.onmessage = (ev) => {
+    const data = ev.data || {};
+    if (data.type === 'hello') {
+      client.window = data.window || null;
+      clients.add(client);
+      if (!ws) {
+        // first tab, or a tab (re)loaded while waiting to reconnect
+        connect();
+        return;
+      }
+      if (!open) return;
+      post(client, {kind: 'open'});
+      replay.forEach((msg) => post(client, {kind: 'message', msg}));
+      if (covers(client)) post(client, {kind: 'state', state: windowState(client)});
+      updateServerWindow();
+    } else if (data.type === 'send') {
+      onSend(client, data.message);
+    } else if (data.type === 'bye') {
+      clients.delete(client);
+      updateServerWindow();
+      updateAnalyzer();
+    }
+  };
+}
+
+if ('onconnect' in self) {
+  self.onconnect = (ev) => attach(ev.ports[0]);
+} else {
+  attach(self);
+}
@@ -1,57 +1,202 @@
-const WS_URL = (location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws';
-let ws;
-let _sendTimer = null;
-let _sendPending = null;
-const SEND_THROTTLE_MS = 80;
+// The WebSocket lives in socket-worker.js, which parses and decodes every
+// server message off the main thread (one connection shared by all tabs when
+// SharedWorker is available). This module talks to it through a port.
+let port = null;
+let connected = false;
+
+// Control changes carry an operation id that the server echoes in an `ack`
+// with the field revision. Until then the field is pending: the local value
+// wins over broadcasts, so the UI does not jump back while the change is in
+// flight.
+const CONTROL_FIELDS = {
+  set_channel_level: () => 'level_db',
+  set_channel_mute: () => 'mute',
+  set_channel_solo: () => 'solo',
+  set_channel_eq: (p) => 'eq.' + p.band,
+};
+const PENDING_TIMEOUT_MS = 2000;
+const opPrefix = Math.random().toString(36).slice(2, 8);
+let opCounter = 0;
+const pendingOps = new Map();     // op -> field key
+const pendingFields = new Map();  // field key -> {op, at}
+
+export function fieldKey(channel, field) {
+  return channel + ':' + field;
+}
+
+export function isPending(key) {
+  const pending = pendingFields.get(key);
+  if (!pending) return false;
+  if (performance.now() - pending.at > PENDING_TIMEOUT_MS) {
+    // ack lost or never coming: let broadcasts through again
+    pendingFields.delete(key);
+    pendingOps.delete(pending.op);
+    return false;
+  }
+  return true;
+}
+
+function settle(op) {
+  const key = pendingOps.get(op);
+  pendingOps.delete(op);
+  // a later op on the same field keeps it pending
+  if (key !== undefined && pendingFields.get(key)?.op === op) pendingFields.delete(key);
+  return key;
+}
+
+function tagOp(obj) {
+  const op = opPrefix + '-' + (++opCounter);
+  const key = fieldKey(obj.payload.channel, CONTROL_FIELDS[obj.type](obj.payload));
+  const previous = pendingFields.get(key);
+  if (previous) pendingOps.delete(previous.op);
+  pendingFields.set(key, {op, at: performance.now()});
+  pendingOps.set(op, key);
+  return Object.assign({}, obj, {op});
+}
+
+// Control changes are queued per (type, channel, band), the latest value
+// replacing the queued one, and flushed once per animation frame as a single
+// `batch` message, so two faders dragged at once both get through and a
+// spinning knob costs one message per frame.
+const MAX_BATCH_OPS = 512;  // server limit per batch
+const queuedControls = new Map();  // type:channel:band -> tagged message
+let flushScheduled = false;
+
+function queueControl(obj) {
+  const key = obj.type + ':' + obj.payload.channel + ':' + (obj.payload.band ?? '');
+  // re-queued controls move to the end, keeping the order of the changes
+  queuedControls.delete(key);
+  queuedControls.set(key, tagOp(obj));
+  if (!flushScheduled) {
+    flushScheduled = true;
+    // animation frames do not run in background tabs
+    if (document.hidden) setTimeout(flushControls, 16);
+    else requestAnimationFrame(flushControls);
+  }
+}
+
+function flushControls() {
+  flushScheduled = false;
+  if (!queuedControls.size) return;
+  const ops = Array.from(queuedControls.values());
+  queuedControls.clear();
+  if (!connected) return;
+  if (ops.length === 1) {
+    port.postMessage({type: 'send', message: ops[0]});
+    return;
+  }
+  for (let i = 0; i < ops.length; i += MAX_BATCH_OPS) {
+    port.postMessage({type: 'send', message: {type: 'batch', payload: {ops: ops.slice(i, i + MAX_BATCH_OPS)}}});
+  }
+}
+
+// a frame requested just before the tab is hidden would wait until it is shown again
+document.addEventListener('visibilitychange', ()=>{
+  if (document.hidden) flushControls();
+});
 
 export let camillaStatus = {connected: false, ws_connected: false, tcp_connected: false};
 
+function openWorker() {
+  const url = new URL('./socket-worker.js', import.meta.url);
+  // Android browsers have no SharedWorker: one dedicated worker per tab then
+  if (typeof SharedWorker === 'function') {
+    return new SharedWorker(url, {name: 'camillamix-socket'}).port;
+  }
+  return new Worker(url);
+}
+
 export function connect(callbacks) {
-  ws = new WebSocket(WS_URL);
-  ws.addEventListener('open', ()=>{
-    if (callbacks.onOpen) callbacks.onOpen();
-    send({type:'subscribe_levels', payload:{interval_ms:200}})
-  })
-  ws.addEventListener('message', (ev)=>{
+  const acked = ({op, rev})=>{
+    const key = settle(op);
+    if (key !== undefined && callbacks.onAck) callbacks.onAck(key, rev);
+  };
+  const rejected = (op, error)=>{
+    // rejected change: the optimistic value is wrong, fetch the truth
+    const key = op ? settle(op) : undefined;
+    console.error(error);
+    if (key !== undefined && callbacks.onRejected) callbacks.onRejected(key);
+  };
+  const onMessage = (msg)=>{
+    if (msg.type === 'ack') {
+      acked(msg.payload);
+    }
+    else if (msg.type === 'batch_ack') {
+      msg.payload.acks.forEach(acked);
+      msg.payload.errors.forEach((e)=>rejected(e.op, e.error));
+    }
+    else if (msg.type === 'error' && msg.op) {
+      rejected(msg.op, msg.payload);
+    }
+    else if (msg.type === 'autosave_settings') {
+      if (callbacks.onAutosaveSettings) callbacks.onAutosaveSettings(msg.payload);
+    }
+    else if (msg.type === 'analyzer_info') {
+      if (callbacks.onAnalyzerInfo) callbacks.onAnalyzerInfo(msg.payload);
+    }
+    else if (msg.type === 'preset_job') {
+      if (callbacks.onPresetJob) callbacks.onPresetJob(msg.payload);
+    }
+    else if (msg.type === 'camilla_status') {
+      camillaStatus = msg.payload;
+      if (callbacks.onCamillaStatus) callbacks.onCamillaStatus(msg.payload);
+    }
+  };
+
+  port = openWorker();
+  port.onmessage = (ev)=>{
+    const data = ev.data;
     try{
-      const msg = JSON.parse(ev.data);
-      if (msg.type === 'state'){
-        if (callbacks.onState) callbacks.onState(msg.payload);
+      if (data.kind === 'levels') {
+        // Float32Array: master first, then the channels of the window
+        if (callbacks.onLevels) callbacks.onLevels(data);
+      }
+      else if (data.kind === 'spectrum') {
+        if (callbacks.onSpectrum) callbacks.onSpectrum(data);
+      }
+      else if (data.kind === 'patch') {
+        if (callbacks.onStatePatch) callbacks.onStatePatch(data.patch);
       }
-      else if (msg.type === 'levels') {
-        if (callbacks.onLevels) callbacks.onLevels(msg.payload);
+      else if (data.kind === 'state') {
+        if (callbacks.onState) callbacks.onState(data.state);
       }
-      else if (msg.type === 'autosave_settings') {
-        if (callbacks.onAutosaveSettings) callbacks.onAutosaveSettings(msg.payload);
+      else if (data.kind === 'message') {
+        onMessage(data.msg);
       }
-      else if (msg.type === 'camilla_status') {
-        camillaStatus = msg.payload;
-        if (callbacks.onCamillaStatus) callbacks.onCamillaStatus(msg.payload);
+      else if (data.kind === 'open') {
+        connected = true;
+        if (callbacks.onOpen) callbacks.onOpen();
+        send({type:'subscribe_levels', payload:{interval_ms:200}})
+        if (callbacks.onSpectrum) send({type:'subscribe_analyzer', payload:{enabled:true}})
+      }
+      else if (data.kind === 'close') {
+        connected = false;
+        queuedControls.clear();
+        pendingOps.clear();
+        pendingFields.clear();
+        if (callbacks.onClose) callbacks.onClose();
       }
     }catch(e){ console.error(e) }
-  })
-  ws.addEventListener('close', ()=>{
-    if (callbacks.onClose) callbacks.onClose();
-  })
+  };
+  // the worker connects with the channel window of this tab
+  const hello = ()=>port.postMessage({type: 'hello', window: callbacks.getWindow ? callbacks.getWindow() : null});
+  hello();
+  // a shared connection must not keep serving a tab that is gone (or cached for back/forward)
+  window.addEventListener('pagehide', ()=>port.postMessage({type: 'bye'}));
+  window.addEventListener('pageshow', (ev)=>{
+    if (ev.persisted) hello();
+  });
 }
 
 export function send(obj) {
-  if (ws && ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify(obj));
-}
-
-export function sendThrottled(obj){
-  if (!obj) return;
-  if (obj.type === 'set_channel_level'){
-    _sendPending = obj;
-    if (!_sendTimer){
-      _sendTimer = setTimeout(()=>{
-        if (_sendPending && ws && ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify(_sendPending));
-        _sendPending = null; _sendTimer = null;
-      }, SEND_THROTTLE_MS);
-    }
-  } else {
-    send(obj);
+  if (!connected) return;
+  if (CONTROL_FIELDS[obj.type] && obj.payload) {
+    queueControl(obj);
+    return;
   }
+  // queued control changes go out first, e.g. before a save_preset
+  flushControls();
+  port.postMessage({type: 'send', message: obj});
 }
 
 export function maybeSend(vslider, obj){
@@ -60,6 +205,6 @@ export function maybeSend(vslider, obj){
   if (localOnly){
     vslider._pendingSend = obj;
   }else{
-    sendThrottled(obj);
+    send(obj);
   }
 }
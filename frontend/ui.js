@@ -1,17 +1,74 @@
-import { send, sendThrottled, maybeSend, camillaStatus } from './socket.js';
+import { send, maybeSend, camillaStatus, fieldKey, isPending } from './socket.js';
 import { dbg, setDebugEnabled, ensureDebugOverlay, getDebugEnabled, log, setConsoleEnabled, getConsoleEnabled } from './utils.js';
 import { createSpectrumVisualizer } from './visualizer.js';
+import { registerMeter, clearChannelMeters } from './meters.js';
 
 let autosaveEnabled = false;
 let autosaveInterval = 30;
-let masterSpectrum = null;
+let spectrum = null;
 let updateCamillaStatusUI_Callback = null;
 
-const domCache = {
-    masterLevel: null,
-    channels: {}
+// Channel paging: only the strips of the current page are rendered and
+// subscribed to, so large consoles (128+ channels) stay responsive.
+export const CHANNELS_PER_PAGE = parseInt(localStorage.getItem('channelsPerPage') || '16', 10) || 16;
+const paging = {
+    start: 0,
+    channelCount: 0,
+    rendered: ''
 };
 
+export function currentWindow() {
+    return { start: paging.start, count: CHANNELS_PER_PAGE };
+}
+
+function stateKey(state) {
+    return (state.channels || []).map((ch, i) => (ch.index !== undefined ? ch.index : i)).join(',');
+}
+
+// True when the state covers other strips than the ones on screen
+export function needsRender(state) {
+    return stateKey(state) !== paging.rendered;
+}
+
+function goToPage(start) {
+    const last = Math.max(0, paging.channelCount - CHANNELS_PER_PAGE);
+    paging.start = Math.max(0, Math.min(last, start));
+    send({ type: 'subscribe_channels', payload: currentWindow() });
+}
+
+function updatePager() {
+    const pager = document.getElementById('channelPager');
+    if (!pager) return;
+    const total = paging.channelCount;
+    pager.style.display = total > CHANNELS_PER_PAGE ? '' : 'none';
+    const label = pager.querySelector('.pager-label');
+    if (label) {
+        const end = Math.min(total, paging.start + CHANNELS_PER_PAGE);
+        label.textContent = 'CH ' + (paging.start + 1) + '-' + end + ' / ' + total;
+    }
+}
+
+function createPager() {
+    const pager = document.createElement('div');
+    pager.id = 'channelPager';
+    pager.className = 'channel-pager';
+    pager.style.display = 'none';
+    const prev = document.createElement('button');
+    prev.className = 'btn small';
+    prev.textContent = '\u25C0';
+    prev.addEventListener('click', () => goToPage(paging.start - CHANNELS_PER_PAGE));
+    const label = document.createElement('span');
+    label.className = 'pager-label';
+    const next = document.createElement('button');
+    next.className = 'btn small';
+    next.textContent = '\u25B6';
+    next.addEventListener('click', () => goToPage(paging.start + CHANNELS_PER_PAGE));
+    pager.appendChild(prev);
+    pager.appendChild(label);
+    pager.appendChild(next);
+    return pager;
+}
+
 export function updateStatusBar(wsConnected, camillaConnected) {
     const wsLed = document.getElementById('wsStatusLed');
     const wsText = document.getElementById('wsStatusText');
@@ -322,7 +379,7 @@ function createMasterSection() {
             let pv = pointerToValue(e.clientY);
             const { value } = pv;
             vslider._setValue(value);
-            sendThrottled({ type: 'set_channel_level', payload: { channel: 'master', level_db: parseFloat(value) } });
+            send({ type: 'set_channel_level', payload: { channel: 'master', level_db: parseFloat(value) } });
         }
 
         function onPointerUp(e) {
@@ -352,7 +409,7 @@ function createMasterSection() {
 
     const masterKnob = createKnob('LEVEL', 0, -60, 12, '#f39c12', (val) => {
         if (vslider && vslider._setValue) vslider._setValue(val);
-        sendThrottled({ type: 'set_channel_level', payload: { channel: 'master', level_db: parseFloat(val) } });
+        send({ type: 'set_channel_level', payload: { channel: 'master', level_db: parseFloat(val) } });
     });
     masterKnob.style.margin = '0';
     rightCol.appendChild(masterKnob);
@@ -369,6 +426,8 @@ function createChannelElement(i, state) {
     const c = document.createElement('div');
     c.className = 'channel';
     c.id = 'ch-' + i;
+    // mute/solo toggles read and write this; broadcasts update it too
+    c._state = state;
     const header = document.createElement('div');
     header.className = 'channel-header';
     header.innerHTML = '<span class="ch-icon">' +
@@ -584,7 +643,7 @@ function createChannelElement(i, state) {
             const pv = pointerToValue(e.clientY);
             const { value } = pv;
             vslider._setValue(value);
-            sendThrottled({ type: 'set_channel_level', payload: { channel: i, level_db: parseFloat(value) } });
+            send({ type: 'set_channel_level', payload: { channel: i, level_db: parseFloat(value) } });
         }
 
         function onUp(e) {
@@ -606,7 +665,7 @@ function createChannelElement(i, state) {
 
     let eqGainVal = (state.eq && state.eq.gain) || 0.0;
     const gainKnob = createKnob('GAIN', eqGainVal, -12, 12, '#9ed3c6', (val) => {
-        sendThrottled({ type: 'set_channel_eq', payload: { channel: i, band: 'gain', gain_db: val } });
+        send({ type: 'set_channel_eq', payload: { channel: i, band: 'gain', gain_db: val } });
     });
     gainKnob.style.margin = '0';
     gainKnob.classList.add('knob-gain');
@@ -644,6 +703,8 @@ function createChannelElement(i, state) {
     resetBtn.style.marginTop = '8px';
     resetBtn.style.width = '60px';
     resetBtn.onclick = () => {
+        // shown right away: the acks make the broadcast echoes no-ops
+        resetChannelDisplay(i, true);
         send({ type: 'set_channel_level', payload: { channel: i, level_db: 0 } })
         send({ type: 'set_channel_mute', payload: { channel: i, mute: false } })
         send({ type: 'set_channel_solo', payload: { channel: i, solo: false } })
@@ -663,104 +724,160 @@ function createChannelElement(i, state) {
 export function renderMixer(state) {
     const container = document.getElementById('mixer');
     container.innerHTML = '';
-    domCache.channels = {};
-
-    (state.channels || []).forEach((ch, i) => {
+    clearChannelMeters();
+    // new strips: every field must be shown again
+    shownRevs.clear();
+    paging.rendered = stateKey(state);
+    paging.channelCount = state.channel_count !== undefined ? state.channel_count : (state.channels || []).length;
+    if (state.window) paging.start = state.window.start;
+    updatePager();
+
+    (state.channels || []).forEach((ch, pos) => {
+        const i = ch.index !== undefined ? ch.index : pos;
         const el = createChannelElement(i, ch);
         container.appendChild(el);
 
         const levelEl = el.querySelector('.vumeter .level');
-        if (levelEl) {
-            domCache.channels[i] = levelEl;
-        }
+        if (levelEl) registerMeter(i, levelEl);
 
         const vslider = el.querySelector('.vslider');
         if (vslider && typeof vslider._setValue === 'function') {
             requestAnimationFrame(() => vslider._setValue(ch.level_db || 0));
         }
     })
-
-    const masterLevelEl = document.querySelector('#master-vumeter .level');
-    if (masterLevelEl) {
-        domCache.masterLevel = masterLevelEl;
-    }
 }
 
-export function applyState(state) {
-    const anySolo = (state.channels || []).some(c => c.solo);
+// Revision of every field as shown on screen (`fieldKey(channel, field)`).
+// A broadcast value is only applied when it is newer than what is shown and
+// the field has no change of ours in flight, so echoes of our own moves and
+// unchanged fields cost no DOM work.
+const shownRevs = new Map();
+let anySoloShown = false;
+const EQ_KNOBS = { gain: '.knob-gain', high: '.knob-hi', mid: '.knob-mid', low: '.knob-lo' };
+
+function refreshMuteButton(el) {
+    const muteBtn = el.querySelector('.btn.small');
+    if (!muteBtn || !el._state) return;
+    const isMuted = el._state.mute || (anySoloShown && !el._state.solo);
+    if (isMuted) muteBtn.classList.add('state-on');
+    else muteBtn.classList.remove('state-on');
+}
 
-    if (state.master) {
+// Show one field; returns false if it could not be applied now (drag in progress).
+function applyField(channel, field, value) {
+    if (channel === 'master') {
+        if (field !== 'level_db') return true;
         const masterSlider = document.querySelector('#master-slider');
         if (masterSlider && typeof masterSlider._setValue === 'function') {
-            if (!masterSlider._dragState) masterSlider._setValue(state.master.level_db || 0);
+            if (masterSlider._dragState) return false;
+            masterSlider._setValue(value || 0);
         }
+        return true;
     }
-    (state.channels || []).forEach((ch, i) => {
-        const el = document.getElementById('ch-' + i);
-        if (!el) return;
+    const el = document.getElementById('ch-' + channel);
+    if (!el) return true;
+    if (field === 'level_db') {
         const vslider = el.querySelector('.vslider');
         if (vslider && typeof vslider._setValue === 'function') {
-            if (!vslider._dragState) vslider._setValue(ch.level_db || 0);
+            if (vslider._dragState) return false;
+            vslider._setValue(value || 0);
+        }
+    } else if (field.startsWith('eq.')) {
+        const knob = el.querySelector(EQ_KNOBS[field.slice(3)]);
+        if (knob && typeof knob._setValue === 'function') knob._setValue(value || 0);
+    } else if (field === 'mute' || field === 'solo') {
+        if (el._state) el._state[field] = !!value;
+        if (field === 'solo') {
+            const btns = el.querySelectorAll('.btn.small');
+            if (btns.length >= 2) {
+                if (value) btns[1].classList.add('state-solo');
+                else btns[1].classList.remove('state-solo');
+            }
         }
+        refreshMuteButton(el);
+    }
+    return true;
+}
 
-        if (ch.eq) {
-            const gainKnob = el.querySelector('.knob-gain');
-            if (gainKnob && typeof gainKnob._setValue === 'function') gainKnob._setValue(ch.eq.gain || 0);
+function reconcileField(channel, field, value, rev) {
+    const key = fieldKey(channel, field);
+    if (isPending(key)) return;
+    if (rev !== undefined && rev <= (shownRevs.get(key) ?? -1)) return;
+    if (applyField(channel, field, value) && rev !== undefined) shownRevs.set(key, rev);
+}
 
-            const hiKnob = el.querySelector('.knob-hi');
-            if (hiKnob && typeof hiKnob._setValue === 'function') hiKnob._setValue(ch.eq.high || 0);
+function resetChannelDisplay(channel, withEq) {
+    applyField(channel, 'level_db', 0);
+    applyField(channel, 'mute', false);
+    applyField(channel, 'solo', false);
+    if (withEq) Object.keys(EQ_KNOBS).forEach(band => applyField(channel, 'eq.' + band, 0));
+}
 
-            const midKnob = el.querySelector('.knob-mid');
-            if (midKnob && typeof midKnob._setValue === 'function') midKnob._setValue(ch.eq.mid || 0);
+function setAnySolo(anySolo) {
+    if (anySolo === anySoloShown) return;
+    anySoloShown = anySolo;
+    document.querySelectorAll('#mixer .channel').forEach(refreshMuteButton);
+}
 
-            const loKnob = el.querySelector('.knob-lo');
-            if (loKnob && typeof loKnob._setValue === 'function') loKnob._setValue(ch.eq.low || 0);
-        }
+export function applyState(state) {
+    // windowed states carry any_solo since the soloed strip may be off-page
+    const anySolo = state.any_solo !== undefined ? state.any_solo : (state.channels || []).some(c => c.solo);
+    const count = state.channel_count !== undefined ? state.channel_count : (state.channels || []).length;
+    if (count !== paging.channelCount) {
+        paging.channelCount = count;
+        updatePager();
+    }
 
-        const muteBtn = el.querySelector('.btn.small');
-        if (muteBtn) {
-            const isMuted = ch.mute || (anySolo && !ch.solo);
-            if (isMuted) muteBtn.classList.add('state-on');
-            else muteBtn.classList.remove('state-on');
-        }
-        const btns = el.querySelectorAll('.btn.small');
-        if (btns.length >= 2) {
-            const soloBtn = btns[1];
-            if (ch.solo) soloBtn.classList.add('state-solo');
-            else soloBtn.classList.remove('state-solo');
+    // fields not listed in revs are at base_rev
+    const revs = state.revs || {};
+    const revOf = (channel, field) => {
+        const r = revs[channel];
+        return r && r[field] !== undefined ? r[field] : state.base_rev;
+    };
+    if (state.master) {
+        reconcileField('master', 'level_db', state.master.level_db, revOf('master', 'level_db'));
+    }
+    (state.channels || []).forEach((ch, pos) => {
+        const i = ch.index !== undefined ? ch.index : pos;
+        reconcileField(i, 'level_db', ch.level_db, revOf(i, 'level_db'));
+        if (ch.eq) {
+            for (const band of Object.keys(EQ_KNOBS)) {
+                reconcileField(i, 'eq.' + band, ch.eq[band], revOf(i, 'eq.' + band));
+            }
         }
+        reconcileField(i, 'mute', ch.mute, revOf(i, 'mute'));
+        reconcileField(i, 'solo', ch.solo, revOf(i, 'solo'));
     })
+    setAnySolo(anySolo);
 }
 
-export function updateLevels(levels) {
-    levels.forEach(l => {
-        let levelEl;
-        if (l.channel === 'master') {
-            if (!domCache.masterLevel) {
-                domCache.masterLevel = document.querySelector('#master-vumeter .level');
-            }
-            levelEl = domCache.masterLevel;
-        } else {
-            levelEl = domCache.channels[l.channel];
-            if (!levelEl) {
-                levelEl = document.querySelector('#ch-' + l.channel + ' .vumeter .level');
-                if (levelEl) domCache.channels[l.channel] = levelEl;
-            }
-        }
+// fields changed since the previous broadcast
+export function applyStatePatch(patch) {
+    for (const change of patch.changes || []) {
+        reconcileField(change.channel, change.field, change.value, change.rev);
+    }
+    if (patch.any_solo !== undefined) setAnySolo(patch.any_solo);
+}
 
-        if (levelEl) {
-            const v = Math.max(-60, Math.min(12, l.level_db));
-            const pct = Math.round(((v + 60) / 72) * 100);
-            levelEl.style.height = pct + '%';
-        }
-    })
+// our own change was applied: the broadcast echo of this revision is already on screen
+export function noteAck(key, rev) {
+    if (rev > (shownRevs.get(key) ?? -1)) shownRevs.set(key, rev);
+}
 
-    try {
-        const master = levels.find(l => l.channel === 'master');
-        if (master && masterSpectrum && typeof masterSpectrum.update === 'function') {
-            masterSpectrum.update(master.level_db);
-        }
-    } catch (e) { console.error(e) }
+// revisions restart with the server: drop ours when the connection goes
+export function forgetRevisions() {
+    shownRevs.clear();
+}
+
+// a change of ours was refused: show the server's state again
+export function resyncState() {
+    shownRevs.clear();
+    send({ type: 'subscribe_channels', payload: currentWindow() });
+}
+
+// band levels (dB) from the server-side analyzer
+export function updateSpectrum(frame) {
+    if (spectrum) spectrum.update(frame.bands);
 }
 
 export function applyAutosaveSettings(settings) {
@@ -802,6 +919,32 @@ function updatePresetSelect(sel) {
     }).catch(e => console.error(e));
 }
 
+const finishedJobs = new Set();
+
+export function updatePresetJob(job) {
+    // progress of bulk archive export/import jobs
+    const el = document.getElementById('presetJobStatus');
+    if (!el || !job) return;
+    // the HTTP reply of an import can arrive after its final WebSocket update
+    if (finishedJobs.has(job.id)) return;
+    if (job.state !== 'running') finishedJobs.add(job.id);
+    const label = job.kind === 'import' ? 'Import' : 'Export';
+    if (job.state === 'running') {
+        el.textContent = job.total ? `${label} : ${job.done}/${job.total}` : `${label} : ${job.phase}...`;
+    } else if (job.state === 'failed') {
+        el.textContent = `${label} échoué : ${job.error}`;
+    } else {
+        el.textContent = job.kind === 'import'
+            ? `Import terminé : ${job.imported.length} importés, ${job.skipped.length} ignorés`
+            : `Export terminé : ${job.done} presets`;
+        if (job.kind === 'import') {
+            refreshPresetList();
+            const sel = document.getElementById('presetListModal');
+            if (sel) updatePresetSelect(sel);
+        }
+    }
+}
+
 export function openOptionsModal() {
     const backdrop = document.createElement('div');
     backdrop.className = 'modal-backdrop';
@@ -843,6 +986,33 @@ export function openOptionsModal() {
     presetRow1.appendChild(btnLoadPreset);
     presetSec.appendChild(presetRow1);
 
+    // scene recall: crossfade to the selected preset, run by the server
+    const sceneRow = document.createElement('div');
+    sceneRow.style.display = 'flex';
+    sceneRow.style.gap = '8px';
+    sceneRow.style.alignItems = 'center';
+    sceneRow.style.marginBottom = '6px';
+    const fadeLabel = document.createElement('label');
+    fadeLabel.textContent = 'Fondu (s)';
+    const fadeInput = document.createElement('input');
+    fadeInput.type = 'number';
+    fadeInput.min = '0';
+    fadeInput.max = '600';
+    fadeInput.step = '0.5';
+    fadeInput.value = '2';
+    fadeInput.style.width = '70px';
+    const btnRecallScene = document.createElement('button');
+    btnRecallScene.className = 'btn';
+    btnRecallScene.textContent = 'Fondu vers preset';
+    const btnCancelScene = document.createElement('button');
+    btnCancelScene.className = 'btn secondary';
+    btnCancelScene.textContent = 'Stop';
+    sceneRow.appendChild(fadeLabel);
+    sceneRow.appendChild(fadeInput);
+    sceneRow.appendChild(btnRecallScene);
+    sceneRow.appendChild(btnCancelScene);
+    presetSec.appendChild(sceneRow);
+
     const presetRow2 = document.createElement('div');
     presetRow2.style.display = 'flex';
     presetRow2.style.gap = '8px';
@@ -870,6 +1040,39 @@ export function openOptionsModal() {
     presetRow3.appendChild(btnImport);
     presetRow3.appendChild(btnImportYaml);
     presetSec.appendChild(presetRow3);
+
+    // bulk archive of all presets (tar.gz + manifest)
+    const presetRow4 = document.createElement('div');
+    presetRow4.style.display = 'flex';
+    presetRow4.style.gap = '8px';
+    presetRow4.style.alignItems = 'center';
+    presetRow4.style.marginTop = '6px';
+    const btnExportArchive = document.createElement('button');
+    btnExportArchive.className = 'btn';
+    btnExportArchive.textContent = 'Exporter archive';
+    const btnImportArchive = document.createElement('button');
+    btnImportArchive.className = 'btn';
+    btnImportArchive.textContent = 'Importer archive';
+    const chkOverwrite = document.createElement('input');
+    chkOverwrite.type = 'checkbox';
+    chkOverwrite.id = 'archiveOverwrite';
+    const lblOverwrite = document.createElement('label');
+    lblOverwrite.htmlFor = 'archiveOverwrite';
+    lblOverwrite.textContent = 'Écraser';
+    const archiveInput = document.createElement('input');
+    archiveInput.type = 'file';
+    archiveInput.accept = '.tar.gz,.tgz,application/gzip';
+    archiveInput.style.display = 'none';
+    const jobStatus = document.createElement('span');
+    jobStatus.id = 'presetJobStatus';
+    jobStatus.style.fontSize = '12px';
+    presetRow4.appendChild(btnExportArchive);
+    presetRow4.appendChild(btnImportArchive);
+    presetRow4.appendChild(chkOverwrite);
+    presetRow4.appendChild(lblOverwrite);
+    presetRow4.appendChild(archiveInput);
+    presetRow4.appendChild(jobStatus);
+    presetSec.appendChild(presetRow4);
     modal.appendChild(presetSec);
 
     const sep1 = document.createElement('hr');
@@ -1087,14 +1290,24 @@ export function openOptionsModal() {
         if (name) send({ type: 'load_preset', payload: { name: name } });
     });
 
+    btnRecallScene.addEventListener('click', () => {
+        const name = selectPreset.value;
+        const seconds = Math.max(0, parseFloat(fadeInput.value) || 0);
+        if (name) send({ type: 'recall_scene', payload: { name: name, duration_ms: Math.round(seconds * 1000) } });
+    });
+
+    btnCancelScene.addEventListener('click', () => {
+        send({ type: 'cancel_scene', payload: {} });
+    });
+
     btnReset.addEventListener('click', () => {
-        const el = document.getElementById('mixer');
-        const items = el.querySelectorAll('.channel');
-        items.forEach((chEl, idx) => {
+        // reset every channel, including those on other pages
+        for (let idx = 0; idx < paging.channelCount; idx++) {
+            resetChannelDisplay(idx, false);
             send({ type: 'set_channel_level', payload: { channel: idx, level_db: 0 } });
             send({ type: 'set_channel_mute', payload: { channel: idx, mute: false } });
             send({ type: 'set_channel_solo', payload: { channel: idx, solo: false } });
-        });
+        }
     });
 
     btnExport.addEventListener('click', async() => {
@@ -1123,6 +1336,32 @@ export function openOptionsModal() {
         if (inp) inp.click();
     });
 
+    btnExportArchive.addEventListener('click', () => {
+        // streamed by the server; let the browser download it directly
+        const a = document.createElement('a');
+        a.href = '/api/presets/archive';
+        document.body.appendChild(a);
+        a.click();
+        a.remove();
+    });
+
+    btnImportArchive.addEventListener('click', () => archiveInput.click());
+
+    archiveInput.addEventListener('change', async(ev) => {
+        const f = ev.target.files[0];
+        if (!f) return;
+        try {
+            const url = '/api/presets/archive?overwrite=' + (chkOverwrite.checked ? '1' : '0');
+            const res = await fetch(url, { method: 'POST', headers: { 'Content-Type': 'application/gzip' }, body: f });
+            if (!res.ok) throw new Error(await res.text());
+            updatePresetJob(await res.json());
+        } catch (e) {
+            alert('Erreur import archive: ' + e.message);
+            console.error(e);
+        }
+        ev.target.value = '';
+    });
+
     autoChk.addEventListener('change', () => {
         const enabled = autoChk.checked;
         const intervalVal = parseFloat(autoInp.value) || autosaveInterval;
@@ -1239,9 +1478,8 @@ export function initUI() {
     // Spectrum Visualizer
     const spectrumContainer = document.getElementById('spectrumContainer');
     if (spectrumContainer) {
-        const spectrum = createSpectrumVisualizer(28);
+        spectrum = createSpectrumVisualizer(28);
         spectrumContainer.appendChild(spectrum.element);
-        masterSpectrum = spectrum;
     }
 
     // Controls (Options button)
@@ -1253,6 +1491,8 @@ export function initUI() {
         optBtn.addEventListener('click', openOptionsModal);
         controls.appendChild(optBtn);
 
+        controls.appendChild(createPager());
+
         // hidden checkbox for localDuringDrag
         const chk = document.createElement('input');
         chk.type = 'checkbox';
@@ -1270,6 +1510,8 @@ export function initUI() {
         masterContainer.innerHTML = '';
         const masterSection = createMasterSection();
         masterContainer.appendChild(masterSection);
+        const masterLevel = masterSection.querySelector('#master-vumeter .level');
+        if (masterLevel) registerMeter('master', masterLevel);
         // Initialize master slider
         const masterSlider = document.getElementById('master-slider');
         if (masterSlider && typeof masterSlider._setValue === 'function') {
@@ -1,3 +1,5 @@
+import { onFrame, getLevel } from './meters.js';
+
 export function createSpectrumVisualizer(count = 28) {
   const wrap = document.createElement('div');
   wrap.className = 'spectrum';
@@ -25,37 +27,41 @@ export function createSpectrumVisualizer(count = 28) {
   });
   resizeObserver.observe(wrap);
   
-  let masterDb = -60;
   // Per-bar current values for smoothing
   let currentHeights = new Array(count).fill(0);
 
-  function update(val) {
-    // Accept master level in dB
-    if (typeof val === 'number') {
-      masterDb = val;
-    } else if (Array.isArray(val)) {
-      // Fallback if array passed: max value
-      masterDb = Math.max(...val);
-    }
+  // Band levels (dB) from the server-side analyzer; the simulation is
+  // only drawn when none arrived for REAL_TIMEOUT_MS
+  const REAL_TIMEOUT_MS = 1000;
+  const REAL_FLOOR_DB = -80;
+  let realBands = null;
+  let lastRealAt = -Infinity;
+
+  function update(bands) {
+    if (!realBands || realBands.length !== bands.length) realBands = new Float32Array(bands.length);
+    realBands.set(bands);
+    lastRealAt = performance.now();
   }
 
-  function tick() {
+  function tick(now) {
     if (!ctx) {
       ctx = canvas.getContext('2d');
-      if (!ctx) {
-        requestAnimationFrame(tick);
-        return;
-      }
+      if (!ctx) return;
     }
 
-    const now = performance.now();
+    const real = realBands !== null && (now - lastRealAt) < REAL_TIMEOUT_MS;
+    const bars = real ? realBands.length : count;
+    if (currentHeights.length !== bars) currentHeights = new Array(bars).fill(0);
+
+    // master level from the shared meter store
+    const masterDb = getLevel('master');
     // Normalize master dB to 0..1 (range -60dB to +12dB)
     const masterMag = Math.max(0, (masterDb + 60) / 72);
     
     // Clear canvas
     ctx.clearRect(0, 0, width, height);
     
-    const barWidth = (width / count) - 2; // 2px gap
+    const barWidth = (width / bars) - 2; // 2px gap
     
     // Gradient for bars
     const gradient = ctx.createLinearGradient(0, height, 0, 0);
@@ -64,9 +70,9 @@ export function createSpectrumVisualizer(count = 28) {
     gradient.addColorStop(1, '#e74c3c'); // Red top
     ctx.fillStyle = gradient;
 
-    for (let i = 0; i < count; i++) {
+    for (let i = 0; i < bars; i++) {
       // Normalized frequency position (0 = bass, 1 = treble)
-      const p = i / (count - 1);
+      const p = i / (bars - 1);
       
       // 1. Spectral Shape (Pink Noise-ish): Bass naturally higher than Treble
       // Linear dropoff: 1.0 -> 0.4
@@ -86,6 +92,7 @@ export function createSpectrumVisualizer(count = 28) {
       // Base height on Master Volume * Shape * Noise
       // Add a non-linear response (square) to make it punchier
       let targetH = Math.pow(masterMag, 1.5) * shape * (0.5 + noise);
+      if (real) targetH = Math.max(0, (realBands[i] - REAL_FLOOR_DB) / -REAL_FLOOR_DB);
       
       // 4. Smoothing / Decay
       // Attack is fast, decay is slower
@@ -102,8 +109,15 @@ export function createSpectrumVisualizer(count = 28) {
       // Draw rounded rect (simplified as rect for performance)
       ctx.fillRect(i * (barWidth + 2), height - barHeight, barWidth, barHeight);
     }
-    requestAnimationFrame(tick);
   }
-  requestAnimationFrame(tick);
+
+  // driven by the shared frame scheduler, only while on screen
+  let stop = null;
+  const visibility = new IntersectionObserver(entries => {
+    const visible = entries[entries.length - 1].isIntersecting;
+    if (visible && !stop) stop = onFrame(tick);
+    else if (!visible && stop) { stop(); stop = null; }
+  });
+  visibility.observe(wrap);
   return { element: wrap, update };
 }
@@ -0,0 +1,187 @@
+"""Build the frontend for production serving.
+
+Copies `frontend/` to `frontend/dist/` with content-hashed file names for
+the JS modules and the stylesheet (`ui.3f2a9c1b7e.js`), rewrites the
+module imports and `index.html` to point at them, adds
+`<link rel="modulepreload">` hints for every module, and writes
+precompressed `.gz` (and `.br` when the `brotli` package is installed)
+variants next to each text asset. `asset-manifest.json` maps source names
+to hashed names; `backend/static.py` uses it to serve hashed files with a
+one-year immutable cache.
+
+Usage::
+
+    python scripts/build_frontend.py [--source frontend] [--out frontend/dist]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SOURCE = os.path.join(ROOT, 'frontend')
+DEFAULT_OUT = os.path.join(DEFAULT_SOURCE, 'dist')
+MANIFEST_NAME = 'asset-manifest.json'
+HASH_LENGTH = 10
+HASHED_EXTENSIONS = ('.js', '.css')
+COMPRESSED_EXTENSIONS = ('.js', '.css', '.html', '.json', '.svg')
+# below this size compression is not worth a second request variant
+MIN_COMPRESS_BYTES = 512
+
+# references to sibling modules: from './x.js', import './x.js', import('./x.js'),
+# and worker scripts: new URL('./x.js', import.meta.url)
+IMPORT_RE = re.compile(r"""(\bfrom\s*|\bimport\s*\(?\s*|\bnew\s+URL\(\s*)(['"])\./([\w.-]+\.js)\2""")
+# worker scripts run in their own context: preloading them in the page is wasted
+WORKER_SUFFIX = '-worker.js'
+# src/href attributes pointing at a local asset, with an optional ?v= cache buster
+ASSET_REF_RE = re.compile(r"""\b(src|href)=(["'])/?([\w.-]+\.(?:js|css))(?:\?[^"']*)?\2""")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{content_hash(data)}{ext}'
+
+
+def build_assets(source: str) -> tuple:
+    """Return ({name: hashed name}, {hashed name: bytes}) for the JS/CSS files.
+
+    Modules are processed dependencies first so that a module's hash covers
+    the hashed names of what it imports.
+    """
+    sources = {}
+    for name in sorted(os.listdir(source)):
+        if name.endswith(HASHED_EXTENSIONS) and os.path.isfile(os.path.join(source, name)):
+            with open(os.path.join(source, name), 'rb') as f:
+                sources[name] = f.read()
+
+    manifest = {}
+    outputs = {}
+    visiting = set()
+
+    def visit(name):
+        if name in manifest:
+            return manifest[name]
+        if name in visiting:
+            raise ValueError(f'circular import involving {name}')
+        visiting.add(name)
+        data = sources[name]
+        if name.endswith('.js'):
+            text = data.decode('utf-8')
+
+            def rewrite(match):
+                dep = match.group(3)
+                if dep not in sources:
+                    return match.group(0)
+                return f'{match.group(1)}{match.group(2)}./{visit(dep)}{match.group(2)}'
+
+            data = IMPORT_RE.sub(rewrite, text).encode('utf-8')
+        visiting.discard(name)
+        manifest[name] = hashed_name(name, data)
+        outputs[manifest[name]] = data
+        return manifest[name]
+
+    for name in sources:
+        visit(name)
+    return manifest, outputs
+
+
+def rewrite_index(html: str, manifest: dict) -> str:
+    """Point index.html at the hashed assets and preload every module but workers."""
+    def rewrite(match):
+        name = match.group(3)
+        if name not in manifest:
+            return match.group(0)
+        return f'{match.group(1)}={match.group(2)}/{manifest[name]}{match.group(2)}'
+
+    html = ASSET_REF_RE.sub(rewrite, html)
+    newline = '\r\n' if '\r\n' in html else '\n'
+    preloads = ''.join(f'  <link rel="modulepreload" href="/{hashed}">{newline}'
+                       for name, hashed in sorted(manifest.items())
+                       if name.endswith('.js') and not name.endswith(WORKER_SUFFIX))
+    if preloads and '</head>' in html:
+        html = html.replace('</head>', preloads + '</head>', 1)
+    return html
+
+
+def compress(path: str) -> list:
+    """Write precompressed variants of `path`; returns the files written."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return []
+    written = []
+    # mtime=0 keeps the output byte-identical between builds
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        with open(path + '.gz', 'wb') as f:
+            f.write(gz)
+        written.append(path + '.gz')
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            with open(path + '.br', 'wb') as f:
+                f.write(br)
+            written.append(path + '.br')
+    return written
+
+
+def build(source: str = DEFAULT_SOURCE, out: str = DEFAULT_OUT) -> dict:
+    """Build `source` into `out` (replaced entirely). Returns the manifest."""
+    manifest, outputs = build_assets(source)
+    if os.path.isdir(out):
+        shutil.rmtree(out)
+    os.makedirs(out)
+
+    for hashed, data in outputs.items():
+        with open(os.path.join(out, hashed), 'wb') as f:
+            f.write(data)
+    out_name = os.path.basename(os.path.normpath(out))
+    for name in sorted(os.listdir(source)):
+        src = os.path.join(source, name)
+        if name in manifest or name == out_name or not os.path.isfile(src):
+            continue
+        if name == 'index.html':
+            with open(src, 'r', encoding='utf-8', newline='') as f:
+                html = rewrite_index(f.read(), manifest)
+            with open(os.path.join(out, name), 'w', encoding='utf-8', newline='') as f:
+                f.write(html)
+        else:
+            shutil.copy2(src, os.path.join(out, name))
+
+    with open(os.path.join(out, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    for name in os.listdir(out):
+        if name.endswith(COMPRESSED_EXTENSIONS):
+            compress(os.path.join(out, name))
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build hashed, precompressed frontend assets.')
+    parser.add_argument('--source', default=DEFAULT_SOURCE)
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    args = parser.parse_args(argv)
+    manifest = build(args.source, args.out)
+    for name, hashed in sorted(manifest.items()):
+        print(f'{name:<16} -> {hashed}')
+    if brotli is None:
+        print('brotli not installed: only .gz variants written', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""Tests for the server-side spectrum analyzer."""
+import asyncio
+import math
+import struct
+
+import pytest
+import pytest_asyncio
+from aiohttp import WSMsgType, web
+from aiohttp.test_utils import TestClient, TestServer
+from backend import analyzer as analyzer_module
+from backend.analyzer import (FLOOR_DB, FRAME_HEADER, STEP_DB, AlsaSource, PcmFileSource, SpectrumAnalyzer,
+                              band_layout, open_source)
+from backend.server import MixerState, websocket_handler
+
+needs_numpy = pytest.mark.skipif(analyzer_module.np is None, reason='numpy not installed')
+
+
+def sine_pcm(freq, seconds=0.5, rate=48000, amplitude=0.5, channels=2):
+    """Interleaved S16_LE PCM of a sine wave."""
+    frames = []
+    for n in range(int(seconds * rate)):
+        value = int(amplitude * 32767 * math.sin(2 * math.pi * freq * n / rate))
+        frames.append(struct.pack('<h', value) * channels)
+    return b''.join(frames)
+
+
+def decode(frame):
+    kind, version, count, ts = FRAME_HEADER.unpack_from(frame)
+    levels = [FLOOR_DB + b * STEP_DB for b in frame[FRAME_HEADER.size:]]
+    assert len(levels) == count
+    return kind, ts, levels
+
+
+class TestBands:
+    """Test band layout and source selection."""
+
+    def test_third_octave_layout(self):
+        centers, starts, stop = band_layout(48000, 4096)
+        assert 1000.0 in centers and 16000.0 in centers
+        # 20/25 Hz bands are narrower than one 11.7 Hz bin at this FFT size
+        assert centers[0] > 20.0
+        assert starts == sorted(set(starts)) and stop > starts[-1]
+        octave, _, _ = band_layout(48000, 4096, bands_per_octave=1)
+        assert len(octave) < len(centers) and 1000.0 in octave
+        with pytest.raises(ValueError):
+            band_layout(48000, 4096, bands_per_octave=0)
+
+    def test_open_source(self, tmp_path):
+        path = tmp_path / 'tap.raw'
+        path.write_bytes(b'\0' * 16)
+        assert isinstance(open_source('alsa:hw:Loopback,1'), AlsaSource)
+        assert open_source('alsa:hw:Loopback,1').device == 'hw:Loopback,1'
+        source = open_source(f'file:{path}')
+        assert isinstance(source, PcmFileSource) and not source.live
+        with pytest.raises(ValueError):
+            open_source('')
+
+    @pytest.mark.asyncio
+    async def test_file_source_loops(self, tmp_path):
+        path = tmp_path / 'tap.raw'
+        path.write_bytes(b'abcd')
+        source = PcmFileSource(str(path))
+        await source.open()
+        assert await source.read(10) == b'abcdabcdab'
+        await source.close()
+
+
+@needs_numpy
+class TestProcessing:
+    """Test the FFT band energies."""
+
+    def test_sine_lands_in_its_band(self):
+        analyzer = SpectrumAnalyzer('unused')
+        pcm = sine_pcm(1000, seconds=0.2)
+        for offset in range(0, len(pcm), analyzer.hop * 4):
+            levels = analyzer.process(pcm[offset:offset + analyzer.hop * 4])
+        peak = int(levels.argmax())
+        assert analyzer.centers[peak] == 1000.0
+        # half-scale sine: -6 dB relative to full scale
+        assert levels[peak] == pytest.approx(-6.0, abs=0.5)
+        assert levels[peak - 3] < -60 and levels[peak + 3] < -60
+
+    def test_frame_encoding(self):
+        frame = analyzer_module.encode_frame([-6.0, -200.0, 40.0], 12.5)
+        kind, ts, levels = decode(frame)
+        assert (kind, ts) == (1, 12.5)
+        assert levels == [-6.0, FLOOR_DB, FLOOR_DB + 255 * STEP_DB]
+
+
+def make_app(analyzer):
+    app = web.Application()
+    app['sockets'] = []
+    app['mixer'] = MixerState(channels=2)
+    app['adapter'] = type('Adapter', (), {'_py_connected': False})()
+    app['presets'] = None
+    app['state_needs_broadcast'] = False
+    app['autosave_enabled'] = False
+    app['autosave_interval'] = 30.0
+    app['audit'] = None
+    app['analyzer'] = analyzer
+    app.router.add_get('/ws', websocket_handler)
+    return app
+
+
+async def receive_type(ws, typ):
+    while True:
+        msg = await ws.receive(timeout=2)
+        if msg.type == WSMsgType.TEXT and msg.json()['type'] == typ:
+            return msg.json()['payload']
+
+
+@pytest_asyncio.fixture
+async def tap(tmp_path):
+    path = tmp_path / 'monitor.raw'
+    path.write_bytes(sine_pcm(1000))
+    analyzer = SpectrumAnalyzer(str(path), rate_hz=50)
+    client = TestClient(TestServer(make_app(analyzer)))
+    await client.start_server()
+    yield client, analyzer
+    await analyzer.stop()
+    await client.close()
+
+
+class TestSubscription:
+    """Test that only subscribed clients get binary frames."""
+
+    @needs_numpy
+    @pytest.mark.asyncio
+    async def test_subscribed_client_gets_frames(self, tap):
+        client, analyzer = tap
+        listener = await client.ws_connect('/ws')
+        idle = await client.ws_connect('/ws')
+        await listener.send_json({'type': 'subscribe_analyzer', 'payload': {'enabled': True}})
+        info = await receive_type(listener, 'analyzer_info')
+        assert info['available'] and info['bands'] == analyzer.centers
+
+        msg = await listener.receive(timeout=2)
+        while msg.type != WSMsgType.BINARY:
+            msg = await listener.receive(timeout=2)
+        kind, _, levels = decode(msg.data)
+        assert kind == 1 and len(levels) == len(analyzer.centers)
+
+        # the other client only ever sees its initial JSON messages
+        while True:
+            try:
+                msg = await idle.receive(timeout=0.2)
+            except asyncio.TimeoutError:
+                break
+            assert msg.type == WSMsgType.TEXT
+
+        await listener.send_json({'type': 'subscribe_analyzer', 'payload': {'enabled': False}})
+        await receive_type(listener, 'analyzer_info')
+        for _ in range(50):
+            if analyzer._task.done():
+                break
+            await asyncio.sleep(0.02)
+        assert analyzer._task.done() and not analyzer.subscribers
+        await listener.close()
+        await idle.close()
+
+    @pytest.mark.asyncio
+    async def test_unavailable_without_source(self):
+        client = TestClient(TestServer(make_app(SpectrumAnalyzer(''))))
+        await client.start_server()
+        ws = await client.ws_connect('/ws')
+        await ws.send_json({'type': 'subscribe_analyzer', 'payload': {}})
+        info = await receive_type(ws, 'analyzer_info')
+        assert not info['available'] and info['reason']
+        await ws.close()
+        await client.close()
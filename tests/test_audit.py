@@ -0,0 +1,109 @@
+"""Tests for the structured action audit log."""
+import json
+import os
+import threading
+import time
+from collections import deque
+import pytest
+from backend.audit import ActionLog
+
+
+@pytest.fixture
+def action_log(tmp_path):
+    """Create an ActionLog with 10 s buckets in a temporary directory."""
+    return ActionLog(str(tmp_path), bucket_sec=10)
+
+
+def fill(log, count=50, t0=1000.0):
+    for i in range(count):
+        log.record('c1', 'set_channel_level', i % 4, 'level_db', float(i - 1), float(i), ts=t0 + i)
+    log.flush()
+
+
+class TestActionLog:
+    """Test recording, indexing and querying."""
+
+    def test_record_is_buffered_until_flush(self, action_log):
+        action_log.record('c1', 'set_channel_mute', 0, 'mute', False, True, ts=1000.0)
+        assert not os.path.exists(action_log.path)
+        assert action_log.flush() == 1
+        with open(action_log.path) as f:
+            entry = json.loads(f.readline())
+        assert entry['client'] == 'c1'
+        assert entry['old'] is False and entry['new'] is True
+
+    def test_buckets_indexed(self, action_log):
+        fill(action_log, 50)
+        # 1000..1049 -> buckets 1000,1010,1020,1030 closed, 1040 open
+        assert [b['t'] for b in action_log._index] == [1000, 1010, 1020, 1030]
+        with open(action_log.index_path) as f:
+            assert len(f.readlines()) == 4
+
+    def test_query_time_range(self, action_log):
+        fill(action_log, 50)
+        result = action_log.query(start=1015, end=1024)
+        assert [e['ts'] for e in result['entries']] == [1015.0 + i for i in range(10)]
+        assert result['next_cursor'] is None
+
+    def test_query_channel(self, action_log):
+        fill(action_log, 50)
+        result = action_log.query(channel=2)
+        assert len(result['entries']) == 12
+        assert all(e['channel'] == 2 for e in result['entries'])
+
+    def test_query_paging(self, action_log):
+        fill(action_log, 50)
+        seen = []
+        cursor = None
+        while True:
+            page = action_log.query(start=1005, limit=7, cursor=cursor)
+            seen.extend(e['ts'] for e in page['entries'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        assert seen == [1005.0 + i for i in range(45)]
+
+    def test_reopen_recovers_unindexed_tail(self, tmp_path):
+        log = ActionLog(str(tmp_path), bucket_sec=10)
+        fill(log, 25)
+        # simulate a crash: last bucket never indexed, plus a torn write
+        with open(log.path, 'ab') as f:
+            f.write(b'{"ts": 10')
+        reopened = ActionLog(str(tmp_path), bucket_sec=10)
+        assert len(reopened.query(limit=1000)['entries']) == 25
+        reopened.record('c2', 'set_channel_solo', 1, 'solo', False, True, ts=1030.0)
+        result = reopened.query(start=1030)
+        assert [e['client'] for e in result['entries']] == ['c2']
+
+    def test_query_empty(self, action_log):
+        assert action_log.query() == {'entries': [], 'next_cursor': None}
+
+    def test_concurrent_flushes_keep_order(self, action_log):
+        class SlowQueue(deque):
+            # let another flusher run between two pops
+            def popleft(self):
+                time.sleep(0)
+                return super().popleft()
+
+        action_log._pending = SlowQueue()
+        stop = threading.Event()
+
+        def flusher():
+            while not stop.is_set():
+                action_log.flush()
+
+        threads = [threading.Thread(target=flusher) for _ in range(4)]
+        for t in threads:
+            t.start()
+        try:
+            for i in range(2000):
+                action_log.record('c1', 'set_channel_level', i % 4, 'level_db', 0.0, 1.0, ts=1000.0 + i / 10)
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+        action_log.flush()
+        with open(action_log.path) as f:
+            stamps = [json.loads(line)['ts'] for line in f]
+        assert stamps == sorted(stamps) and len(stamps) == 2000
+        assert len(action_log.query(start=1150.0, limit=1000)['entries']) == 500
@@ -0,0 +1,143 @@
+"""Tests for batched control messages."""
+import asyncio
+import threading
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from backend.server import MAX_BATCH_OPS, ControlWriter, MixerState, websocket_handler
+
+
+class BatchingAdapter:
+    """Adapter stand-in recording DSP pushes."""
+
+    _py_connected = False
+
+    def __init__(self):
+        self.batches = []
+        self.mute_pushes = 0
+        self.level_calls = 0
+        # when set, a push blocks until `release` is set
+        self.entered = None
+        self.release = None
+
+    def set_level(self, ch, level_db):
+        self.level_calls += 1
+
+    def apply_batch(self, levels=None, eq=None, master_level=None):
+        self.batches.append((dict(levels or {}), dict(eq or {}), master_level))
+        if self.release is not None:
+            self.entered.set()
+            self.release.wait(2)
+
+    def set_mutes(self, items):
+        self.mute_pushes += 1
+
+
+@pytest_asyncio.fixture
+async def client():
+    app = web.Application()
+    app['sockets'] = []
+    app['mixer'] = MixerState(channels=8)
+    app['adapter'] = BatchingAdapter()
+    app['presets'] = None
+    app['state_needs_broadcast'] = False
+    app['autosave_enabled'] = False
+    app['autosave_interval'] = 30.0
+    app['audit'] = None
+    app['control_writer'] = ControlWriter(app)
+    app.router.add_get('/ws', websocket_handler)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    yield client
+    await client.close()
+
+
+async def receive_type(ws, typ):
+    while True:
+        msg = await ws.receive_json(timeout=2)
+        if msg['type'] == typ:
+            return msg
+
+
+class TestBatchOps:
+    """Test the `batch` message over the WebSocket."""
+
+    @pytest.mark.asyncio
+    async def test_batch_applies_with_one_push(self, client):
+        app = client.server.app
+        adapter = app['adapter']
+        ws = await client.ws_connect('/ws')
+        await receive_type(ws, 'state')
+
+        await ws.send_json({'type': 'batch', 'payload': {'ops': [
+            {'type': 'set_channel_level', 'op': 'b-1', 'payload': {'channel': 1, 'level_db': -10.0}},
+            {'type': 'set_channel_level', 'op': 'b-2', 'payload': {'channel': 2, 'level_db': -20.0}},
+            {'type': 'set_channel_eq', 'op': 'b-3', 'payload': {'channel': 1, 'band': 'low', 'gain_db': 3.0}},
+            {'type': 'set_channel_level', 'op': 'b-4', 'payload': {'channel': 'master', 'level_db': -3.0}},
+            {'type': 'set_channel_mute', 'op': 'b-5', 'payload': {'channel': 4, 'mute': True}},
+            {'type': 'set_channel_solo', 'op': 'b-6', 'payload': {'channel': 5, 'solo': True}},
+        ]}})
+        reply = (await receive_type(ws, 'batch_ack'))['payload']
+        assert reply['errors'] == []
+        assert reply['acks'] == [{'op': f'b-{n}', 'rev': n} for n in range(1, 7)]
+
+        assert adapter.batches == [({1: -10.0, 2: -20.0}, {(1, 'low'): 3.0}, -3.0)]
+        assert adapter.mute_pushes == 1 and adapter.level_calls == 0
+        mixer = app['mixer']
+        assert mixer.channels[2]['level_db'] == -20.0 and mixer.channels[1]['eq']['low'] == 3.0
+        assert mixer.master['level_db'] == -3.0 and mixer.channels[4]['mute'] is True
+        assert app['state_needs_broadcast'] is True
+        await ws.close()
+
+    @pytest.mark.asyncio
+    async def test_rejected_ops_do_not_stop_the_batch(self, client):
+        app = client.server.app
+        ws = await client.ws_connect('/ws')
+        await receive_type(ws, 'state')
+
+        await ws.send_json({'type': 'batch', 'payload': {'ops': [
+            {'type': 'set_channel_eq', 'op': 'x-1', 'payload': {'channel': 'master', 'band': 'low', 'gain_db': 1.0}},
+            {'type': 'save_preset', 'op': 'x-2', 'payload': {'name': 'nope'}},
+            {'type': 'set_channel_level', 'op': 'x-3', 'payload': {'channel': 3, 'level_db': -6.0}},
+            {'type': 'set_channel_level', 'payload': {'channel': 99, 'level_db': 0.0}},
+        ]}})
+        reply = (await receive_type(ws, 'batch_ack'))['payload']
+        assert reply['acks'] == [{'op': 'x-3', 'rev': 1}]
+        assert [e['op'] for e in reply['errors']] == ['x-1', 'x-2', None]
+        assert 'Invalid set_channel_eq' in reply['errors'][0]['error']
+        assert app['adapter'].batches == [({3: -6.0}, {}, None)]
+        assert app['adapter'].mute_pushes == 0
+
+        # too many ops: rejected as a whole
+        ops = [{'type': 'set_channel_mute', 'payload': {'channel': 0, 'mute': True}}] * (MAX_BATCH_OPS + 1)
+        await ws.send_json({'type': 'batch', 'payload': {'ops': ops}})
+        error = await receive_type(ws, 'error')
+        assert 'Invalid batch' in error['payload']
+        assert app['mixer'].channels[0]['mute'] is False
+        await ws.close()
+
+    @pytest.mark.asyncio
+    async def test_single_messages_are_coalesced_off_the_loop(self, client):
+        app = client.server.app
+        adapter = app['adapter']
+        adapter.entered, adapter.release = threading.Event(), threading.Event()
+        ws = await client.ws_connect('/ws')
+        await receive_type(ws, 'state')
+        await ws.send_json({'type': 'set_channel_level', 'op': 's-1', 'payload': {'channel': 0, 'level_db': -1.0}})
+        assert (await receive_type(ws, 'ack'))['payload'] == {'op': 's-1', 'rev': 1}
+        assert await asyncio.to_thread(adapter.entered.wait, 2)
+
+        # the first push is still running: the loop keeps serving the client
+        for n in (2, 3):
+            await ws.send_json({'type': 'set_channel_level', 'op': f's-{n}',
+                                'payload': {'channel': 0, 'level_db': -float(n)}})
+            assert (await receive_type(ws, 'ack'))['payload'] == {'op': f's-{n}', 'rev': n}
+        await ws.send_json({'type': 'set_channel_mute', 'op': 's-4', 'payload': {'channel': 1, 'mute': True}})
+        await receive_type(ws, 'ack')
+        adapter.release.set()
+        await app['control_writer'].wait()
+        # the moves made during the first push went out together
+        assert adapter.batches == [({0: -1.0}, {}, None), ({0: -3.0}, {}, None)]
+        assert adapter.mute_pushes == 1 and adapter.level_calls == 0
+        await ws.close()
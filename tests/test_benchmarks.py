@@ -0,0 +1,34 @@
+"""Tests for the benchmark helpers and microbenchmark cases."""
+from benchmarks.bench_micro import build_cases, time_case
+from benchmarks.common import check_baseline, percentile, save_baseline, summarize
+
+
+def test_percentile_and_summary():
+    samples = [i / 1000.0 for i in range(1, 101)]
+    assert percentile(samples, 0.5) == 0.051
+    assert percentile([], 0.99) == 0.0
+    summary = summarize('x', samples)
+    assert summary['n'] == 100
+    assert summary['p99_ms'] == 100.0
+    assert summary['max_ms'] == 100.0
+
+
+def test_baseline_round_trip_and_check(tmp_path):
+    path = str(tmp_path / 'baselines.json')
+    save_baseline('ws_load', 'small', {'meter_p99_ms': 10.0, 'cpu_percent': 8.0}, path=path)
+    assert check_baseline('ws_load', 'small', {'meter_p99_ms': 12.0, 'cpu_percent': 8.5}, path=path) == []
+    regressions = check_baseline('ws_load', 'small', {'meter_p99_ms': 40.0, 'cpu_percent': 8.0}, path=path)
+    assert len(regressions) == 1
+    assert regressions[0].startswith('small.meter_p99_ms')
+    # no stored baseline: nothing to compare
+    assert check_baseline('ws_load', 'large', {'meter_p99_ms': 999.0}, path=path) == []
+
+
+def test_micro_cases_run(tmp_path):
+    cases = build_cases([8], str(tmp_path))
+    assert {'to_dict[8]', 'map_yaml_to_state[8]', 'update_dsp_mutes[8]', 'preset_save[8]',
+            'preset_load[8]', 'levels_frame[8]'} <= set(cases)
+    for fn in cases.values():
+        fn()
+    assert cases['map_yaml_to_state[8]']()[1]['source'] == 'mixers'
+    assert time_case(cases['to_dict[8]'], repeat=1)['best_us'] > 0
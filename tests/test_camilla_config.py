@@ -0,0 +1,312 @@
+"""Tests for the parsed CamillaDSP config model and its indexes."""
+import asyncio
+import copy
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock
+from backend.camilla_config import CamillaConfig
+from backend.camilla_adapter import CamillaAdapter
+from backend.server import map_yaml_to_state
+
+
+def make_config():
+    return {
+        'filters': {
+            'Gain_0': {'type': 'Gain', 'parameters': {'gain': 1.5}},
+            'Bass_0': {'type': 'Biquad', 'parameters': {'type': 'Lowshelf', 'freq': 100, 'gain': -2.0}},
+            'Treble_1': {'type': 'Biquad', 'parameters': {'type': 'Highshelf', 'freq': 8000, 'gain': 3.0}},
+            # Non-conventional names, resolved through pipeline analysis
+            'vocal_presence': {'type': 'Biquad', 'parameters': {'type': 'Peaking', 'freq': 2500, 'q': 1.0, 'gain': 4.0}},
+            'sub_shelf': {'type': 'Biquad', 'parameters': {'type': 'Lowshelf', 'freq': 60, 'gain': 6.0}},
+        },
+        'mixers': {
+            'main': {
+                'channels': {'in': 2, 'out': 3},
+                'mapping': [
+                    {'dest': 0, 'sources': [{'channel': 0, 'gain': -3.0}, {'channel': 1, 'gain': -3.0}]},
+                    {'dest': 1, 'mute': True, 'sources': [{'channel': 1, 'gain': -6.0}]},
+                    {'dest': 2, 'sources': [{'channel': 0, 'gain': 0.0, 'mute': True}]},
+                ],
+            },
+        },
+        'pipeline': [
+            {'type': 'Mixer', 'name': 'main'},
+            {'type': 'Filter', 'channels': [0], 'names': ['Gain_0', 'Bass_0']},
+            {'type': 'Filter', 'channel': 1, 'names': ['vocal_presence', 'Treble_1']},
+            {'type': 'Filter', 'channels': [2], 'names': ['sub_shelf']},
+        ],
+    }
+
+
+class TestCamillaConfig:
+    """Test index building and state extraction."""
+
+    def test_dest_index(self):
+        model = CamillaConfig(make_config())
+        assert model.dests == [0, 1, 2]
+        assert model.channel_count == 3
+        assert model.mixer_names == ['main']
+
+    def test_channel_state(self):
+        model = CamillaConfig(make_config())
+        state = model.to_state()
+        assert state[0]['level_db'] == -3.0
+        assert state[0]['mute'] is False
+        assert state[1]['mute'] is True
+        # all sources muted -> effectively muted
+        assert state[2]['mute'] is True
+
+    def test_filters_resolved_by_name_and_type(self):
+        model = CamillaConfig(make_config())
+        assert model.filter_for(0, 'gain') == 'Gain_0'
+        assert model.filter_for(0, 'low') == 'Bass_0'
+        assert model.filter_for(1, 'mid') == 'vocal_presence'
+        assert model.filter_for(1, 'high') == 'Treble_1'
+        assert model.filter_for(2, 'low') == 'sub_shelf'
+        assert model.channel_state(1)['eq']['mid'] == 4.0
+        assert model.channel_state(2)['eq']['low'] == 6.0
+
+    def test_explicit_names_win_over_shared_filters(self):
+        config = make_config()
+        config['filters']['room'] = {'type': 'Biquad', 'parameters': {'type': 'Peaking', 'freq': 200, 'gain': -3.0}}
+        config['filters']['Mid_0'] = {'type': 'Biquad', 'parameters': {'type': 'Peaking', 'freq': 1000, 'gain': 1.0}}
+        config['filters']['Mid_1'] = {'type': 'Biquad', 'parameters': {'type': 'Peaking', 'freq': 1000, 'gain': 2.0}}
+        config['pipeline'][1:1] = [{'type': 'Filter', 'channels': [0, 1], 'names': ['room']},
+                                   {'type': 'Filter', 'channels': [0], 'names': ['Mid_0']},
+                                   {'type': 'Filter', 'channels': [1], 'names': ['Mid_1']}]
+        model = CamillaConfig(config)
+        assert model.filter_for(0, 'mid') == 'Mid_0'
+        assert model.filter_for(1, 'mid') == 'Mid_1'
+        # a filter shared by several strips is never guessed by type
+        assert model.filter_for(2, 'mid') is None
+        config['pipeline'][1] = {'type': 'Filter', 'channels': [0, 2], 'names': ['room']}
+        assert CamillaConfig(config).filter_for(2, 'mid') is None
+
+    def test_filters_before_mixer_are_ignored(self):
+        config = make_config()
+        config['pipeline'].insert(0, {'type': 'Filter', 'channels': [0], 'names': ['sub_shelf']})
+        model = CamillaConfig(config)
+        assert model.filter_for(0, 'low') == 'Bass_0'
+
+    def test_setters_report_changes(self):
+        model = CamillaConfig(make_config())
+        assert model.set_dest_gain(0, -10.0) is True
+        assert model.set_dest_gain(0, -10.0) is False
+        assert all(s['gain'] == -10.0 for s in model.config['mixers']['main']['mapping'][0]['sources'])
+        assert model.set_dest_mute(0, True) is True
+        assert model.set_eq_gain(1, 'mid', 1.0) is True
+        assert model.config['filters']['vocal_presence']['parameters']['gain'] == 1.0
+        assert model.set_eq_gain(2, 'high', 1.0) is False
+
+    def test_multiple_mixers(self):
+        config = make_config()
+        config['mixers']['extra'] = {'mapping': [{'dest': 0, 'sources': [{'channel': 0, 'gain': -1.0}]}]}
+        model = CamillaConfig(config)
+        # a mixer outside the pipeline is not the one the strips control
+        assert model.mixer_names == ['main', 'extra'] and model.mixer_name == 'main'
+        assert model.channel_count == 3
+        assert model.channel_state(0)['level_db'] == -3.0
+
+        # the last mixer of the pipeline is; the same dest elsewhere is left alone
+        config['mixers']['extra']['mapping'].append({'dest': 5, 'sources': [{'channel': 1, 'gain': -2.0}]})
+        config['pipeline'].insert(1, {'type': 'Mixer', 'name': 'extra'})
+        model = CamillaConfig(config)
+        assert model.mixer_name == 'extra' and model.dests == [0, 5]
+        assert model.channel_state(0)['level_db'] == -1.0
+        assert model.set_dest_gain(0, -7.0)
+        assert config['mixers']['main']['mapping'][0]['sources'][0]['gain'] == -3.0
+        assert config['mixers']['extra']['mapping'][0]['sources'][0]['gain'] == -7.0
+
+    def test_invalid_config(self):
+        model = CamillaConfig(None)
+        assert model.dests == []
+        assert model.to_state() == {}
+
+    def test_fingerprint_ignores_controlled_values(self):
+        model = CamillaConfig(make_config())
+        fingerprint = model.fingerprint
+        model.set_dest_gain(0, -20.0)
+        model.set_dest_mute(2, False)
+        model.set_eq_gain(1, 'mid', -1.0)
+        assert CamillaConfig(copy.deepcopy(model.config)).fingerprint == fingerprint
+        config = make_config()
+        config['filters']['Bass_0']['parameters']['freq'] = 120
+        assert CamillaConfig(config).fingerprint != fingerprint
+
+    def test_compile_state(self):
+        base = make_config()
+        model = CamillaConfig(base)
+        state = {'channels': [
+            {'index': 0, 'level_db': -8.0, 'mute': True, 'solo': False, 'eq': {'low': 1.0}},
+            {'index': 1, 'level_db': -2.0, 'mute': False, 'solo': True, 'eq': {'mid': -3.0}},
+            {'index': 2, 'level_db': 0.0, 'mute': False, 'solo': False, 'eq': {}},
+        ]}
+        compiled = CamillaConfig(model.compile_state(state))
+        assert compiled.channel_state(0)['level_db'] == -8.0
+        assert compiled.channel_state(0)['eq']['low'] == 1.0
+        assert compiled.channel_state(1)['eq']['mid'] == -3.0
+        # solo on channel 1 mutes the others and unmutes itself
+        assert [compiled.channel_state(d)['mute'] for d in (0, 1)] == [True, False]
+        assert compiled.config['mixers']['main']['mapping'][2]['mute'] is True
+        assert compiled.fingerprint == model.fingerprint
+        # the base config is left untouched
+        assert base == make_config()
+
+    def test_compile_key_follows_values_the_state_leaves(self):
+        model = CamillaConfig(make_config())
+        full = {'channels': [{'index': d, 'level_db': 0.0, 'mute': False,
+                              'eq': {'gain': 0.0, 'low': 0.0, 'mid': 0.0, 'high': 0.0}} for d in range(3)]}
+        partial = {'channels': full['channels'][:2]}
+        key, partial_key = model.compile_key(full), model.compile_key(partial)
+        # values the state sets do not matter
+        model.set_dest_gain(1, -12.0)
+        model.set_eq_gain(1, 'mid', 3.0)
+        model.set_dest_mute(0, True)
+        assert model.compile_key(full) == key and model.compile_key(partial) == partial_key
+        # the ones it leaves to the base config do
+        model.set_dest_gain(2, -4.0)
+        assert model.compile_key(full) == key and model.compile_key(partial) != partial_key
+
+
+class TestMapYamlToState:
+    """Test YAML import through the config model."""
+
+    def test_reads_all_mixers_and_eq(self):
+        mapped, info = map_yaml_to_state(make_config(), channels=4)
+        assert info['source'] == 'mixers'
+        assert info['mixer'] == 'main'
+        assert mapped['channels'][0]['level_db'] == -3.0
+        assert mapped['channels'][1]['mute'] is True
+        assert mapped['channels'][1]['eq']['mid'] == 4.0
+        assert mapped['channels'][3]['level_db'] == 0.0
+
+
+class TestAdapterConfigCache:
+    """Test that the adapter reuses the parsed config between updates."""
+
+    def make_adapter(self, config):
+        # the fake DSP runs whatever config was last pushed
+        dsp = {'config': config}
+        adapter = CamillaAdapter()
+        adapter._py_client = MagicMock()
+        adapter._py_client.config.active.side_effect = lambda: copy.deepcopy(dsp['config'])
+        adapter._py_client.config.set_active.side_effect = lambda c: dsp.update(config=copy.deepcopy(c))
+        adapter._py_connected = True
+        adapter.dsp = dsp
+        return adapter
+
+    def test_updates_reuse_cached_config(self):
+        adapter = self.make_adapter(make_config())
+        adapter.set_level(1, -12.0)
+        model = adapter._config
+        adapter.set_level(2, -9.0)
+        adapter.set_eq_gain(1, 'mid', 2.0)
+        # the config is read back before each push, but only parsed once
+        assert adapter._config is model and model.revision == 1
+        assert adapter._py_client.config.set_active.call_count == 3
+        pushed = adapter._py_client.config.set_active.call_args[0][0]
+        assert pushed['filters']['vocal_presence']['parameters']['gain'] == 2.0
+
+    def test_external_edits_survive_updates(self):
+        adapter = self.make_adapter(make_config())
+        adapter.set_level(1, -12.0)
+        # changed on the DSP by another client
+        adapter.dsp['config']['mixers']['main']['mapping'][1]['sources'][0]['gain'] = -30.0
+        adapter.dsp['config']['filters']['Bass_0']['parameters']['freq'] = 120
+        adapter.set_eq_gain(1, 'mid', 2.0)
+        pushed = adapter.dsp['config']
+        assert pushed['mixers']['main']['mapping'][1]['sources'][0]['gain'] == -30.0
+        assert pushed['filters']['Bass_0']['parameters']['freq'] == 120
+        assert pushed['mixers']['main']['mapping'][0]['sources'][0]['gain'] == -12.0
+        assert pushed['filters']['vocal_presence']['parameters']['gain'] == 2.0
+
+    def test_unchanged_value_is_not_pushed(self):
+        adapter = self.make_adapter(make_config())
+        adapter.set_mutes([(2, True)])
+        assert adapter._py_client.config.set_active.call_count == 0
+
+    def test_refresh_rebuilds_only_on_change(self):
+        config = make_config()
+        adapter = self.make_adapter(config)
+        first = adapter._active_config()
+        assert adapter._active_config(refresh=True) is first
+        config['mixers']['main']['mapping'][0]['sources'][0]['gain'] = 2.0
+        second = adapter._active_config(refresh=True)
+        assert second is not first
+        assert second.revision == first.revision + 1
+
+    def test_apply_compiled_is_one_set_active(self):
+        adapter = self.make_adapter(make_config())
+        base = adapter.base_config()
+        compiled = base.compile_state({'channels': [{'index': 0, 'level_db': -5.0}]})
+        assert adapter.apply_compiled(compiled, {'level_db': -10.0, 'mute': False}) is True
+        adapter._py_client.config.set_active.assert_called_once_with(compiled)
+        adapter._py_client.volume.set_main_mute.assert_called_once_with(False)
+        # later updates edit a copy and keep the base fingerprint
+        adapter.set_level(2, -1.0)
+        assert compiled['mixers']['main']['mapping'][1]['sources'][0]['gain'] == -6.0
+        assert adapter._config.fingerprint == base.fingerprint
+        # the pushed preset values are kept
+        assert adapter.dsp['config']['mixers']['main']['mapping'][0]['sources'][0]['gain'] == -5.0
+
+    def test_apply_compiled_in_stub_mode(self):
+        assert CamillaAdapter(url='').apply_compiled({}) is False
+
+    def test_poll_changes_reports_config_only_on_change(self):
+        config = make_config()
+        adapter = self.make_adapter(config)
+        adapter._py_client.volume.main_volume.return_value = -20.0
+        adapter._py_client.volume.main_mute.return_value = False
+        adapter._active_config()
+        state = adapter.poll_changes()
+        assert state['master'] == {'level_db': -20.0, 'mute': False} and state['channels'] == {}
+        # volume only: the config is not fetched
+        adapter.poll_changes(config=False)
+        assert adapter._py_client.config.active.call_count == 2
+        config['mixers']['main']['mapping'][0]['sources'][0]['gain'] = 2.0
+        state = adapter.poll_changes()
+        assert state['channels'][0]['level_db'] == 2.0 and state['channel_count'] == 3
+
+    def test_get_current_state_uses_index(self):
+        adapter = self.make_adapter(make_config())
+        adapter._py_client.volume.main_volume.return_value = -20.0
+        adapter._py_client.volume.main_mute.return_value = False
+        state = adapter.get_current_state()
+        assert state['master']['level_db'] == -20.0
+        assert state['channels'][1]['eq']['mid'] == 4.0
+
+
+class TestAdapterThreads:
+    """Test that adapter calls from worker threads do not interleave."""
+
+    def test_dsp_calls_are_serialized(self):
+        dsp = {'config': make_config(), 'inside': 0, 'overlap': False}
+
+        def set_active(config):
+            dsp['inside'] += 1
+            dsp['overlap'] |= dsp['inside'] > 1
+            time.sleep(0.001)
+            dsp['config'] = copy.deepcopy(config)
+            dsp['inside'] -= 1
+
+        adapter = CamillaAdapter()
+        adapter._py_client = MagicMock()
+        adapter._py_client.config.active.side_effect = lambda: copy.deepcopy(dsp['config'])
+        adapter._py_client.config.set_active.side_effect = set_active
+        adapter._py_connected = True
+        threads = [threading.Thread(target=adapter.set_level, args=(dest, -float(n)))
+                   for n in range(1, 6) for dest in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert dsp['overlap'] is False
+
+    @pytest.mark.asyncio
+    async def test_enqueue_from_thread_reaches_queue(self):
+        adapter = CamillaAdapter(url='ws://dsp.invalid')
+        adapter._loop = asyncio.get_running_loop()
+        msg = {'type': 'set_level', 'channel': 1, 'level_db': -3.0}
+        await asyncio.to_thread(adapter._enqueue, msg)
+        assert await asyncio.wait_for(adapter._queue.get(), 1) == msg
@@ -0,0 +1,121 @@
+"""Tests for configurable channel counts and windowed channel subscriptions."""
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from backend.camilla_adapter import CamillaAdapter
+from backend.server import (ControlWriter, MixerState, broadcast_state, map_yaml_to_state, parse_window,
+                            websocket_handler, window_bounds)
+from benchmarks.configs import make_camilla_config
+
+
+class TestResize:
+    """Test MixerState resizing and windowed serialization."""
+
+    def test_resize_keeps_existing_settings(self):
+        mixer = MixerState(channels=4)
+        mixer.channels[2]['level_db'] = -7.0
+        assert mixer.resize(130) is True
+        assert len(mixer.channels) == 130
+        assert mixer.channels[2]['level_db'] == -7.0
+        assert mixer.channels[129]['index'] == 129
+        assert mixer.resize(130) is False
+        mixer.resize(3)
+        assert [ch['index'] for ch in mixer.channels] == [0, 1, 2]
+
+    def test_windowed_to_dict(self):
+        mixer = MixerState(channels=128)
+        mixer.channels[100]['solo'] = True
+        full = mixer.to_dict()
+        assert set(full) == {'master', 'channels'}
+        window = mixer.to_dict(32, 48)
+        assert [ch['index'] for ch in window['channels']] == list(range(32, 48))
+        assert window['channel_count'] == 128
+        assert window['window'] == {'start': 32, 'count': 16}
+        assert window['any_solo'] is True
+
+    def test_parse_window(self):
+        assert parse_window(None, None) is None
+        assert parse_window(16, 0) is None
+        assert parse_window('8', '16') == (8, 16)
+        with pytest.raises(ValueError):
+            parse_window(-1, 8)
+        with pytest.raises(ValueError):
+            parse_window('a', 8)
+        assert window_bounds({'window': (120, 16)}, 128) == (120, 128)
+        assert window_bounds({'window': (0, 200)}, 128) == (0, None)
+        assert window_bounds({}, 128) == (0, None)
+
+
+def test_channel_count_follows_config():
+    mapped, info = map_yaml_to_state(make_camilla_config(channels=24))
+    assert info['source'] == 'mixers'
+    assert len(mapped['channels']) == 24
+    mapped, info = map_yaml_to_state({'gains': [-1.0, -2.0, -3.0]})
+    assert len(mapped['channels']) == 3
+    mapped, info = map_yaml_to_state(make_camilla_config(channels=24), channels=8)
+    assert len(mapped['channels']) == 8
+
+
+@pytest_asyncio.fixture
+async def client():
+    """Serve the WebSocket handler for a 128-channel mixer."""
+    app = web.Application()
+    app['sockets'] = []
+    app['mixer'] = MixerState(channels=128)
+    app['adapter'] = CamillaAdapter(url='')
+    app['state_needs_broadcast'] = False
+    app['autosave_enabled'] = False
+    app['autosave_interval'] = 30.0
+    app['audit'] = None
+    app['control_writer'] = ControlWriter(app)
+    app.router.add_get('/ws', websocket_handler)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    yield client
+    await client.close()
+
+
+async def receive_type(ws, typ):
+    while True:
+        msg = await ws.receive_json(timeout=2)
+        if msg['type'] == typ:
+            return msg['payload']
+
+
+class TestWindowedSubscriptions:
+    """Test windowed state and broadcasts over the WebSocket."""
+
+    @pytest.mark.asyncio
+    async def test_initial_snapshot_uses_query_window(self, client):
+        ws = await client.ws_connect('/ws?start=64&count=8')
+        state = await receive_type(ws, 'state')
+        assert [ch['index'] for ch in state['channels']] == list(range(64, 72))
+        assert state['channel_count'] == 128
+        levels = await receive_type(ws, 'levels')
+        assert [lv['channel'] for lv in levels['channels']] == ['master'] + list(range(64, 72))
+        await ws.close()
+
+    @pytest.mark.asyncio
+    async def test_subscribe_channels_filters_broadcasts(self, client):
+        app = client.server.app
+        paged = await client.ws_connect('/ws')
+        full = await client.ws_connect('/ws')
+        assert len((await receive_type(paged, 'state'))['channels']) == 128
+        await receive_type(full, 'state')
+
+        await paged.send_json({'type': 'subscribe_channels', 'payload': {'start': 16, 'count': 16}})
+        state = await receive_type(paged, 'state')
+        assert state['window'] == {'start': 16, 'count': 16}
+
+        app['mixer'].channels[20]['level_db'] = -12.0
+        await broadcast_state(app)
+        state = await receive_type(paged, 'state')
+        assert len(state['channels']) == 16
+        assert state['channels'][4]['level_db'] == -12.0
+        assert len((await receive_type(full, 'state'))['channels']) == 128
+
+        await paged.send_json({'type': 'subscribe_channels', 'payload': {'start': -4}})
+        assert 'Invalid subscribe_channels' in await receive_type(paged, 'error')
+        await paged.close()
+        await full.close()
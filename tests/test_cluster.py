@@ -0,0 +1,139 @@
+"""Tests for the multi-process cluster: owner bus and viewer mirror."""
+import json
+import os
+import tempfile
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from backend.cluster import BUS_ROUTE, bus_handler, create_viewer_app
+from backend.server import (ControlWriter, MixerState, broadcast_changes, levels_message, patch_entries,
+                            patch_message, resume_changes, send_windowed, state_message)
+
+
+class RecordingAdapter:
+    """Adapter stand-in accepting control calls."""
+
+    _py_connected = False
+    _ws = None
+    url = ''
+
+    def set_level(self, ch, level_db):
+        pass
+
+
+def roundtrip(msg):
+    return json.loads(json.dumps(msg))['payload']
+
+
+def test_mirror_follows_state_and_patches():
+    owner = MixerState(channels=8)
+    owner.touch_all()
+    owner.set_field(2, 'level_db', -6.0)
+    owner.set_field('master', 'mute', True)
+    mirror = MixerState(channels=0)
+    mirror.load_state(roundtrip(state_message(owner)))
+    seen = owner.revision
+
+    owner.set_field(5, 'eq.low', 3.0)
+    owner.set_field(2, 'level_db', -3.0)
+    entries = patch_entries(owner, owner.changes_since(seen))
+    mirror.apply_patch(roundtrip(patch_message(owner, entries, False)))
+
+    assert mirror.to_dict() == owner.to_dict()
+    assert mirror.revisions() == owner.revisions()
+    # resume tokens work the same against the mirror
+    token = f'{owner.instance}:{seen}'
+    assert resume_changes(mirror, token) == resume_changes(owner, token)
+
+
+@pytest_asyncio.fixture
+async def cluster():
+    owner = web.Application()
+    owner['sockets'] = []
+    owner['mixer'] = MixerState(channels=8)
+    owner['adapter'] = RecordingAdapter()
+    owner['presets'] = None
+    owner['state_needs_broadcast'] = False
+    owner['autosave_enabled'] = False
+    owner['autosave_interval'] = 30.0
+    owner['audit'] = None
+    owner['control_writer'] = ControlWriter(owner)
+    owner.router.add_get(BUS_ROUTE, bus_handler)
+    owner.router.add_get('/api/ping', lambda request: web.json_response({'pong': request.query.get('n')}))
+    runner = web.AppRunner(owner)
+    await runner.setup()
+    path = os.path.join(tempfile.mkdtemp(), 'bus.sock')
+    await web.UnixSite(runner, path).start()
+
+    viewer = TestClient(TestServer(create_viewer_app(path)))
+    await viewer.start_server()
+    yield owner, viewer
+    await viewer.close()
+    await runner.cleanup()
+
+
+async def receive_type(ws, typ):
+    while True:
+        msg = await ws.receive_json(timeout=2)
+        if msg['type'] == typ:
+            return msg
+
+
+class TestViewer:
+    """Test clients served by a viewer process."""
+
+    @pytest.mark.asyncio
+    async def test_controls_reach_owner_and_broadcasts_are_windowed(self, cluster):
+        owner, viewer = cluster
+        ws = await viewer.ws_connect('/ws?start=4&count=4')
+        state = (await receive_type(ws, 'state'))['payload']
+        assert state['instance'] == owner['mixer'].instance
+        assert state['window'] == {'start': 4, 'count': 4}
+        assert (await receive_type(ws, 'autosave_settings'))['payload']['enabled'] is False
+
+        # controls go to the owner, the ack comes back to this client
+        await ws.send_json({'type': 'set_channel_level', 'op': 'v-1', 'payload': {'channel': 5, 'level_db': -9.0}})
+        assert (await receive_type(ws, 'ack'))['payload'] == {'op': 'v-1', 'rev': 1}
+        assert owner['mixer'].channels[5]['level_db'] == -9.0
+        assert owner['sockets'][0]['client_count'] == 1
+
+        owner['mixer'].set_field(1, 'mute', True)
+        await broadcast_changes(owner)
+        patch = (await receive_type(ws, 'state_patch'))['payload']
+        assert [c['channel'] for c in patch['changes']] == [5]
+
+        levels = [{'channel': 'master', 'level_db': 0.0, 'peak_db': 0.5}]
+        levels += [{'channel': i, 'level_db': -i, 'peak_db': -i} for i in range(8)]
+        await send_windowed(owner, lambda start, stop: levels_message(levels, 1.0, start, stop))
+        frame = (await receive_type(ws, 'levels'))['payload']
+        assert [c['channel'] for c in frame['channels']] == ['master', 4, 5, 6, 7]
+
+        # windows are handled by the viewer, from its mirror
+        await ws.send_json({'type': 'subscribe_channels', 'payload': {'start': 0, 'count': 2}})
+        state = (await receive_type(ws, 'state'))['payload']
+        assert state['channels'][1]['mute'] is True and state['rev'] == 2
+        await ws.close()
+
+    @pytest.mark.asyncio
+    async def test_resume_on_viewer(self, cluster):
+        owner, viewer = cluster
+        ws = await viewer.ws_connect('/ws')
+        state = (await receive_type(ws, 'state'))['payload']
+        await ws.close()
+        owner['mixer'].set_field(3, 'solo', True)
+        await broadcast_changes(owner)
+
+        ws = await viewer.ws_connect(f"/ws?resume={state['instance']}:{state['rev']}")
+        patch = await receive_type(ws, 'state_patch')
+        assert patch['payload']['changes'] == [{'channel': 3, 'field': 'solo', 'value': True, 'rev': 1}]
+        await ws.close()
+
+    @pytest.mark.asyncio
+    async def test_api_is_proxied_to_owner(self, cluster):
+        owner, viewer = cluster
+        resp = await viewer.get('/api/ping?n=3')
+        assert resp.status == 200 and await resp.json() == {'pong': '3'}
+        resp = await viewer.get('/api/missing')
+        assert resp.status == 404
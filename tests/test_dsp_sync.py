@@ -0,0 +1,166 @@
+"""Tests for the shared DSP state sync."""
+import asyncio
+import threading
+
+import pytest
+from backend.dsp_sync import DspStateSync, DspWatcher, apply_dsp_state
+from backend.server import MixerState
+
+SNAPSHOT = {'master': {'level_db': 0.0, 'mute': False},
+            'channels': {0: {'level_db': 0.0, 'mute': False, 'eq': {'low': 0.0}},
+                         1: {'level_db': -5.0, 'mute': False, 'eq': {'low': 2.0}}}}
+
+
+class SlowAdapter:
+    """Adapter whose config download blocks until released."""
+
+    _py_connected = True
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def get_current_state(self):
+        self.calls += 1
+        self.release.wait(2)
+        return SNAPSHOT
+
+
+def test_apply_touches_only_differences():
+    mixer = MixerState(channels=2)
+    assert apply_dsp_state(mixer, SNAPSHOT)
+    assert mixer.changes_since(0) == [(1, 'level_db', 1), (1, 'eq.low', 2)]
+    assert not apply_dsp_state(mixer, SNAPSHOT)
+    assert mixer.revision == 2 and mixer.base_revision == 0
+
+
+def test_apply_keeps_newer_local_changes():
+    mixer = MixerState(channels=2)
+    as_of = mixer.revision
+    mixer.set_field(1, 'level_db', -1.0)
+    assert apply_dsp_state(mixer, SNAPSHOT, as_of)
+    # the level set after the fetch started wins over the snapshot
+    assert mixer.channels[1]['level_db'] == -1.0 and mixer.channels[1]['eq']['low'] == 2.0
+    # a wholesale change while fetching discards the snapshot
+    as_of = mixer.revision
+    mixer.touch_all()
+    assert not apply_dsp_state(mixer, SNAPSHOT, as_of)
+
+
+def test_solo_mutes_are_not_mute_buttons():
+    mixer = MixerState(channels=2)
+    mixer.set_field(1, 'solo', True)
+    snapshot = {'master': {}, 'channels': {0: {'level_db': 0.0, 'mute': True}, 1: {'level_db': 0.0, 'mute': False}}}
+    assert not apply_dsp_state(mixer, snapshot)
+    assert mixer.channels[0]['mute'] is False
+
+
+class TestDspStateSync:
+    """Test single-flight fetches and freshness."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_connects_share_one_fetch(self):
+        adapter = SlowAdapter()
+        changes = []
+        sync = DspStateSync(adapter, MixerState(channels=2), ttl=60, on_change=lambda: changes.append(1))
+        waiters = [asyncio.create_task(sync.ensure()) for _ in range(20)]
+        await asyncio.sleep(0.05)
+        # the first sync is waited for
+        assert not any(w.done() for w in waiters)
+        adapter.release.set()
+        await asyncio.gather(*waiters)
+        assert adapter.calls == 1 and changes == [1]
+        assert sync.mixer.channels[1]['level_db'] == -5.0
+
+        # fresh: later connects do not fetch
+        await sync.ensure()
+        assert adapter.calls == 1
+        await sync.stop()
+
+    @pytest.mark.asyncio
+    async def test_channel_count_change_keeps_snapshot_values(self):
+        adapter = SlowAdapter()
+        adapter.release.set()
+        snapshot = {'master': {'level_db': -2.0}, 'channel_count': 4, 'channels': {
+            i: {'level_db': -10.0 - i, 'mute': i == 2, 'eq': {'low': 1.0}} for i in range(4)}}
+        adapter.get_current_state = lambda: snapshot
+        mixer = MixerState(channels=8)
+        sync = DspStateSync(adapter, mixer)
+        await sync.ensure()
+        assert len(mixer.channels) == 4
+        assert [ch['level_db'] for ch in mixer.channels] == [-10.0, -11.0, -12.0, -13.0]
+        assert [ch['mute'] for ch in mixer.channels] == [False, False, True, False]
+        assert all(ch['eq']['low'] == 1.0 for ch in mixer.channels)
+        assert mixer.master['level_db'] == -2.0
+        await sync.stop()
+
+    @pytest.mark.asyncio
+    async def test_stale_state_refreshes_in_background(self):
+        adapter = SlowAdapter()
+        adapter.release.set()
+        sync = DspStateSync(adapter, MixerState(channels=2), ttl=0)
+        await sync.ensure()
+        assert adapter.calls == 1
+        adapter.release.clear()
+        # stale: a refresh starts, but the client is not held up by it
+        await asyncio.wait_for(sync.ensure(), timeout=0.5)
+        assert sync.refresh() is sync._task and not sync._task.done()
+        adapter.release.set()
+        await sync._task
+        assert adapter.calls == 2
+        await sync.stop()
+
+    @pytest.mark.asyncio
+    async def test_disconnected_adapter_is_not_queried(self):
+        adapter = SlowAdapter()
+        adapter._py_connected = False
+        sync = DspStateSync(adapter, MixerState(channels=2))
+        await sync.ensure()
+        assert adapter.calls == 0 and sync.synced_at is None
+
+
+class PollingAdapter:
+    """Adapter stand-in returning queued `poll_changes` results."""
+
+    _py_connected = True
+
+    def __init__(self):
+        self.results = []
+        self.calls = []
+
+    def poll_changes(self, config=True):
+        self.calls.append(config)
+        return self.results.pop(0) if self.results else {'master': {}, 'channels': {}}
+
+
+class TestDspWatcher:
+    """Test the external change watcher."""
+
+    @pytest.mark.asyncio
+    async def test_picks_up_external_changes(self):
+        adapter = PollingAdapter()
+        changes = []
+        watcher = DspWatcher(adapter, MixerState(channels=2), config_every=2, on_change=lambda: changes.append(1))
+        # the first tick only records the revision
+        assert not await watcher.poll()
+        assert not await watcher.poll()
+        adapter.results.append({'master': {'level_db': -12.0, 'mute': False}, 'channels': {}})
+        assert await watcher.poll()
+        assert watcher.mixer.changes_since(0) == [('master', 'level_db', 1)]
+        assert changes == [1]
+        # nothing new: no change, no callback
+        assert not await watcher.poll()
+        assert changes == [1]
+        # the config is only fetched every config_every ticks
+        assert adapter.calls == [False, True, False]
+
+    @pytest.mark.asyncio
+    async def test_skips_while_mixer_changes_locally(self):
+        adapter = PollingAdapter()
+        watcher = DspWatcher(adapter, MixerState(channels=2))
+        await watcher.poll()
+        watcher.mixer.touch(0, 'level_db')
+        assert not await watcher.poll()
+        assert adapter.calls == []
+        await watcher.poll()
+        assert adapter.calls == [False]
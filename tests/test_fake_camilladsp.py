@@ -0,0 +1,95 @@
+"""Tests for the fake CamillaDSP server used by the benchmarks."""
+import json
+import time
+import aiohttp
+import pytest
+import pytest_asyncio
+from benchmarks.configs import make_camilla_config
+from benchmarks.fake_camilladsp import FakeCamillaDSP
+
+
+@pytest_asyncio.fixture
+async def dsp():
+    """Start a fake DSP on a free port and yield (server, query function)."""
+    fake = FakeCamillaDSP(make_camilla_config(channels=4))
+    port = await fake.start()
+    session = aiohttp.ClientSession()
+    ws = await session.ws_connect(f'http://127.0.0.1:{port}/')
+
+    async def query(command, arg=None):
+        await ws.send_str(json.dumps(command if arg is None else {command: arg}))
+        reply = json.loads((await ws.receive()).data)
+        return reply[command]
+
+    yield fake, query
+    await ws.close()
+    await session.close()
+    await fake.stop()
+
+
+class TestFakeCamillaDSP:
+    """Test the pycamilladsp wire protocol subset."""
+
+    @pytest.mark.asyncio
+    async def test_version_and_state(self, dsp):
+        fake, query = dsp
+        assert (await query('GetVersion'))['value'] == '3.0.0'
+        assert (await query('GetState')) == {'result': 'Ok', 'value': 'Running'}
+
+    @pytest.mark.asyncio
+    async def test_volume_and_mute(self, dsp):
+        fake, query = dsp
+        assert (await query('SetVolume', -12.5)) == {'result': 'Ok'}
+        assert (await query('GetVolume'))['value'] == -12.5
+        await query('SetFaderMute', [2, True])
+        assert (await query('GetFaderMute', 2))['value'] == [2, True]
+        await query('SetFaderExternalVolume', [0, -3.0])
+        assert (await query('GetFaderVolume', 0))['value'] == [0, -3.0]
+        bad = await query('GetFaderVolume', 9)
+        assert bad['result'] == 'Error'
+
+    @pytest.mark.asyncio
+    async def test_config_round_trip(self, dsp):
+        fake, query = dsp
+        config = json.loads((await query('GetConfigJson'))['value'])
+        assert config['mixers']['2x4']['mapping'][1]['dest'] == 1
+        config['mixers']['2x4']['mapping'][1]['sources'][0]['gain'] = -6.0
+        before = time.perf_counter()
+        assert (await query('SetConfigJson', json.dumps(config)))['result'] == 'Ok'
+        assert fake.config == config
+        assert fake.set_config_times[-1] >= before
+        assert (await query('SetConfigJson', '{}'))['result'] == 'Error'
+
+    @pytest.mark.asyncio
+    async def test_levels_follow_mixer(self, dsp):
+        fake, query = dsp
+        fake.config['mixers']['2x4']['mapping'][3]['mute'] = True
+        rms = (await query('GetPlaybackSignalRms'))['value']
+        assert len(rms) == 4
+        assert rms[3] == -1000.0
+        assert all(-30.0 < v <= 0.0 for v in rms[:3])
+        assert len((await query('GetCaptureSignalPeak'))['value']) == 2
+
+    @pytest.mark.asyncio
+    async def test_unknown_command_and_counts(self, dsp):
+        fake, query = dsp
+        assert (await query('Reboot'))['result'] == 'Error'
+        await query('GetVolume')
+        assert fake.commands['GetVolume'] == 1
+        assert fake.commands['Reboot'] == 1
+
+    @pytest.mark.asyncio
+    async def test_latency_applied(self, dsp):
+        fake, query = dsp
+        fake.latency = 0.05
+        start = time.perf_counter()
+        await query('GetState')
+        assert time.perf_counter() - start >= 0.05
+
+
+def test_config_size_grows_with_filters():
+    small = make_camilla_config(channels=8)
+    large = make_camilla_config(channels=8, filters_per_channel=10)
+    assert len(large['filters']) == len(small['filters']) + 80
+    assert len(json.dumps(large)) > 2 * len(json.dumps(small))
+    assert large['pipeline'][0] == {'type': 'Mixer', 'name': '2x8'}
@@ -0,0 +1,93 @@
+"""Tests for loading imported documents and presets onto the console."""
+import pytest
+import pytest_asyncio
+from aiohttp.test_utils import TestClient, TestServer
+
+import backend.logger
+import backend.server as server
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'PRESETS_DIR', str(tmp_path / 'presets'))
+    monkeypatch.setattr(server, 'AUDIT_DIR', str(tmp_path / 'audit'))
+    monkeypatch.setattr(server, 'METER_RING_PATH', '')
+    # keep the test run out of backend/actions.log
+    monkeypatch.setattr(backend.logger, 'setup_logging', lambda **kwargs: None)
+    client = TestClient(TestServer(server.create_app()))
+    await client.start_server()
+    yield client
+    await client.close()
+
+
+class TestImportYaml:
+    """Test importing a CamillaDSP/state YAML document."""
+
+    @pytest.mark.asyncio
+    async def test_import_raises_revision(self, client):
+        mixer = client.server.app['mixer']
+        before = mixer.revision
+        doc = 'gains: [%s]' % ', '.join(['-3.0'] * len(mixer.channels))
+        resp = await client.post('/api/import_yaml', json={'yaml': doc, 'name': 'imported'})
+        assert resp.status == 200
+        assert all(ch['level_db'] == -3.0 for ch in mixer.channels)
+        # clients only apply fields newer than what they show
+        assert mixer.revision > before and mixer.base_revision == mixer.revision
+
+    @pytest.mark.asyncio
+    async def test_channel_count_follows_dsp_when_connected(self, client):
+        app = client.server.app
+        mixer = app['mixer']
+        count = len(mixer.channels)
+        connected = app['adapter']._py_connected
+        app['adapter']._py_connected = True
+        try:
+            resp = await client.post('/api/import_yaml', json={'yaml': 'gains: [-1.0, -2.0, -3.0]'})
+            assert resp.status == 200
+        finally:
+            app['adapter']._py_connected = connected
+        assert len(mixer.channels) == count
+        assert [ch['level_db'] for ch in mixer.channels[:4]] == [-1.0, -2.0, -3.0, 0.0]
+
+    @pytest.mark.asyncio
+    async def test_document_sizes_console_without_dsp(self, client):
+        mixer = client.server.app['mixer']
+        resp = await client.post('/api/import_yaml', json={'yaml': 'gains: [-1.0, -2.0, -3.0]'})
+        assert resp.status == 200
+        assert len(mixer.channels) == 3
+
+
+class TestLoadPreset:
+    """Test that a preset load keeps the console size."""
+
+    async def load(self, client, name):
+        ws = await client.ws_connect('/ws')
+        await ws.send_json({'type': 'load_preset', 'payload': {'name': name}})
+        while True:
+            msg = await ws.receive_json(timeout=2)
+            if msg['type'] in ('preset_loaded', 'error'):
+                break
+        await ws.close()
+        return msg
+
+    @pytest.mark.asyncio
+    async def test_preset_is_fitted_to_dsp_channel_count(self, client):
+        app = client.server.app
+        mixer = app['mixer']
+        count = len(mixer.channels)
+        small = {'channels': [dict(mixer.default_channel(i), level_db=-5.0) for i in range(3)]}
+        large = {'channels': [dict(mixer.default_channel(i), level_db=-7.0) for i in range(count + 4)]}
+        await app['presets'].save_preset('small', small)
+        await app['presets'].save_preset('large', large)
+        connected = app['adapter']._py_connected
+        app['adapter']._py_connected = True
+        try:
+            assert (await self.load(client, 'small'))['type'] == 'preset_loaded'
+            assert len(mixer.channels) == count
+            assert [ch['level_db'] for ch in mixer.channels[:4]] == [-5.0, -5.0, -5.0, 0.0]
+            assert [ch['index'] for ch in mixer.channels] == list(range(count))
+            assert (await self.load(client, 'large'))['type'] == 'preset_loaded'
+            assert len(mixer.channels) == count
+            assert all(ch['level_db'] == -7.0 for ch in mixer.channels)
+        finally:
+            app['adapter']._py_connected = connected
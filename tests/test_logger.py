@@ -0,0 +1,99 @@
+"""Tests for the queued logging pipeline."""
+import logging
+import sys
+import pytest
+from backend import logger as log_module
+from backend.logger import DuplicateFilter, LazyJson, setup_logging, stop_logging
+
+
+def make_record(msg='boom', lineno=10, exc=None):
+    exc_info = None
+    if exc is not None:
+        try:
+            raise exc
+        except Exception:
+            exc_info = sys.exc_info()
+    return logging.LogRecord('test', logging.ERROR, __file__, lineno, msg, None, exc_info)
+
+
+class TestDuplicateFilter:
+    """Test rate-limited suppression of repeated exceptions."""
+
+    def test_plain_records_pass(self):
+        f = DuplicateFilter(interval=60)
+        assert f.filter(make_record()) is True
+        assert f.filter(make_record()) is True
+
+    def test_repeated_exception_suppressed(self):
+        f = DuplicateFilter(interval=60)
+        assert f.filter(make_record(exc=ValueError('a'))) is True
+        assert f.filter(make_record(exc=ValueError('b'))) is False
+        assert f.filter(make_record(exc=ValueError('c'))) is False
+        # different call site is independent
+        assert f.filter(make_record(lineno=11, exc=ValueError('d'))) is True
+
+    def test_suppressed_count_reported_after_window(self):
+        f = DuplicateFilter(interval=0.0)
+        assert f.filter(make_record(exc=KeyError('x'))) is True
+        f.interval = 60
+        assert f.filter(make_record(exc=KeyError('x'))) is False
+        f.interval = 0.0
+        rec = make_record(exc=KeyError('x'))
+        assert f.filter(rec) is True
+        assert '1 similar suppressed' in rec.msg
+
+
+class TestLazyJson:
+    """Test deferred payload formatting."""
+
+    def test_str_dumps_json(self):
+        assert str(LazyJson({'type': 'x', 'payload': {'a': 1}})) == '{"type": "x", "payload": {"a": 1}}'
+
+    def test_unserializable_falls_back_to_repr(self):
+        assert 'object' in str(LazyJson({'o': object()}))
+
+
+class TestSetupLogging:
+    """Test the QueueHandler/QueueListener pipeline end to end."""
+
+    @pytest.fixture
+    def root(self):
+        root = logging.getLogger()
+        saved_level = root.level
+        yield root
+        stop_logging()
+        log_module._console_handler = None
+        root.setLevel(saved_level)
+
+    def test_records_written_by_listener(self, root, tmp_path):
+        path = tmp_path / 'actions.log'
+        setup_logging(str(path), console_enabled=False)
+        assert log_module.get_console_enabled() is False
+        logging.getLogger('adapter').info('would send: %s', LazyJson({'channel': 1}))
+        stop_logging()
+        assert 'would send: {"channel": 1}' in path.read_text()
+
+    def test_args_rendered_when_logged(self, root, tmp_path):
+        path = tmp_path / 'actions.log'
+        setup_logging(str(path), console_enabled=False)
+        state = {'level_db': -3.0}
+        logging.getLogger('mixer').info('state %s', LazyJson(state))
+        # changed by the caller before the listener writes the record
+        state['level_db'] = 0.0
+        stop_logging()
+        assert 'state {"level_db": -3.0}' in path.read_text()
+
+    def test_only_console_handlers_are_replaced(self, root, tmp_path):
+        console = logging.StreamHandler(sys.stderr)
+        other = logging.NullHandler()
+        root.addHandler(console)
+        root.addHandler(other)
+        try:
+            before = list(root.handlers)
+            setup_logging(str(tmp_path / 'actions.log'))
+            assert console not in root.handlers and other in root.handlers
+            stop_logging()
+            assert sorted(map(id, root.handlers)) == sorted(map(id, before))
+        finally:
+            root.removeHandler(console)
+            root.removeHandler(other)
@@ -0,0 +1,56 @@
+"""Tests for the shared-memory meter ring."""
+import os
+
+import pytest
+from backend.meter_ring import HEADER_SIZE, SEQ, MeterRing, MeterRingReader
+
+
+@pytest.fixture
+def ring(tmp_path):
+    ring = MeterRing(str(tmp_path / 'meters'), capacity=9, slots=4)
+    ring.open()
+    yield ring
+    ring.close()
+
+
+def test_publish_and_read_latest(ring):
+    reader = MeterRingReader(ring.path)
+    assert reader.latest() is None
+    levels = [{'channel': 'master', 'level_db': -3.0, 'peak_db': -1.0},
+              {'channel': 0, 'level_db': -12.0, 'peak_db': -6.0}]
+    ring.publish_levels(levels, 100.0, simulated=True)
+    frame = reader.latest()
+    assert frame.frame == 1 and frame.ts == 100.0 and frame.simulated
+    assert frame.rms == [-3.0, -12.0] and frame.peak == [-1.0, -6.0]
+    # values beyond the capacity are dropped
+    ring.publish([0.0] * 20, [0.0] * 20, 101.0)
+    assert len(reader.latest().rms) == 9
+    reader.close()
+
+
+def test_overwritten_and_torn_slots(ring):
+    reader = MeterRingReader(ring.path)
+    for n in range(6):
+        ring.publish([float(-n)], [float(-n)], float(n))
+    # 4 slots: frames 1 and 2 are gone; frames_since keeps clear of the next write
+    assert reader.read(2) is None
+    assert [f.frame for f in reader.frames_since(0)] == [4, 5, 6]
+    assert [f.frame for f in reader.frames_since(5)] == [6]
+    # a slot being written (odd sequence) is not returned
+    offset = HEADER_SIZE + (6 % ring.slots) * ring.slot_size
+    SEQ.pack_into(ring._mm, offset, 2 * 6 - 1)
+    assert reader.read(6) is None
+    reader.close()
+
+
+def test_close_flags_and_removes(tmp_path):
+    ring = MeterRing(str(tmp_path / 'meters'), capacity=3)
+    ring.open()
+    reader = MeterRingReader(ring.path)
+    assert not reader.closed and reader.pid == os.getpid()
+    ring.close()
+    assert reader.closed and not os.path.exists(ring.path)
+    reader.close()
+    with pytest.raises(ValueError):
+        (tmp_path / 'other').write_bytes(b'\0' * 64)
+        MeterRingReader(str(tmp_path / 'other'))
@@ -0,0 +1,65 @@
+"""Tests for the Prometheus-style metrics registry."""
+import pytest
+from backend.metrics import Counter, Gauge, Histogram, Registry, _Metric, timed
+
+
+@pytest.fixture
+def registry():
+    """Create an isolated metrics registry."""
+    return Registry()
+
+
+class TestMetrics:
+    """Test metric types and text exposition."""
+
+    def test_counter_with_labels(self, registry):
+        c = Counter('msgs_total', 'Messages.', ['type'], registry=registry)
+        c.labels('set_channel_level').inc()
+        c.labels('set_channel_level').inc(2)
+        text = registry.render()
+        assert '# TYPE msgs_total counter' in text
+        assert 'msgs_total{type="set_channel_level"} 3.0' in text
+
+    def test_label_count_checked(self, registry):
+        c = Counter('x_total', 'X.', ['a', 'b'], registry=registry)
+        with pytest.raises(ValueError):
+            c.labels('only-one')
+
+    def test_metric_kind_must_define_children(self, registry):
+        with pytest.raises(TypeError):
+            _Metric('bare', 'No child type.', registry=registry)
+
+    def test_histogram_buckets_are_cumulative(self, registry):
+        h = Histogram('lat_seconds', 'Latency.', buckets=(0.01, 0.1), registry=registry)
+        h.observe(0.005)
+        h.observe(0.05)
+        h.observe(5.0)
+        text = registry.render()
+        assert 'lat_seconds_bucket{le="0.01"} 1' in text
+        assert 'lat_seconds_bucket{le="0.1"} 2' in text
+        assert 'lat_seconds_bucket{le="+Inf"} 3' in text
+        assert 'lat_seconds_count 3' in text
+
+    def test_timed_decorator(self, registry):
+        h = Histogram('call_seconds', 'Calls.', ['method'], registry=registry)
+        child = h.labels('set_level')
+
+        @timed(child)
+        def work():
+            return 42
+
+        assert work() == 42
+        assert child.count == 1
+
+    def test_gauge_function_evaluated_at_render(self, registry):
+        g = Gauge('queue_bytes', 'Queue.', ['client'], registry=registry)
+        sizes = {'a': 10}
+        g.set_function(lambda: [((k,), v) for k, v in sizes.items()])
+        assert 'queue_bytes{client="a"} 10.0' in registry.render()
+        sizes['b'] = 5
+        assert 'queue_bytes{client="b"} 5.0' in registry.render()
+
+    def test_label_values_escaped(self, registry):
+        c = Counter('esc_total', 'Esc.', ['v'], registry=registry)
+        c.labels('a"b').inc()
+        assert 'esc_total{v="a\\"b"} 1.0' in registry.render()
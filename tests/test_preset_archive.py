@@ -0,0 +1,136 @@
+"""Tests for bulk preset archive export/import."""
+import asyncio
+import io
+import json
+import os
+import tarfile
+
+import pytest
+from backend.preset_archive import (ArchiveError, ArchiveJobs, MANIFEST_NAME, iter_archive,
+                                    validate_archive, write_archive)
+from backend.presets import PresetManager
+from benchmarks.configs import make_mixer_state
+
+
+@pytest.fixture
+def presets(tmp_path):
+    return PresetManager(str(tmp_path / 'src'))
+
+
+async def export_to_file(presets, names, path):
+    chunks = []
+
+    async def write(chunk):
+        chunks.append(chunk)
+
+    manifest = await write_archive(presets, names, write)
+    with open(path, 'wb') as f:
+        f.write(b''.join(chunks))
+    return manifest, chunks
+
+
+def rewrite_archive(src, dst, change):
+    """Copy an archive, passing each (name, data) through `change`."""
+    with tarfile.open(src, 'r:gz') as tin, tarfile.open(dst, 'w:gz') as tout:
+        for member in tin.getmembers():
+            result = change(member.name, tin.extractfile(member).read())
+            if result is None:
+                continue
+            name, data = result
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tout.addfile(info, io.BytesIO(data))
+
+
+@pytest.mark.asyncio
+async def test_export_round_trip(presets, tmp_path):
+    for i in range(40):
+        await presets.save_preset(f'show_{i}', make_mixer_state(256))
+    path = str(tmp_path / 'out.tar.gz')
+    manifest, chunks = await export_to_file(presets, presets.list_presets() + ['gone'], path)
+    # compressed data is handed out while presets are still being added
+    assert len(chunks) > 1
+    assert manifest['missing'] == ['gone']
+    assert len(manifest['presets']) == 40
+
+    entries = validate_archive(path, presets._validate_preset_name)
+    items = dict(iter_archive(path, entries))
+    assert items['show_3'] == await presets.load_preset('show_3')
+
+
+@pytest.mark.asyncio
+async def test_validation_errors(presets, tmp_path):
+    await presets.save_preset('a', {'channels': []})
+    good = str(tmp_path / 'good.tar.gz')
+    await export_to_file(presets, ['a'], good)
+    bad = str(tmp_path / 'bad.tar.gz')
+
+    def tamper(name, data):
+        return (name, data.replace(b'channels', b'channelz')) if name.endswith('a.json') else (name, data)
+
+    def rename(name, data):
+        if name == MANIFEST_NAME:
+            manifest = json.loads(data)
+            manifest['presets'][0]['name'] = '../a'
+            data = json.dumps(manifest).encode()
+        return name, data
+
+    cases = [
+        (tamper, 'checksum'),
+        (lambda n, d: None if n == MANIFEST_NAME else (n, d), 'manifest.json missing'),
+        (lambda n, d: None if n.endswith('a.json') else (n, d), 'missing'),
+        (rename, 'invalid preset name'),
+    ]
+    for change, message in cases:
+        rewrite_archive(good, bad, change)
+        with pytest.raises(ArchiveError, match=message):
+            validate_archive(bad, presets._validate_preset_name)
+
+    with open(bad, 'wb') as f:
+        f.write(b'not a tarball')
+    with pytest.raises(ArchiveError, match='unreadable'):
+        validate_archive(bad, presets._validate_preset_name)
+
+
+@pytest.mark.asyncio
+async def test_import_job(presets, tmp_path):
+    for name in ('intro', 'outro'):
+        await presets.save_preset(name, {'channels': [], 'master': {'level_db': -1.0}})
+    archive = str(tmp_path / 'up.tar.gz')
+    await export_to_file(presets, ['intro', 'outro'], archive)
+
+    target = PresetManager(str(tmp_path / 'dst'))
+    await target.save_preset('intro', {'channels': []})
+    updates = []
+
+    async def notify(status):
+        updates.append(status)
+
+    jobs = ArchiveJobs(target, notify=notify)
+    status = jobs.start_import(archive, overwrite=False)
+    assert status['state'] == 'running'
+    for _ in range(100):
+        if jobs.get(status['id'])['state'] != 'running':
+            break
+        await asyncio.sleep(0.01)
+    job = jobs.public(jobs.get(status['id']))
+    assert job['state'] == 'done'
+    assert job['imported'] == ['outro'] and job['skipped'] == ['intro']
+    assert (job['done'], job['total']) == (2, 2)
+    assert updates[0]['phase'] == 'validate' and updates[-1]['state'] == 'done'
+    assert (await target.load_preset('outro'))['master']['level_db'] == -1.0
+    assert await target.load_preset('intro') == {'channels': []}
+    assert not os.path.exists(archive)
+
+
+@pytest.mark.asyncio
+async def test_import_job_reports_invalid_archive(tmp_path):
+    path = str(tmp_path / 'junk.tar.gz')
+    with open(path, 'wb') as f:
+        f.write(b'junk')
+    jobs = ArchiveJobs(PresetManager(str(tmp_path / 'dst')))
+    status = jobs.start_import(path)
+    await asyncio.sleep(0.1)
+    job = jobs.get(status['id'])
+    assert job['state'] == 'failed' and 'unreadable' in job['error']
+    await jobs.stop()
@@ -0,0 +1,134 @@
+"""Tests for preset diffs and partial recall."""
+import copy
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from backend.preset_diff import diff_states, parse_channels, parse_params
+from backend.presets import PresetManager
+from backend.server import ControlWriter, MixerState, websocket_handler
+
+
+class RecordingAdapter:
+    """Adapter stand-in recording batched DSP updates."""
+
+    _py_connected = False
+
+    def __init__(self):
+        self.batches = []
+        self.mutes = []
+
+    def apply_batch(self, levels=None, eq=None, master_level=None):
+        self.batches.append((dict(levels or {}), dict(eq or {}), master_level))
+
+    def set_mutes(self, items):
+        self.mutes.append(list(items))
+
+
+def make_target(mixer):
+    target = copy.deepcopy(mixer.to_dict())
+    target['channels'][1]['level_db'] = -12.0
+    target['channels'][1]['eq']['low'] = 3.0
+    target['channels'][3]['mute'] = True
+    target['master']['level_db'] = -5.0
+    return target
+
+
+class TestDiff:
+    """Test diff computation and filters."""
+
+    def test_full_diff(self):
+        mixer = MixerState(channels=4)
+        diff = diff_states(mixer.to_dict(), make_target(mixer))
+        assert diff['count'] == 4
+        assert diff['master'] == {'level_db': {'from': 0.0, 'to': -5.0}}
+        assert [entry['index'] for entry in diff['channels']] == [1, 3]
+        assert diff['channels'][0]['changes'] == {'level_db': {'from': 0.0, 'to': -12.0},
+                                                  'eq.low': {'from': 0.0, 'to': 3.0}}
+
+    def test_filters(self):
+        mixer = MixerState(channels=4)
+        target = make_target(mixer)
+        diff = diff_states(mixer.to_dict(), target, channels={1}, params=parse_params('eq'))
+        assert diff['master'] == {}
+        assert diff['channels'] == [{'index': 1, 'changes': {'eq.low': {'from': 0.0, 'to': 3.0}}}]
+        diff = diff_states(mixer.to_dict(), target, channels=parse_channels('master,3'), params={'mute'})
+        assert diff['count'] == 1 and diff['channels'][0]['index'] == 3
+
+    def test_parse_errors(self):
+        assert parse_channels(None) is None
+        assert parse_channels([0, 'master', '2']) == {0, 2, 'master'}
+        assert parse_params(['level_db', 'eq.mid']) == {'level_db', 'eq.mid'}
+        with pytest.raises(ValueError):
+            parse_channels('x')
+        with pytest.raises(ValueError):
+            parse_channels([-1])
+        with pytest.raises(ValueError):
+            parse_params('volume')
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path):
+    """Serve the WebSocket handler with a recording adapter and one preset."""
+    app = web.Application()
+    app['sockets'] = []
+    app['mixer'] = MixerState(channels=4)
+    app['adapter'] = RecordingAdapter()
+    app['presets'] = PresetManager(str(tmp_path))
+    app['state_needs_broadcast'] = False
+    app['autosave_enabled'] = False
+    app['autosave_interval'] = 30.0
+    app['audit'] = None
+    app['control_writer'] = ControlWriter(app)
+    await app['presets'].save_preset('show', make_target(app['mixer']))
+    app.router.add_get('/ws', websocket_handler)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    yield client
+    await client.close()
+
+
+async def receive_type(ws, typ):
+    while True:
+        msg = await ws.receive_json(timeout=2)
+        if msg['type'] == typ:
+            return msg['payload']
+
+
+class TestRecallPartial:
+    """Test recall_partial over the WebSocket."""
+
+    @pytest.mark.asyncio
+    async def test_only_selected_changes_are_pushed(self, client):
+        app = client.server.app
+        ws = await client.ws_connect('/ws')
+        await ws.send_json({'type': 'recall_partial',
+                            'payload': {'name': 'show', 'channels': [1], 'params': ['level_db']}})
+        assert (await receive_type(ws, 'preset_loaded'))['changes'] == 1
+        assert app['mixer'].channels[1]['level_db'] == -12.0
+        assert app['mixer'].channels[1]['eq']['low'] == 0.0
+        assert app['mixer'].master['level_db'] == 0.0
+        assert app['adapter'].batches == [({1: -12.0}, {}, None)]
+        assert app['adapter'].mutes == []
+
+        await ws.send_json({'type': 'recall_partial', 'payload': {'name': 'show'}})
+        assert (await receive_type(ws, 'preset_loaded'))['changes'] == 3
+        assert app['adapter'].batches[-1] == ({}, {(1, 'low'): 3.0}, -5.0)
+        assert len(app['adapter'].mutes) == 1
+        assert app['mixer'].channels[3]['mute'] is True
+
+        # nothing left to change: no DSP traffic
+        await ws.send_json({'type': 'recall_partial', 'payload': {'name': 'show'}})
+        assert (await receive_type(ws, 'preset_loaded'))['changes'] == 0
+        assert len(app['adapter'].batches) == 2
+        await ws.close()
+
+    @pytest.mark.asyncio
+    async def test_errors(self, client):
+        ws = await client.ws_connect('/ws')
+        await ws.send_json({'type': 'recall_partial', 'payload': {'name': 'show', 'params': ['volume']}})
+        assert 'Invalid recall_partial' in await receive_type(ws, 'error')
+        await ws.send_json({'type': 'recall_partial', 'payload': {'name': 'nope'}})
+        assert await receive_type(ws, 'error') == 'preset not found'
+        await ws.close()
@@ -84,3 +84,62 @@ async def test_overwrite_preset(preset_manager):
     await preset_manager.save_preset('overwrite_me', state2)
     loaded2 = await preset_manager.load_preset('overwrite_me')
     assert loaded2['channels'][0]['level_db'] == 12.0
+
+
+@pytest.mark.asyncio
+async def test_compiled_config_cache(preset_manager):
+    """Test precompiled configs are reused until the preset or base config changes."""
+    from backend.camilla_config import CamillaConfig
+    from benchmarks.configs import make_camilla_config
+
+    base = CamillaConfig(make_camilla_config(channels=4))
+    state = {'channels': [{'index': 0, 'level_db': -9.0}]}
+    await preset_manager.save_preset('show', state)
+    assert await preset_manager.precompile(base) == 1
+
+    compiled = preset_manager.compiled_config('show', state, base)
+    assert preset_manager.compiled_config('show', state, base) is compiled
+    assert CamillaConfig(compiled).channel_state(0)['level_db'] == -9.0
+
+    # live values of the controls the preset leaves alone are part of the key
+    moved = CamillaConfig(make_camilla_config(channels=4))
+    moved.set_dest_gain(0, -30.0)
+    assert preset_manager.compiled_config('show', state, moved) is compiled
+    moved.set_dest_gain(1, -30.0)
+    moved.set_dest_mute(2, True)
+    recompiled = preset_manager.compiled_config('show', state, moved)
+    assert recompiled is not compiled
+    assert CamillaConfig(recompiled).channel_state(0)['level_db'] == -9.0
+    assert CamillaConfig(recompiled).channel_state(1)['level_db'] == -30.0
+    assert CamillaConfig(recompiled).channel_state(2)['mute'] is True
+    compiled = preset_manager.compiled_config('show', state, base)
+
+    # a structural change of the base config invalidates the cache
+    other = CamillaConfig(make_camilla_config(channels=4, filters_per_channel=1))
+    assert preset_manager.compiled_config('show', state, other) is not compiled
+
+    await preset_manager.save_preset('show', {'channels': [{'index': 0, 'level_db': -1.0}]})
+    assert 'show' not in preset_manager._compiled
+
+
+@pytest.mark.asyncio
+async def test_push_preset_uses_single_set_active(preset_manager):
+    """Test recall pushes the precompiled config in one upload."""
+    from unittest.mock import MagicMock
+    from backend.camilla_adapter import CamillaAdapter
+    from backend.server import push_preset
+    from benchmarks.configs import make_camilla_config
+
+    adapter = CamillaAdapter(url='')
+    adapter._py_client = MagicMock()
+    adapter._py_client.config.active.return_value = make_camilla_config(channels=16)
+    adapter._py_connected = True
+    state = {'master': {'level_db': -4.0, 'mute': False},
+             'channels': [{'index': ch, 'level_db': -float(ch), 'eq': {'low': 1.0}} for ch in range(16)]}
+    app = {'adapter': adapter, 'presets': preset_manager}
+    assert await push_preset(app, 'show', state) is True
+    assert await push_preset(app, 'show', state) is True
+    assert adapter._py_client.config.set_active.call_count == 2
+    # the base is read back from the DSP once per recall
+    assert adapter._py_client.config.active.call_count == 2
+    assert CamillaAdapter(url='').base_config() is None
@@ -0,0 +1,94 @@
+"""Tests for the SQLite preset backend."""
+import json
+import os
+
+import pytest
+from backend.presets_sqlite import SQLitePresetManager
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Create a SQLitePresetManager in a temporary directory."""
+    manager = SQLitePresetManager(str(tmp_path))
+    yield manager
+    manager.close()
+
+
+def state(level):
+    return {'channels': [{'index': 0, 'level_db': level, 'mute': False, 'solo': False, 'eq': {}}]}
+
+
+@pytest.mark.asyncio
+async def test_versions_and_load(store):
+    await store.save_preset('show', state(-1.0))
+    path = await store.save_preset('show', state(-2.0))
+    assert path.endswith('#show@2')
+    assert (await store.load_preset('show'))['channels'][0]['level_db'] == -2.0
+    assert (await store.load_preset('show', version=1))['channels'][0]['level_db'] == -1.0
+    assert [v['version'] for v in store.history('show')] == [2, 1]
+    assert await store.load_preset('missing') is None
+    assert await store.load_preset('../etc') is None
+    with pytest.raises(ValueError):
+        await store.save_preset('bad name', state(0.0))
+
+
+@pytest.mark.asyncio
+async def test_unchanged_save_adds_no_version(store):
+    await store.save_preset('autosave', state(-1.0))
+    # an idle autosave: same state, same version
+    path = await store.save_preset('autosave', state(-1.0))
+    assert path.endswith('#autosave@1')
+    assert [v['version'] for v in store.history('autosave')] == [1]
+    assert (await store.save_preset('autosave', state(-2.0))).endswith('@2')
+
+
+@pytest.mark.asyncio
+async def test_history_is_capped(tmp_path):
+    store = SQLitePresetManager(str(tmp_path), max_versions=3)
+    for n in range(6):
+        await store.save_preset('autosave', state(float(-n)))
+    assert [v['version'] for v in store.history('autosave')] == [6, 5, 4]
+    assert await store.load_preset('autosave', version=3) is None
+    assert (await store.load_preset('autosave'))['channels'][0]['level_db'] == -5.0
+    store.close()
+
+
+def test_wal_mode(store):
+    assert store._db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+@pytest.mark.asyncio
+async def test_search_prefix_tags_and_last_used(store):
+    for name in ('band_a', 'band_b', 'talk', 'bandit'):
+        await store.save_preset(name, state(0.0))
+    assert [r['name'] for r in store.search(prefix='band_')] == ['band_a', 'band_b']
+    assert store.set_tags('talk', ['live', 'voice', 'live']) == ['live', 'voice']
+    store.set_tags('band_b', ['live'])
+    assert [r['name'] for r in store.search(tag='live')] == ['band_b', 'talk']
+    assert store.search(prefix='ta')[0]['tags'] == ['live', 'voice']
+    store.mark_used('bandit')
+    store.mark_used('talk')
+    assert [r['name'] for r in store.search(order='last_used', limit=2)] == ['talk', 'bandit']
+    with pytest.raises(ValueError):
+        store.search(order='size')
+    with pytest.raises(ValueError):
+        store.set_tags('missing', ['x'])
+
+
+@pytest.mark.asyncio
+async def test_json_presets_migrated_once(tmp_path):
+    with open(os.path.join(tmp_path, 'old.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'state': state(-7.0)}, f)
+    with open(os.path.join(tmp_path, 'broken.json'), 'w', encoding='utf-8') as f:
+        f.write('{not json')
+    store = SQLitePresetManager(str(tmp_path))
+    assert store.list_presets() == ['old']
+    assert (await store.load_preset('old'))['channels'][0]['level_db'] == -7.0
+    await store.save_preset('old', state(-1.0))
+    store.close()
+    # a restart does not import the JSON file again
+    store = SQLitePresetManager(str(tmp_path))
+    assert [v['version'] for v in store.history('old')] == [2, 1]
+    assert os.path.exists(os.path.join(tmp_path, 'old.json'))
+    store.close()
+
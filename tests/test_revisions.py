@@ -0,0 +1,189 @@
+"""Tests for field revisions, operation acks and state patches."""
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from backend.server import ControlWriter, MixerState, broadcast_changes, parse_op, resume_changes, websocket_handler
+
+
+class RecordingAdapter:
+    """Adapter stand-in accepting control calls."""
+
+    _py_connected = False
+
+    def set_level(self, ch, level_db):
+        pass
+
+    def set_mutes(self, items):
+        pass
+
+
+class TestMixerRevisions:
+    """Test revision bookkeeping on MixerState."""
+
+    def test_touch_and_changes_since(self):
+        mixer = MixerState(channels=4)
+        r1 = mixer.touch(1, 'level_db')
+        r2 = mixer.touch('master', 'mute')
+        r3 = mixer.touch(1, 'level_db')
+        assert (r1, r2, r3) == (1, 2, 3)
+        # re-touched fields move to the end and are reported once
+        assert mixer.changes_since(0) == [('master', 'mute', 2), (1, 'level_db', 3)]
+        assert mixer.changes_since(2) == [(1, 'level_db', 3)]
+        assert mixer.changes_since(3) == []
+
+    def test_wholesale_changes(self):
+        mixer = MixerState(channels=4)
+        mixer.touch(1, 'eq.low')
+        assert mixer.resize(8)
+        assert mixer.changes_since(1) is None
+        mixer.touch(6, 'solo')
+        assert mixer.changes_since(mixer.base_revision) == [(6, 'solo', mixer.revision)]
+
+    def test_revisions_are_windowed(self):
+        mixer = MixerState(channels=8)
+        mixer.touch_all()
+        mixer.touch(1, 'mute')
+        mixer.touch(6, 'eq.mid')
+        mixer.touch('master', 'level_db')
+        info = mixer.revisions(4, 8)
+        assert info['base_rev'] == 1 and info['rev'] == 4
+        assert info['revs'] == {'6': {'eq.mid': 3}, 'master': {'level_db': 4}}
+        # presets keep the plain state
+        assert 'rev' not in mixer.to_dict()
+
+    def test_resume_changes(self):
+        mixer = MixerState(channels=4)
+        mixer.touch(1, 'mute')
+        mixer.touch(2, 'solo')
+        assert resume_changes(mixer, f'{mixer.instance}:1') == [(2, 'solo', 2)]
+        assert resume_changes(mixer, f'{mixer.instance}:2') == []
+        # unknown instance, future or malformed revision: full state
+        assert resume_changes(mixer, 'other:1') is None
+        assert resume_changes(mixer, f'{mixer.instance}:9') is None
+        assert resume_changes(mixer, f'{mixer.instance}:x') is None
+        assert resume_changes(mixer, None) is None
+        mixer.touch_all()
+        assert resume_changes(mixer, f'{mixer.instance}:2') is None
+
+    def test_parse_op(self):
+        assert parse_op({'op': 'a1-7'}) == 'a1-7'
+        assert parse_op({'op': 12}) == '12'
+        assert parse_op({'op': True}) is None
+        assert parse_op({'op': 'x' * 65}) is None
+        assert parse_op({}) is None
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path):
+    app = web.Application()
+    app['sockets'] = []
+    app['mixer'] = MixerState(channels=32)
+    app['adapter'] = RecordingAdapter()
+    app['presets'] = None
+    app['state_needs_broadcast'] = False
+    app['autosave_enabled'] = False
+    app['autosave_interval'] = 30.0
+    app['audit'] = None
+    app['control_writer'] = ControlWriter(app)
+    app.router.add_get('/ws', websocket_handler)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    yield client
+    await client.close()
+
+
+async def receive_type(ws, typ):
+    while True:
+        msg = await ws.receive_json(timeout=2)
+        if msg['type'] == typ:
+            return msg
+
+
+class TestAcksAndPatches:
+    """Test acks and patch broadcasts over the WebSocket."""
+
+    @pytest.mark.asyncio
+    async def test_ack_echoes_op_and_revision(self, client):
+        ws = await client.ws_connect('/ws')
+        state = (await receive_type(ws, 'state'))['payload']
+        assert state['rev'] == 0 and state['revs'] == {}
+
+        await ws.send_json({'type': 'set_channel_level', 'op': 'c1-1',
+                            'payload': {'channel': 3, 'level_db': -12.0}})
+        ack = (await receive_type(ws, 'ack'))['payload']
+        assert ack == {'op': 'c1-1', 'rev': 1}
+
+        await ws.send_json({'type': 'set_channel_eq', 'op': 'c1-2',
+                            'payload': {'channel': 3, 'band': 'bogus', 'gain_db': 1.0}})
+        error = await receive_type(ws, 'error')
+        assert error['op'] == 'c1-2' and 'Invalid set_channel_eq' in error['payload']
+
+        # no op, no ack
+        await ws.send_json({'type': 'set_channel_mute', 'payload': {'channel': 0, 'mute': True}})
+        await ws.send_json({'type': 'subscribe_channels', 'payload': {}})
+        state = (await receive_type(ws, 'state'))['payload']
+        assert state['revs'] == {'3': {'level_db': 1}, '0': {'mute': 2}}
+        await ws.close()
+
+    @pytest.mark.asyncio
+    async def test_patches_carry_only_changed_fields(self, client):
+        app = client.server.app
+        full = await client.ws_connect('/ws')
+        paged = await client.ws_connect('/ws?start=16&count=16')
+        await receive_type(full, 'state')
+        await receive_type(paged, 'state')
+
+        await full.send_json({'type': 'set_channel_level', 'op': 'f-1', 'payload': {'channel': 2, 'level_db': -6.0}})
+        await full.send_json({'type': 'set_channel_solo', 'op': 'f-2', 'payload': {'channel': 20, 'solo': True}})
+        await receive_type(full, 'ack')
+        await receive_type(full, 'ack')
+        await broadcast_changes(app)
+
+        patch = (await receive_type(full, 'state_patch'))['payload']
+        assert patch['rev'] == 2 and patch['any_solo'] is True
+        assert patch['changes'] == [{'channel': 2, 'field': 'level_db', 'value': -6.0, 'rev': 1},
+                                    {'channel': 20, 'field': 'solo', 'value': True, 'rev': 2}]
+        patch = (await receive_type(paged, 'state_patch'))['payload']
+        assert [c['channel'] for c in patch['changes']] == [20]
+
+        # nothing new: nothing sent; a wholesale change sends the full state
+        await broadcast_changes(app)
+        app['mixer'].touch_all()
+        await broadcast_changes(app)
+        state = (await receive_type(full, 'state'))['payload']
+        assert state['base_rev'] == 3 and state['channels'][20]['solo'] is True
+        await full.close()
+        await paged.close()
+
+
+class TestResume:
+    """Test reconnecting with a resume token."""
+
+    @pytest.mark.asyncio
+    async def test_reconnect_gets_only_missed_changes(self, client):
+        ws = await client.ws_connect('/ws?start=0&count=8')
+        state = (await receive_type(ws, 'state'))['payload']
+        await ws.close()
+        token = f"{state['instance']}:{state['rev']}"
+
+        other = await client.ws_connect('/ws')
+        await other.send_json({'type': 'set_channel_level', 'op': 'o-1', 'payload': {'channel': 3, 'level_db': -9.0}})
+        await other.send_json({'type': 'set_channel_solo', 'op': 'o-2', 'payload': {'channel': 20, 'solo': True}})
+        await receive_type(other, 'ack')
+        await receive_type(other, 'ack')
+
+        ws = await client.ws_connect(f'/ws?start=0&count=8&resume={token}')
+        first = await ws.receive_json(timeout=2)
+        assert first['type'] == 'state_patch'
+        # channel 20 is outside the window; any_solo still tells about it
+        assert first['payload'] == {'rev': 2, 'any_solo': True, 'changes': [
+            {'channel': 3, 'field': 'level_db', 'value': -9.0, 'rev': 1}]}
+        await ws.close()
+
+        # a token from another server instance gets the full state
+        ws = await client.ws_connect('/ws?resume=gone:2')
+        first = await ws.receive_json(timeout=2)
+        assert first['type'] == 'state' and first['payload']['channels'][3]['level_db'] == -9.0
+        await ws.close()
+        await other.close()
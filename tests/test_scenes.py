@@ -0,0 +1,192 @@
+"""Tests for the server-side scene engine (timed crossfades)."""
+import asyncio
+import copy
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from backend.camilla_adapter import CamillaAdapter
+from backend.presets import PresetManager
+from backend.scenes import SceneEngine
+from backend.server import ControlWriter, MixerState, websocket_handler
+
+
+class RecordingAdapter:
+    """Adapter stand-in that records every coalesced batch."""
+
+    def __init__(self):
+        self.batches = []
+
+    def apply_batch(self, levels=None, eq=None, master_level=None):
+        self.batches.append((dict(levels or {}), dict(eq or {}), master_level))
+
+
+def make_target(mixer, **overrides):
+    target = copy.deepcopy(mixer.to_dict())
+    for ch, values in overrides.items():
+        target['channels'][int(ch[2:])].update(values)
+    return target
+
+
+class TestSceneEngine:
+    """Test crossfade scheduling, coalescing, release and end flags."""
+
+    @pytest.mark.asyncio
+    async def test_fade_interpolates_and_coalesces(self):
+        adapter = RecordingAdapter()
+        updates = []
+        engine = SceneEngine(adapter, rate_hz=200, on_update=lambda: updates.append(1))
+        mixer = MixerState(channels=4)
+        target = make_target(mixer, ch0={'level_db': -20.0}, ch1={'level_db': -10.0, 'eq': {'low': 6.0}})
+        target['master']['level_db'] = -6.0
+
+        status = engine.recall(mixer, target, 0.3, name='scene')
+        assert status['active'] and status['tracks'] == 4
+        # wait for the fader to move rather than a fixed delay (loaded CI machines)
+        for _ in range(100):
+            if mixer.channels[0]['level_db'] < 0.0:
+                break
+            await asyncio.sleep(0.005)
+        assert -20.0 < mixer.channels[0]['level_db'] < 0.0
+        await asyncio.wait_for(engine._task, 2)
+
+        assert mixer.channels[0]['level_db'] == -20.0
+        assert mixer.channels[1]['level_db'] == -10.0
+        assert mixer.channels[1]['eq']['low'] == 6.0
+        assert mixer.master['level_db'] == -6.0
+        # every tick is one batch carrying all moving parameters
+        assert len(adapter.batches) > 2
+        levels, eq, master = adapter.batches[1]
+        assert set(levels) == {0, 1} and set(eq) == {(1, 'low')} and master is not None
+        assert adapter.batches[-1] == ({0: -20.0, 1: -10.0}, {(1, 'low'): 6.0}, -6.0)
+        assert len(updates) == len(adapter.batches)
+        assert not engine.active
+        # only the faded fields changed revision
+        assert mixer.base_revision == 0
+        assert {(ch, field) for ch, field, _ in mixer.changes_since(0)} == {
+            ('master', 'level_db'), (0, 'level_db'), (1, 'level_db'), (1, 'eq.low')}
+
+    @pytest.mark.asyncio
+    async def test_zero_duration_is_instant(self):
+        adapter = RecordingAdapter()
+        finished = []
+        engine = SceneEngine(adapter, rate_hz=50, on_finish=finished.append)
+        mixer = MixerState(channels=2)
+        engine.recall(mixer, make_target(mixer, ch1={'level_db': -3.0}), 0)
+        await asyncio.wait_for(engine._task, 2)
+        assert adapter.batches == [({1: -3.0}, {}, None)]
+        assert finished and finished[0]['active'] is False
+
+    @pytest.mark.asyncio
+    async def test_release_and_cancel(self):
+        adapter = RecordingAdapter()
+        engine = SceneEngine(adapter, rate_hz=200)
+        mixer = MixerState(channels=3)
+        engine.recall(mixer, make_target(mixer, ch0={'level_db': -30.0}, ch2={'level_db': -30.0}), 0.2)
+        await asyncio.sleep(0.03)
+        engine.release(0)
+        mixer.channels[0]['level_db'] = 4.0  # manual move
+        await asyncio.sleep(0.03)
+        assert mixer.channels[0]['level_db'] == 4.0
+        assert engine.cancel() is True
+        frozen = mixer.channels[2]['level_db']
+        await asyncio.sleep(0.03)
+        assert mixer.channels[2]['level_db'] == frozen > -30.0
+        assert engine.cancel() is False
+        await engine.stop()
+
+    @pytest.mark.asyncio
+    async def test_mute_at_end_unmute_at_start(self):
+        mutes = []
+        engine = SceneEngine(RecordingAdapter(), rate_hz=200, on_mutes=lambda: mutes.append(1))
+        mixer = MixerState(channels=2)
+        mixer.channels[1]['mute'] = True
+        target = make_target(mixer, ch0={'mute': True, 'level_db': -6.0}, ch1={'mute': False, 'solo': True})
+        engine.recall(mixer, target, 0.05)
+        assert mixer.channels[1]['mute'] is False
+        assert mixer.changes_since(0) == [(1, 'mute', 1)]
+        assert mixer.channels[0]['mute'] is False
+        assert mixer.channels[1]['solo'] is False
+        await asyncio.wait_for(engine._task, 2)
+        assert mixer.channels[0]['mute'] is True
+        assert mixer.channels[1]['solo'] is True
+        assert len(mutes) == 2
+        assert [(ch, field) for ch, field, _ in mixer.changes_since(1)] == [
+            (0, 'level_db'), (0, 'mute'), (1, 'solo')]
+
+    def test_invalid_duration(self):
+        engine = SceneEngine(RecordingAdapter())
+        with pytest.raises(ValueError):
+            engine.recall(MixerState(channels=1), {}, -1)
+        with pytest.raises(ValueError):
+            engine.recall(MixerState(channels=1), [], 1)
+
+
+def test_apply_batch_queues_one_message():
+    adapter = CamillaAdapter(url='ws://127.0.0.1:1234')
+    adapter.apply_batch({0: -6.0, 1: -3.0}, {(0, 'low'): 2.0}, -1.0)
+    assert adapter._queue.qsize() == 1
+    msg = adapter._queue.get_nowait()
+    assert msg['type'] == 'apply_batch'
+    assert msg['payload']['levels'] == {'0': -6.0, '1': -3.0}
+    assert msg['payload']['eq'] == [{'channel': 0, 'band': 'low', 'gain_db': 2.0}]
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path):
+    """Serve the WebSocket handler with a scene engine and one stored preset."""
+    app = web.Application()
+    app['sockets'] = []
+    app['mixer'] = MixerState(channels=4)
+    app['adapter'] = CamillaAdapter(url='')
+    app['presets'] = PresetManager(str(tmp_path))
+    app['scenes'] = SceneEngine(app['adapter'], rate_hz=100)
+    app['state_needs_broadcast'] = False
+    app['autosave_enabled'] = False
+    app['autosave_interval'] = 30.0
+    app['audit'] = None
+    app['control_writer'] = ControlWriter(app)
+    target = copy.deepcopy(app['mixer'].to_dict())
+    target['channels'][2]['level_db'] = -24.0
+    await app['presets'].save_preset('quiet', target)
+    app.router.add_get('/ws', websocket_handler)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    yield client
+    await app['scenes'].stop()
+    await client.close()
+
+
+async def receive_type(ws, typ):
+    while True:
+        msg = await ws.receive_json(timeout=2)
+        if msg['type'] == typ:
+            return msg['payload']
+
+
+class TestSceneMessages:
+    """Test recall_scene / cancel_scene over the WebSocket."""
+
+    @pytest.mark.asyncio
+    async def test_recall_and_manual_override(self, client):
+        app = client.server.app
+        ws = await client.ws_connect('/ws')
+        await ws.send_json({'type': 'recall_scene', 'payload': {'name': 'quiet', 'duration_ms': 1000}})
+        status = await receive_type(ws, 'scene_status')
+        assert status['active'] and status['name'] == 'quiet'
+        await ws.send_json({'type': 'set_channel_level', 'payload': {'channel': 2, 'level_db': 3.0}})
+        await asyncio.sleep(0.1)
+        assert app['mixer'].channels[2]['level_db'] == 3.0
+        await ws.send_json({'type': 'cancel_scene', 'payload': {}})
+        assert (await receive_type(ws, 'scene_status'))['active'] is False
+        await ws.close()
+
+    @pytest.mark.asyncio
+    async def test_recall_errors(self, client):
+        ws = await client.ws_connect('/ws')
+        await ws.send_json({'type': 'recall_scene', 'payload': {'name': 'missing', 'duration_ms': 10}})
+        assert await receive_type(ws, 'error') == 'preset not found'
+        await ws.send_json({'type': 'recall_scene', 'payload': {'name': 'quiet', 'duration_ms': -5}})
+        assert 'Invalid recall_scene' in await receive_type(ws, 'error')
+        await ws.close()
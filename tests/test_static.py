@@ -0,0 +1,156 @@
+"""Tests for the frontend build and the cached static asset handler."""
+import gzip
+import os
+import re
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from backend.static import IMMUTABLE_CACHE, StaticAssets, accepted_encodings
+from scripts.build_frontend import DEFAULT_SOURCE, IMPORT_RE, build
+
+LONG_TEXT = '// padding so the module is worth compressing\n' * 40
+
+
+@pytest.fixture
+def source(tmp_path):
+    src = tmp_path / 'frontend'
+    src.mkdir()
+    (src / 'index.html').write_text(
+        '<html><head><link rel="stylesheet" href="/style.css?v=3"></head>'
+        '<body><script type="module" src="/app.js?v=3"></script></body></html>\n')
+    (src / 'style.css').write_text('body { color: black; }\n')
+    (src / 'util.js').write_text('export const x = 1;\n' + LONG_TEXT)
+    (src / 'app.js').write_text("import { x } from './util.js';\nconsole.log(x);\n")
+    (src / '.secret').write_text('hidden')
+    return src
+
+
+def make_client(assets):
+    app = web.Application()
+    app.router.add_get('/', assets.handle)
+    app.router.add_get('/{path:.+}', assets.handle)
+    return TestClient(TestServer(app))
+
+
+@pytest_asyncio.fixture
+async def built(source, tmp_path):
+    manifest = build(str(source), str(tmp_path / 'dist'))
+    client = make_client(StaticAssets(str(source), str(tmp_path / 'dist')))
+    await client.start_server()
+    yield client, manifest
+    await client.close()
+
+
+class TestBuild:
+    """Test the build script output."""
+
+    def test_hashes_and_rewrites(self, source, tmp_path):
+        out = tmp_path / 'dist'
+        manifest = build(str(source), str(out))
+        assert re.fullmatch(r'util\.[0-9a-f]{10}\.js', manifest['util.js'])
+        assert f"from './{manifest['util.js']}'" in (out / manifest['app.js']).read_text()
+        html = (out / 'index.html').read_text()
+        assert f'src="/{manifest["app.js"]}"' in html and f'href="/{manifest["style.css"]}"' in html
+        assert f'<link rel="modulepreload" href="/{manifest["util.js"]}">' in html
+        assert '?v=' not in html
+        # large text assets get a gzip variant, tiny ones do not
+        assert gzip.decompress((out / (manifest['util.js'] + '.gz')).read_bytes()).startswith(b'export')
+        assert not (out / (manifest['style.css'] + '.gz')).exists()
+
+        # a dependency change changes the importer's hash too
+        (source / 'util.js').write_text('export const x = 2;\n')
+        assert build(str(source), str(out))['app.js'] != manifest['app.js']
+
+    def test_worker_scripts_are_hashed_not_preloaded(self, source, tmp_path):
+        (source / 'socket-worker.js').write_text('self.onmessage = () => {};\n')
+        (source / 'socket.js').write_text("const url = new URL('./socket-worker.js', import.meta.url);\n")
+        out = tmp_path / 'dist'
+        manifest = build(str(source), str(out))
+        assert f"new URL('./{manifest['socket-worker.js']}'" in (out / manifest['socket.js']).read_text()
+        html = (out / 'index.html').read_text()
+        assert manifest['socket-worker.js'] not in html and manifest['socket.js'] in html
+
+    def test_circular_imports_are_rejected(self, tmp_path):
+        (tmp_path / 'a.js').write_text("import './b.js';\n")
+        (tmp_path / 'b.js').write_text("import './a.js';\n")
+        with pytest.raises(ValueError, match='circular'):
+            build(str(tmp_path), str(tmp_path / 'dist'))
+
+    def test_real_frontend_imports_resolve(self, tmp_path):
+        out = tmp_path / 'dist'
+        manifest = build(DEFAULT_SOURCE, str(out))
+        for hashed in manifest.values():
+            if hashed.endswith('.js'):
+                for match in IMPORT_RE.finditer((out / hashed).read_text(encoding='utf-8')):
+                    assert (out / match.group(3)).is_file(), match.group(0)
+
+
+def test_accepted_encodings():
+    assert accepted_encodings('gzip, deflate, br') == {'gzip', 'deflate', 'br'}
+    assert accepted_encodings('br;q=0, gzip;q=0.5') == {'gzip'}
+    assert accepted_encodings(None) == set()
+
+
+class TestServing:
+    """Test cache headers, compression and revalidation."""
+
+    @pytest.mark.asyncio
+    async def test_cache_headers(self, built):
+        client, manifest = built
+        resp = await client.get('/' + manifest['app.js'])
+        assert resp.status == 200
+        assert resp.headers['Cache-Control'] == IMMUTABLE_CACHE
+        assert resp.headers['Content-Type'].endswith('javascript; charset=utf-8')
+        resp = await client.get('/')
+        assert resp.headers['Cache-Control'] == 'no-cache'
+        assert manifest['app.js'] in await resp.text()
+
+    @pytest.mark.asyncio
+    async def test_precompressed_variant(self, built):
+        client, manifest = built
+        path = '/' + manifest['util.js']
+        resp = await client.get(path, headers={'Accept-Encoding': 'gzip'}, auto_decompress=False)
+        assert resp.headers['Content-Encoding'] == 'gzip'
+        assert resp.headers['Vary'] == 'Accept-Encoding'
+        assert gzip.decompress(await resp.read()).startswith(b'export')
+        resp = await client.get(path, headers={'Accept-Encoding': 'gzip;q=0'})
+        assert 'Content-Encoding' not in resp.headers
+        assert (await resp.read()).startswith(b'export')
+
+    @pytest.mark.asyncio
+    async def test_not_modified(self, built):
+        client, manifest = built
+        path = '/' + manifest['util.js']
+        etag = (await client.get(path, headers={'Accept-Encoding': 'gzip'})).headers['ETag']
+        assert etag.endswith('-gzip"')
+        # a tag from another encoding still validates the identity response
+        resp = await client.get(path, headers={'If-None-Match': etag, 'Accept-Encoding': 'identity'})
+        assert resp.status == 304
+        assert resp.headers['Cache-Control'] == IMMUTABLE_CACHE
+        resp = await client.get(path, headers={'If-None-Match': '"other"'})
+        assert resp.status == 200
+
+    @pytest.mark.asyncio
+    async def test_hidden_and_outside_files(self, built):
+        client, _ = built
+        for path in ('/.secret', '/../frontend/index.html', '/%2e%2e/frontend/app.js', '/missing.js'):
+            assert (await client.get(path)).status == 404, path
+
+
+@pytest.mark.asyncio
+async def test_source_fallback_without_build(source, tmp_path):
+    assets = StaticAssets(str(source), str(tmp_path / 'no-dist'))
+    assert not assets.built
+    async with make_client(assets) as client:
+        resp = await client.get('/app.js')
+        assert resp.status == 200
+        assert resp.headers['Cache-Control'] == 'no-cache'
+        etag = resp.headers['ETag']
+        assert (await client.get('/app.js', headers={'If-None-Match': etag})).status == 304
+        # the cache follows edits on disk
+        (source / 'app.js').write_text('console.log(2);\n')
+        os.utime(source / 'app.js', ns=(0, 0))
+        resp = await client.get('/app.js', headers={'If-None-Match': etag})
+        assert resp.status == 200 and await resp.text() == 'console.log(2);\n'
@@ -0,0 +1,64 @@
+"""Tests for the event-loop lag watchdog."""
+import asyncio
+import time
+import pytest
+from backend.watchdog import LoopWatchdog
+
+
+def blocking_dsp_call():
+    time.sleep(0.25)
+
+
+@pytest.mark.asyncio
+async def test_lag_measured():
+    wd = LoopWatchdog(interval=0.01, threshold=0.5)
+    await wd.start()
+    try:
+        await asyncio.sleep(0.1)
+        stats = wd.stats()
+        assert stats['running'] is True
+        assert stats['lag_ms']['samples'] > 0
+        assert stats['stall_count'] == 0
+    finally:
+        await wd.stop()
+    assert wd.stats()['running'] is False
+
+
+@pytest.mark.asyncio
+async def test_blocking_call_stack_captured():
+    wd = LoopWatchdog(interval=0.01, threshold=0.05)
+    await wd.start()
+    try:
+        await asyncio.sleep(0.03)
+        blocking_dsp_call()
+        await asyncio.sleep(0.05)
+        stats = wd.stats()
+        assert stats['stall_count'] == 1
+        stall = stats['stalls'][0]
+        assert any('blocking_dsp_call' in line for line in stall['stack'])
+        assert stall['duration_ms'] >= 200
+        assert stats['lag_ms']['max'] >= 200
+    finally:
+        await wd.stop()
+
+
+@pytest.mark.asyncio
+async def test_disabled_watchdog_skips_capture():
+    wd = LoopWatchdog(interval=0.01, threshold=0.05)
+    wd.configure(enabled=False)
+    await wd.start()
+    try:
+        await asyncio.sleep(0.02)
+        blocking_dsp_call()
+        await asyncio.sleep(0.03)
+        assert wd.stats()['stall_count'] == 0
+    finally:
+        await wd.stop()
+
+
+def test_configure_rejects_invalid_threshold():
+    wd = LoopWatchdog()
+    with pytest.raises(ValueError):
+        wd.configure(threshold=0)
+    wd.configure(threshold=0.2)
+    assert wd.stats()['threshold_ms'] == 200.0